@@ -0,0 +1,122 @@
+"""
+Compteurs du jour tenus en mémoire : H/F, tickets carte / avance / 1ère fois, caisse.
+
+Amorcés une fois depuis la base (démarrage, minuit), puis mis à jour par différence :
+après chaque commit de ce processus, data_version.follow_day transmet les lignes
+d'historique du jour ajoutées ou retirées, quel que soit le chemin d'écriture (passage
+anonyme, consommation, recharge, annuler / rétablir, import...). Lire les compteurs
+ne fait donc aucune requête.
+
+L'amorçage passe par l'écrivain unique : aucune écriture de ce processus ne peut
+s'intercaler entre la lecture SQL et la reprise des différences. reconcile() recompte le
+jour en SQL sur une simple connexion de lecture ; seul un écart (écriture d'un autre
+processus...) est revérifié et corrigé par l'écrivain. Un commit, même vide, change
+data_version et viderait le cache de StatsService toutes les 5 minutes.
+"""
+import threading
+from dataclasses import replace
+from datetime import date
+
+import database as db
+from database import CONSO_ACTIONS
+from Core.periods import day_bounds
+from Core.stats import PeriodStats, CARTE_STATUTS, PREMIERE_FOIS_STATUTS, read_period
+
+# Champs tenus à jour (la répartition des usagers par solde reste dans StatsService.dashboard)
+COUNTER_FIELDS = (
+    "total_h", "total_f", "tickets_carte", "tickets_avance", "tickets_tutelle",
+    "tickets_1ere_fois", "anon_paye", "anonymes", "recharges",
+)
+RECONCILE_INTERVAL_MS = 5 * 60 * 1000
+MONEY_TOLERANCE = 0.005
+
+
+class TodayCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.day = None
+        self._stats = PeriodStats()
+
+    def seed(self, day=None):
+        """(Ré)amorce les compteurs pour day (défaut : aujourd'hui) depuis la base."""
+        day, _ = day_bounds(day or date.today())
+        db.write_sync(self._seed_job, day)
+
+    def _seed_job(self, cursor, day):
+        stats = read_period(cursor, *day_bounds(day))
+        with self._lock:
+            self.day, self._stats = day, stats
+        db.data_version.follow_day(day, self._apply)
+
+    def snapshot(self):
+        """Copie des compteurs (PeriodStats, usagers par solde à 0)."""
+        with self._lock:
+            return replace(self._stats)
+
+    def _apply(self, rows):
+        """Différences d'un commit (appelé dans le thread qui a validé)."""
+        with self._lock:
+            stats = self._stats
+            for day, sign, action, sexe, statut, quantite, montant in rows:
+                if day != self.day:
+                    continue
+                if action == 'Recharge Compte':
+                    stats.recharges += sign * (montant or 0)
+                    continue
+                if action not in CONSO_ACTIONS:
+                    continue
+                quantity = sign * (quantite or 0)
+                if sexe == 'H':
+                    stats.total_h += quantity
+                elif sexe == 'F':
+                    stats.total_f += quantity
+                if statut in CARTE_STATUTS:
+                    stats.tickets_carte += quantity
+                elif statut == 'Avances':
+                    stats.tickets_avance += quantity
+                elif statut == 'Tutelles':
+                    stats.tickets_tutelle += quantity
+                elif statut in PREMIERE_FOIS_STATUTS:
+                    stats.tickets_1ere_fois += quantity
+                if action == 'PAYE':
+                    stats.anon_paye += sign
+                if action in ('PAYE', '1ERE_FOIS'):
+                    stats.anonymes += sign
+
+    def reconcile(self):
+        """
+        Recompte le jour en SQL et corrige les compteurs.
+        Retourne les écarts trouvés : {champ: (mémoire, base)} (vide si tout concorde).
+        """
+        day = self.day
+        if day is None:
+            return {}
+        with db.connection() as conn:
+            fresh = read_period(conn.cursor(), *day_bounds(day))
+        with self._lock:
+            if not self._drift(fresh):
+                return {}
+        # Écart possible (ou commit dont les différences n'étaient pas encore reprises) :
+        # relu dans l'écrivain, où aucune écriture ne s'intercale
+        return db.write_sync(self._reconcile_job)
+
+    def _reconcile_job(self, cursor):
+        if self.day is None:
+            return {}
+        fresh = read_period(cursor, *day_bounds(self.day))
+        with self._lock:
+            drift = self._drift(fresh)
+            if drift:
+                self._stats = fresh
+        return drift
+
+    def _drift(self, fresh):
+        drift = {}
+        for name in COUNTER_FIELDS:
+            mine, theirs = getattr(self._stats, name), getattr(fresh, name)
+            if abs(mine - theirs) > (MONEY_TOLERANCE if name == "recharges" else 0):
+                drift[name] = (mine, theirs)
+        return drift
+
+
+today_counters = TodayCounters()
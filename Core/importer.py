@@ -0,0 +1,175 @@
+"""
+Import en masse d'usagers : texte collé ou fichier (texte / CSV) de taille quelconque.
+
+Les lignes sont lues au fil de l'eau et écrites par lots via l'écrivain unique :
+- les clés d'identité (colonne indexée nom_key) des usagers existants sont chargées une fois
+- dans chaque lot, les clés inconnues sont recherchées en base avant création : un usager
+  ajouté entre-temps (interface) n'est pas créé en double
+- les ids des nouveaux usagers sont attribués par plage en début de lot
+- INSERT, UPDATE et historique partent en executemany (une transaction par lot)
+
+Ligne texte : NOM [PRENOM] TICKETS [COMMENTAIRE]
+Ligne CSV   : nom;prenom;tickets[;commentaire]  (séparateur ; ou ,, en-tête ignoré)
+"""
+import io
+import csv
+from datetime import datetime
+from itertools import islice
+
+import database as db
+from Core.normalize import name_key
+
+IMPORT_CHUNK_SIZE = 2000
+LOOKUP_BATCH_SIZE = 500  # Clés par requête IN (...)
+NEGATIVE_STATUTS = ("Avances", "Tutelles")  # Tickets importés comptés en dette
+
+
+def detect_gender(prenom):
+    return 'F' if prenom.lower().endswith(('e', 'a', 'ine', 'ette')) else 'H'
+
+
+# ============================================================================
+# LECTURE
+# ============================================================================
+def parse_line(line):
+    """'DUPONT jean 5 TUTEUR' -> ('DUPONT', 'Jean', 5, 'TUTEUR') ; None si la ligne est ignorée."""
+    parts = line.split()
+    if len(parts) < 2:
+        return None
+    for i in range(1, len(parts)):
+        if parts[i].lstrip('-').isdigit():
+            return parts[0].upper(), " ".join(parts[1:i]).capitalize(), abs(int(parts[i])), " ".join(parts[i + 1:])
+    return None
+
+
+def parse_csv_row(fields):
+    fields = [f.strip() for f in fields]
+    if len(fields) < 3 or not fields[0] or not fields[2].lstrip('-').isdigit():
+        return None
+    return fields[0].upper(), fields[1].capitalize(), abs(int(fields[2])), " ".join(f for f in fields[3:] if f)
+
+
+def read_text(text):
+    """Enregistrements d'un texte collé (sans copie ligne à ligne du texte entier)."""
+    for line in io.StringIO(text):
+        record = parse_line(line)
+        if record:
+            yield record
+
+
+def read_file(path):
+    """Enregistrements d'un fichier, lus au fil de l'eau (.csv : colonnes, sinon comme le collage)."""
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        if path.lower().endswith(".csv"):
+            first = f.readline()
+            f.seek(0)
+            delimiter = ";" if first.count(";") >= first.count(",") else ","
+            parsed = (parse_csv_row(row) for row in csv.reader(f, delimiter=delimiter))
+        else:
+            parsed = (parse_line(line) for line in f)
+        for record in parsed:
+            if record:
+                yield record
+
+
+# ============================================================================
+# ÉCRITURE PAR LOTS
+# ============================================================================
+def _load_existing():
+    """{nom_key: [id, statut]} ; en cas d'homonymes, le premier id (comme find_usager_id)."""
+    existing = {}
+    with db.connection() as conn:
+        for key, uid, statut in conn.execute("SELECT nom_key, id, statut FROM usagers WHERE nom_key IS NOT NULL ORDER BY id"):
+            existing.setdefault(key, [uid, statut])
+    return existing
+
+
+def _lookup_keys(c, keys, existing):
+    """Ajoute à existing les usagers de ces clés créés depuis le chargement (dans la tâche d'écriture)."""
+    keys = list(keys)
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        part = keys[i:i + LOOKUP_BATCH_SIZE]
+        rows = c.execute(f"SELECT nom_key, id, statut FROM usagers WHERE nom_key IN ({','.join('?' * len(part))}) ORDER BY id", part)
+        for key, uid, statut in rows.fetchall():
+            existing.setdefault(key, [uid, statut])
+
+
+def _write_chunk(c, records, existing, default_statut, ticket_price, today):
+    """Tâche de l'écrivain : un lot d'enregistrements. Retourne (créés, mis à jour)."""
+    keyed = [(name_key(nom, prenom), (nom, prenom, quantity, comment)) for nom, prenom, quantity, comment in records]
+    # Création seulement si la clé est absente de la base, vérifié sous le verrou d'écriture
+    _lookup_keys(c, {key for key, _ in keyed if key not in existing}, existing)
+    nb_new = len({key for key, _ in keyed if key not in existing})
+    next_id = db.reserve_ids(c, nb_new) if nb_new else None  # Plage d'ids du lot, en une fois
+    new_rows = {}   # id -> [id, nom, prenom, sexe, statut, solde, ticket, passage, photo, commentaire, nom_key]
+    deltas = {}     # id -> [tickets, solde, commentaire]
+    history = []
+    created = updated = 0
+
+    for key, (nom, prenom, quantity, comment) in keyed:
+        sexe = detect_gender(prenom if prenom else nom)
+        known = existing.get(key)
+        if known:
+            uid, statut = known
+            final_tickets = -quantity if statut in NEGATIVE_STATUTS else quantity
+            row = new_rows.get(uid)
+            if row:  # Créé plus haut dans ce même lot
+                row[6] += final_tickets
+                row[5] += final_tickets * ticket_price
+                row[9] = comment or row[9]
+            else:
+                delta = deltas.setdefault(uid, [0, 0.0, ""])
+                delta[0] += final_tickets
+                delta[1] += final_tickets * ticket_price
+                delta[2] = comment or delta[2]
+            updated += 1
+            action_txt = f"Import (Ajout {final_tickets})"
+        else:
+            statut = default_statut
+            final_tickets = -quantity if statut in NEGATIVE_STATUTS else quantity
+            uid = next_id
+            next_id += 1
+            new_rows[uid] = [uid, nom, prenom, sexe, statut, final_tickets * ticket_price, final_tickets, "", "", comment, key]
+            existing[key] = [uid, statut]
+            created += 1
+            action_txt = "Import (Création)"
+        history.append((action_txt, str(final_tickets), sexe, uid, today, statut))
+
+    if new_rows:
+        c.executemany("INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire, nom_key) VALUES (?,?,?,?,?,?,?,?,?,?,?)", new_rows.values())
+    if deltas:
+        # Mise à jour relative : une modification faite entre-temps dans l'interface est conservée
+        c.executemany(
+            "UPDATE usagers SET ticket=ticket+?, solde=solde+?, commentaire=COALESCE(NULLIF(?, ''), commentaire) WHERE id=?",
+            ((dt, ds, com, uid) for uid, (dt, ds, com) in deltas.items())
+        )
+    db.insert_history_many(c, history)
+    return created, updated
+
+
+def import_roster(records, default_statut, ticket_price, progress=None, should_stop=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Importe un flux d'enregistrements (read_text / read_file) par lots de chunk_size.
+    progress(lignes traitées) après chaque lot ; should_stop() consulté entre deux lots
+    (les lots déjà écrits restent acquis).
+    Retourne {'created', 'updated', 'lines', 'cancelled'}.
+    """
+    existing = _load_existing()
+    today = datetime.now().strftime("%Y-%m-%d")
+    result = {'created': 0, 'updated': 0, 'lines': 0, 'cancelled': False}
+    records = iter(records)
+
+    while True:
+        if should_stop and should_stop():
+            result['cancelled'] = True
+            break
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        created, updated = db.write_sync(_write_chunk, chunk, existing, default_statut, ticket_price, today)
+        result['created'] += created
+        result['updated'] += updated
+        result['lines'] += len(chunk)
+        if progress:
+            progress(result['lines'])
+    return result
@@ -0,0 +1,118 @@
+"""
+Maintenance de la base par petites étapes, prévue pour tourner dans MaintenanceWorker
+(jamais sur le thread de l'interface) :
+
+1. archivage par lots de l'historique de plus de 2 ans (si activé)
+2. récupération des pages libres par incremental_vacuum, quelques centaines à la fois
+3. PRAGMA optimize à chaque passage, ANALYZE complet tous les ANALYZE_EVERY_DAYS jours
+
+Chaque étape est une tâche courte de l'écrivain unique (db.write_sync) : les écritures
+de l'interface passent dans la même file et s'intercalent entre deux lots.
+
+Le passage en auto_vacuum=INCREMENTAL demande un VACUUM complet, qui garde le verrou
+d'écriture pendant toute la reconstruction (plus que le délai d'attente de 10 s sur une
+grosse base) : convert_auto_vacuum() est lancé une seule fois, au démarrage, avant que
+l'interface n'accepte une saisie (main.py).
+"""
+import time
+from datetime import date, timedelta
+
+import database as db
+
+AUTO_VACUUM_INCREMENTAL = 2
+VACUUM_PAGES_PER_STEP = 500
+ANALYZE_EVERY_DAYS = 30
+ARCHIVE_AFTER_YEARS = 2
+
+
+class MaintenanceCancelled(Exception):
+    pass
+
+
+def is_due(today=None):
+    """Une maintenance par jour au plus (lancée au démarrage)."""
+    today = today or date.today().isoformat()
+    return db.get_config('LAST_MAINTENANCE') != today
+
+
+def needs_auto_vacuum_conversion():
+    with db.connection() as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL
+
+
+def convert_auto_vacuum():
+    """auto_vacuum incrémental (ne prend effet qu'après un VACUUM complet)."""
+    with db.connection() as conn:
+        conn.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+    # Les connexions déjà ouvertes gardent l'ancien mode en mémoire (PRAGMA auto_vacuum
+    # y répond encore 0) : le pool est rouvert
+    db.close_all_connections()
+
+
+def _vacuum_step(c):
+    """Libère jusqu'à VACUUM_PAGES_PER_STEP pages. Retourne le nombre de pages encore libres."""
+    # sqlite3 n'exécute qu'un pas de PRAGMA incremental_vacuum, soit une page : répété
+    for _ in range(VACUUM_PAGES_PER_STEP):
+        c.execute("PRAGMA incremental_vacuum(1)")
+    return c.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _analyze(c, full):
+    if full:
+        c.execute("ANALYZE")
+        db.set_config('LAST_ANALYZE', date.today().isoformat())  # Même transaction
+    else:
+        c.execute("PRAGMA optimize")
+
+
+def run_maintenance(archive=False, progress=None, should_stop=None):
+    """
+    Exécute toutes les étapes. progress(message, pourcentage) est appelé au fil de l'eau,
+    should_stop() est consulté entre deux lots (MaintenanceCancelled si vrai).
+    Retourne le nombre de lignes archivées.
+    """
+    def report(message, percent):
+        if progress:
+            progress(message, percent)
+
+    def check_stop():
+        if should_stop and should_stop():
+            raise MaintenanceCancelled()
+
+    # 1. Archivage par lots
+    archived = 0
+    if archive:
+        before = (date.today() - timedelta(days=365 * ARCHIVE_AFTER_YEARS)).isoformat()
+
+        def on_batch(moved):
+            report(f"Archivage : {moved} lignes déplacées", 30)
+            check_stop()
+
+        report("Archivage de l'historique ancien...", 10)
+        archived = db.archive_old_history(before, progress=on_batch)
+
+    # 2. Récupération des pages libres, pas à pas
+    # (incremental_vacuum ne fait rien tant que convert_auto_vacuum() n'a pas tourné)
+    total_free = 0
+    if not needs_auto_vacuum_conversion():
+        with db.connection() as conn:
+            total_free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    free = total_free
+    while free > 0:
+        check_stop()
+        free = db.write_sync(_vacuum_step)
+        report(f"Compactage : {total_free - free}/{total_free} pages", 40 + int(50 * (total_free - free) / total_free))
+        time.sleep(0.01)  # Laisse passer les écritures de l'interface
+
+    # 3. Statistiques de l'optimiseur
+    check_stop()
+    last_analyze = db.get_config('LAST_ANALYZE')
+    full = not last_analyze or date.fromisoformat(last_analyze) <= date.today() - timedelta(days=ANALYZE_EVERY_DAYS)
+    if full:
+        report("Analyse des index...", 92)
+    db.write_sync(_analyze, full)
+
+    db.set_config('LAST_MAINTENANCE', date.today().isoformat())
+    report("Maintenance terminée", 100)
+    return archived
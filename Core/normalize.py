@@ -0,0 +1,27 @@
+"""
+Normalisation des noms : même règle pour la recherche et pour l'identité des usagers.
+
+    strip_accents("Zoé")               -> "ZOE"
+    name_key("le  gall", "Anne-Marie") -> "LE GALL|ANNE-MARIE"
+
+name_key() est stockée dans usagers.nom_key (indexée) : "Élise" et "ELISE" sont le même usager.
+"""
+import unicodedata
+
+NAME_KEY_SEPARATOR = "|"  # Sépare nom et prénom : "LE GALL" + "" != "LE" + "GALL"
+
+
+def strip_accents(text):
+    """Majuscules sans accents (règle historique de la recherche)."""
+    if not text:
+        return ""
+    return "".join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c)).upper()
+
+
+def normalize_name(text):
+    """strip_accents + espaces superflus supprimés."""
+    return " ".join(strip_accents(text).split())
+
+
+def name_key(nom, prenom):
+    return f"{normalize_name(nom)}{NAME_KEY_SEPARATOR}{normalize_name(prenom)}"
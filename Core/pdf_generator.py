@@ -10,10 +10,12 @@ from datetime import datetime, date, timedelta
 from constants import (
     DB_FILE, ARCHIVE_DIR, HAS_REPORTLAB, AppColors
 )
-from database import get_connection, get_config
+from database import get_connection, get_config, history_source, write_sync
 
 # Import du service de stats
 from Core.stats import StatsService
+from Core.trends import load_trends, WEEKDAY_NAMES
+from Core.periods import month_bounds, period_bounds, range_clause
 
 # Imports ReportLab (Gestion de l'absence de la librairie)
 if HAS_REPORTLAB:
@@ -23,6 +25,63 @@ if HAS_REPORTLAB:
     from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.lib.units import mm
 
+# ============================================================================
+# REQUÊTES DES BILANS (contrôlées par tests/test_query_plans.py)
+# ============================================================================
+# Paramètres : [statuts...,] début, fin[ de la période
+TUTELLES_FIX_SQL = f"""
+    UPDATE historique_passages 
+    SET statut_au_passage = 'Tutelles' 
+    WHERE usager_id IN (SELECT id FROM usagers WHERE statut = 'Tutelles') 
+    AND statut_au_passage = 'Avances' 
+    AND {range_clause()}
+"""
+
+ANONYMES_SQL = f"""
+    SELECT date_passage, SUM(nb) 
+    FROM daily_stats 
+    WHERE action=? 
+    AND sexe=? 
+    AND {range_clause()} 
+    GROUP BY date_passage
+"""
+
+
+def group_grid_sql(nb_statuts):
+    """Grille usagers x jours d'un groupe de statuts, lue dans le cumul user_day_conso."""
+    placeholders = ",".join("?" * nb_statuts)
+    return f"""
+        SELECT usager_id, date_passage, SUM(quantite) 
+        FROM user_day_conso 
+        WHERE statut_au_passage IN ({placeholders}) 
+        AND {range_clause()} 
+        GROUP BY usager_id, date_passage
+    """
+
+
+def group_users_sql(nb_statuts):
+    """Usagers d'un groupe de statuts ayant consommé sur la période."""
+    placeholders = ",".join("?" * nb_statuts)
+    return f"""
+        SELECT u.id, u.nom, u.prenom, u.sexe, u.solde 
+        FROM usagers u 
+        WHERE u.id IN (
+            SELECT usager_id FROM user_day_conso 
+            WHERE statut_au_passage IN ({placeholders}) 
+            AND {range_clause()} 
+            AND nb_tickets > 0
+        ) 
+        ORDER BY u.nom, u.prenom
+    """
+
+
+def ventes_directes_sql(source="historique_passages"):
+    return f"""
+        SELECT COUNT(*) FROM {source} 
+        WHERE action='PAYE' AND detail='Anonyme' 
+        AND {range_clause()}
+    """
+
 # ============================================================================
 # UTILITAIRES DATES
 # ============================================================================
@@ -130,19 +189,16 @@ def generate_pdf_logic(ticket_price, secondary_path=None, silent_mode=False):
     n_row.append("")
     
     # 4. Récupération des données
+    # Mois en cours : [1er du mois, 1er du mois suivant[ (utilisable par les index)
+    month_params = list(month_bounds(now))
+    
+    # Mise à jour rétroactive des statuts pour l'affichage cohérent (via l'écrivain unique)
+    write_sync(lambda c: c.execute(TUTELLES_FIX_SQL, month_params))
+    
+    # Lecture seule : la connexion du pool est rendue à la fin (conn.close())
     conn = get_connection()
     c = conn.cursor()
     
-    # Mise à jour rétroactive des statuts pour l'affichage cohérent
-    c.execute("""
-        UPDATE historique_passages 
-        SET statut_au_passage = 'Tutelles' 
-        WHERE usager_id IN (SELECT id FROM usagers WHERE statut = 'Tutelles') 
-        AND statut_au_passage = 'Avances' 
-        AND strftime('%Y-%m', date_passage) = ?
-    """, (now.strftime("%Y-%m"),))
-    conn.commit()
-    
     groups = [
         ("Payés", ["Payés", "Pas de crédit"]), 
         ("Avances", ["Avances"]), 
@@ -155,17 +211,13 @@ def generate_pdf_logic(ticket_price, secondary_path=None, silent_mode=False):
         elements.append(Paragraph(f"<b>BILAN DU MOIS DE {m_name} {year} - {group_name.upper()}</b>", title_style))
         elements.append(Spacer(1, 3*mm))
         
-        placeholders = ",".join("?" for _ in subtypes)
-        query_users = f"""
-            SELECT DISTINCT u.id, u.nom, u.prenom, u.sexe, u.solde 
-            FROM usagers u 
-            JOIN historique_passages h ON u.id = h.usager_id 
-            WHERE h.statut_au_passage IN ({placeholders}) 
-            AND strftime('%Y-%m', h.date_passage) = ? 
-            AND h.action = 'Consommation ticket(s)' 
-            ORDER BY u.nom
-        """
-        c.execute(query_users, subtypes + [now.strftime("%Y-%m")])
+        # Grille usagers x jours du mois lue en une requête dans le cumul user_day_conso
+        c.execute(group_grid_sql(len(subtypes)), subtypes + month_params)
+        grid = {}
+        for r in c.fetchall():
+            grid.setdefault(r[0], []).append(r[1:])
+        
+        c.execute(group_users_sql(len(subtypes)), subtypes + month_params)
         users = c.fetchall()
         
         table_data = [h_row, n_row]
@@ -188,18 +240,9 @@ def generate_pdf_logic(ticket_price, secondary_path=None, silent_mode=False):
             uid, nm, pr, sx, sl = u
             row = [f"{nm} {pr}"]
             
-            c2 = conn.cursor()
-            c2.execute(f"""
-                SELECT date_passage, quantite 
-                FROM view_conso_nettoyees 
-                WHERE usager_id=? 
-                AND statut_au_passage IN ({placeholders}) 
-                AND strftime('%Y-%m', date_passage)=?
-            """, [uid] + subtypes + [now.strftime("%Y-%m")])
-            
             consos = {}
             sec_t = 0
-            for r in c2.fetchall(): 
+            for r in grid.get(uid, []): 
                 d = int(r[0].split('-')[2]) - 1
                 try: 
                     q=int(r[1])
@@ -236,21 +279,16 @@ def generate_pdf_logic(ticket_price, secondary_path=None, silent_mode=False):
             for g, l in [('H', 'Anonymes Hommes'), ('F', 'Anonymes Femmes')]:
                 ar = [l]
                 c2 = conn.cursor()
-                c2.execute(f"""
-                    SELECT date_passage 
-                    FROM view_conso_nettoyees 
-                    WHERE action='{target}' 
-                    AND sexe=? 
-                    AND strftime('%Y-%m', date_passage)=?
-                """, (g, now.strftime("%Y-%m")))
+                c2.execute(ANONYMES_SQL, [target, g] + month_params)
                 
                 am = {}
                 for r in c2.fetchall(): 
                     d=int(r[0].split('-')[2])-1
-                    am[d]=am.get(d,0)+1
-                    col_sums_tickets[d]+=1
-                    tot_h_tickets[d]+=1 if g=='H' else 0
-                    tot_f_tickets[d]+=1 if g=='F' else 0
+                    n=r[1]
+                    am[d]=am.get(d,0)+n
+                    col_sums_tickets[d]+=n
+                    tot_h_tickets[d]+=n if g=='H' else 0
+                    tot_f_tickets[d]+=n if g=='F' else 0
                 
                 for i in range(num_days): 
                     ar.append(str(am.get(i,"")) if am.get(i,0)>0 else "")
@@ -340,7 +378,10 @@ def generate_custom_pdf_logic(d_start, d_end, ticket_price):
     if not HAS_REPORTLAB:
         raise ImportError("La librairie 'reportlab' est manquante.")
         
-    stats = StatsService.get_stats_range(d_start, d_end)
+    # Une requête groupée : le détail par pas et les totaux de la période
+    bucket = _breakdown_bucket(d_start, d_end)
+    series = StatsService.series(d_start, d_end, bucket)
+    stats = series.totals()
     
     temp_dir = tempfile.gettempdir()
     pdf_filename = f"Bilan_{d_start}_au_{d_end}.pdf"
@@ -360,24 +401,13 @@ def generate_custom_pdf_logic(d_start, d_end, ticket_price):
     c = conn.cursor()
     
     # Somme des recharges
-    c.execute("""
-        SELECT detail FROM historique_passages 
-        WHERE action='Recharge Compte' 
-        AND date_passage BETWEEN ? AND ?
-    """, (d_start, d_end))
-    
-    total_recharges = 0.0
-    for r in c.fetchall(): 
-        try: 
-            total_recharges += float(r[0].replace('€', '').replace('+', '').strip())
-        except: pass
+    total_recharges = StatsService.get_recharges_range(d_start, d_end)
     
     # Ventes directes anonymes
-    c.execute("""
-        SELECT COUNT(*) FROM historique_passages 
-        WHERE action='PAYE' AND detail='Anonyme' 
-        AND date_passage BETWEEN ? AND ?
-    """, (d_start, d_end))
+    range_params = list(period_bounds(d_start, d_end))
+    # Période ancienne : l'historique archivé est lu avec l'historique récent
+    source = history_source(conn, range_params[0])
+    c.execute(ventes_directes_sql(source), range_params)
     
     nb_ventes_directes = c.fetchone()[0]
     valeur_ventes_directes = nb_ventes_directes * ticket_price
@@ -452,6 +482,80 @@ def generate_custom_pdf_logic(d_start, d_end, ticket_price):
     ]))
     elements.append(Paragraph("<b>Finances</b>", styles['Heading3']))
     elements.append(t_fin)
+    elements.append(Spacer(1, 10*mm))
+
+    # Tableau 4: Détail par jour / semaine / mois
+    label_fmt = {"day": "%d/%m/%Y", "week": "Sem. du %d/%m/%Y", "month": "%m/%Y"}[bucket]
+    data_detail = [["Période", "Hommes", "Femmes", "Carte", "Avance", "1ère fois", "Total"]]
+    totals = series.total_passages
+    for i, start in enumerate(series.starts):
+        data_detail.append([
+            datetime.strptime(start, "%Y-%m-%d").strftime(label_fmt),
+            str(series.total_h[i]), str(series.total_f[i]),
+            str(series.tickets_carte[i] + series.tickets_tutelle[i]), str(series.tickets_avance[i]),
+            str(series.tickets_1ere_fois[i]), str(totals[i])
+        ])
+    t_detail = Table(data_detail, colWidths=[40*mm] + [20*mm] * 6, repeatRows=1)
+    t_detail.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor(AppColors.HEADER_BG)), 
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white), 
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'), 
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'), 
+        ('FONTSIZE', (0,0), (-1,-1), 8),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.black)
+    ]))
+    title = {"day": "jour", "week": "semaine", "month": "mois"}[bucket]
+    elements.append(Paragraph(f"<b>Détail par {title}</b>", styles['Heading3']))
+    elements.append(t_detail)
+    elements.append(Spacer(1, 10*mm))
+
+    # Tableau 5: Tendances au dernier jour de la période (profil : sur la période)
+    nb_days = (datetime.strptime(d_end, "%Y-%m-%d") - datetime.strptime(d_start, "%Y-%m-%d")).days + 1
+    trends = load_trends(end=d_end, profile_days=nb_days)
+
+    def fmt(value, pct=False):
+        if value is None: return "-"
+        return f"{value:+.1f} %" if pct else f"{value:.1f}"
+
+    data_trend = [
+        ["Indicateur", "Valeur"],
+        ["Passages / jour (moyenne 7 jours)", fmt(trends.latest("mean_7"))],
+        ["Passages / jour (moyenne 28 jours)", fmt(trends.latest("mean_28"))],
+        ["7 jours vs 7 jours précédents", fmt(trends.latest("wow"), pct=True)],
+        ["28 jours vs mêmes jours l'an dernier", fmt(trends.latest("yoy"), pct=True)],
+    ]
+    t_trend = Table(data_trend, colWidths=[100*mm, 50*mm])
+    t_trend.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor(AppColors.HEADER_BG)), 
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white), 
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'), 
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'), 
+        ('GRID', (0,0), (-1,-1), 1, colors.black)
+    ]))
+    data_week = [list(WEEKDAY_NAMES), [f"{v:.1f}" for v in trends.weekday_profile]]
+    t_week = Table(data_week, colWidths=[150*mm / 7] * 7)
+    t_week.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor(AppColors.HEADER_BG)), 
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white), 
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'), 
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'), 
+        ('GRID', (0,0), (-1,-1), 1, colors.black)
+    ]))
+    elements.append(Paragraph(f"<b>Tendances au {datetime.strptime(d_end, '%Y-%m-%d').strftime('%d/%m/%Y')}</b>", styles['Heading3']))
+    elements.append(t_trend)
+    elements.append(Spacer(1, 5*mm))
+    elements.append(Paragraph("Passages moyens par jour de la semaine sur la période", normal_style_centered))
+    elements.append(t_week)
     
     doc.build(elements)
-    return pdf_path
\ No newline at end of file
+    return pdf_path
+
+
+def _breakdown_bucket(d_start, d_end):
+    """Pas du détail du bilan personnalisé : au plus ~30 lignes dans les cas courants."""
+    days = (datetime.strptime(d_end, "%Y-%m-%d") - datetime.strptime(d_start, "%Y-%m-%d")).days + 1
+    if days <= 31:
+        return "day"
+    if days <= 190:
+        return "week"
+    return "month"
\ No newline at end of file
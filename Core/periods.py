@@ -0,0 +1,57 @@
+"""
+Périodes de dates sous forme d'intervalles semi-ouverts [début, fin[.
+
+date_passage est stocké en texte 'YYYY-MM-DD' : une comparaison de chaînes
+suffit et reste utilisable par les index, contrairement à strftime() sur chaque ligne.
+
+    clause, params = month_range(now)
+    c.execute(f"SELECT ... FROM daily_stats WHERE {clause}", params)
+"""
+from datetime import date, datetime, timedelta
+
+RANGE_SQL = "{column} >= ? AND {column} < ?"
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def range_clause(column="date_passage"):
+    """Condition SQL semi-ouverte sur une colonne de date."""
+    return RANGE_SQL.format(column=column)
+
+
+def day_bounds(day):
+    """(jour, lendemain) au format ISO."""
+    d = _to_date(day)
+    return d.isoformat(), (d + timedelta(days=1)).isoformat()
+
+
+def month_bounds(day):
+    """(1er du mois, 1er du mois suivant) ; accepte aussi 'YYYY-MM'."""
+    if isinstance(day, str) and len(day) == 7:
+        day = f"{day}-01"
+    first = _to_date(day).replace(day=1)
+    nxt = (first + timedelta(days=32)).replace(day=1)
+    return first.isoformat(), nxt.isoformat()
+
+
+def period_bounds(start, end):
+    """Période saisie avec fin incluse (ex : du 01/03 au 15/03) -> [début, lendemain de fin[."""
+    return _to_date(start).isoformat(), (_to_date(end) + timedelta(days=1)).isoformat()
+
+
+def day_range(day, column="date_passage"):
+    return range_clause(column), list(day_bounds(day))
+
+
+def month_range(day, column="date_passage"):
+    return range_clause(column), list(month_bounds(day))
+
+
+def period_range(start, end, column="date_passage"):
+    return range_clause(column), list(period_bounds(start, end))
@@ -0,0 +1,409 @@
+"""
+Profilage SQL (optionnel) : durée, lignes lues ou écrites et appelant de chaque requête.
+
+Activé par `python main.py --profile-sql` (ou la variable d'environnement RESTO_PROFILE_SQL,
+dont la valeur peut donner le seuil en ms) : toutes les connexions du pool utilisent alors
+ProfiledCursor (database.set_cursor_factory).
+- Les requêtes sont regroupées par forme (texte normalisé, littéraux remplacés par ?) :
+  nombre d'exécutions, temps total et maximum, lignes, appelants
+  (« update_charts > StatsService.dashboard » : point d'entrée > fonction qui a lancé la requête).
+- Le plan (EXPLAIN QUERY PLAN) est relevé la première fois qu'une forme est vue.
+- Toute exécution au-delà du seuil est écrite dans un journal tournant (SQL_PROFILE_LOG).
+
+Le résumé s'affiche dans la fenêtre « À propos » et à la fermeture de l'appli, ou en ligne
+de commande, en profilant les lectures habituelles (compteurs, graphiques, bilans, PDF) :
+
+    python -m Core.profiling [--db CHEMIN] [--threshold MS]
+
+Désactivé, le coût est nul : les connexions gardent le curseur standard de sqlite3.
+"""
+import os
+import re
+import sys
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+
+import database as db
+from constants import BASE_DIR, SQL_PROFILE_LOG, HAS_REPORTLAB
+
+SLOW_QUERY_MS = 50
+LOG_MAX_BYTES = 1_000_000
+LOG_BACKUP_COUNT = 3
+SUMMARY_LIMIT = 15
+PLANNED_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# ============================================================================
+# FORME DES REQUÊTES ET PLANS
+# ============================================================================
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.:?$@])-?\d+(?:\.\d+)?\b")
+_PARAM_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(sql):
+    """Texte normalisé d'une requête : les variantes d'une même requête partagent leurs mesures."""
+    shape = _STRING_RE.sub("?", sql)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _SPACES_RE.sub(" ", shape).strip()
+    return _PARAM_LIST_RE.sub("(?, ...)", shape)
+
+
+def query_plan(conn, sql, parameters=()):
+    """Lignes d'EXPLAIN QUERY PLAN (indentées selon l'arbre), None si la requête ne s'y prête pas."""
+    if not sql.lstrip().upper().startswith(PLANNED_STATEMENTS):
+        return None
+    try:
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    depth, lines = {0: -1}, []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return tuple(lines)
+
+# ============================================================================
+# APPELANTS
+# ============================================================================
+_APP_DIR = os.path.normcase(os.path.abspath(BASE_DIR)) + os.sep
+_SKIPPED_FILES = {os.path.normcase(os.path.abspath(path)) for path in (db.__file__, __file__)}
+_ENTRY_FILES = tuple(
+    os.path.normcase(os.path.join(os.path.abspath(BASE_DIR), path))
+    for path in ("main.py", "UI" + os.sep, os.path.join("Core", "workers.py"))
+)
+_frame_kinds = {}
+
+
+def _frame_kind(filename):
+    """'entry' (interface, workers), 'app' (reste de l'appli) ou None (couche SQL, bibliothèques)."""
+    kind = _frame_kinds.get(filename, False)
+    if kind is False:
+        path = os.path.normcase(os.path.abspath(filename))
+        if filename.startswith("<") or not path.startswith(_APP_DIR) or path in _SKIPPED_FILES:
+            kind = None
+        elif path.startswith(_ENTRY_FILES):
+            kind = "entry"
+        else:
+            kind = "app"
+        _frame_kinds[filename] = kind
+    return kind
+
+
+def _function_name(code):
+    name = getattr(code, "co_qualname", code.co_name)
+    return name.split(".<locals>")[0]  # compute() d'une méthode : on garde la méthode
+
+
+def call_site(label=None):
+    """
+    « entrée > fonction » pour la requête en cours : fonction de l'appli la plus proche,
+    précédée du point d'entrée (slot de l'interface, run() d'un worker, sinon premier
+    appelant de l'appli, ou label donné par SqlProfiler.site()) ; à défaut, le nom du thread.
+    """
+    inner = entry = outer = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        kind = _frame_kind(frame.f_code.co_filename)
+        if kind:
+            name = _function_name(frame.f_code)
+            inner = inner or name
+            outer = name
+            if kind == "entry":
+                entry = name
+                break
+        frame = frame.f_back
+    entry = label or entry or outer
+    if inner is None or inner == entry:
+        return entry or f"[{threading.current_thread().name}]"
+    return f"{entry} > {inner}"
+
+# ============================================================================
+# MESURES
+# ============================================================================
+@dataclass
+class StatementStats:
+    shape: str
+    count: int = 0
+    total: float = 0.0  # Secondes
+    worst: float = 0.0
+    rows: int = 0
+    sites: Counter = field(default_factory=Counter)
+    plan: tuple = None
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class _Run:
+    """Une exécution en cours : chronométrée de execute() à la dernière ligne lue."""
+    __slots__ = ("stats", "site", "elapsed", "rows")
+
+    def __init__(self, stats, site):
+        self.stats, self.site = stats, site
+        self.elapsed, self.rows = 0.0, 0
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Curseur qui chronomètre l'exécution puis la lecture des lignes. La mesure est close
+    à la dernière ligne, au execute() suivant ou à la fermeture du curseur.
+    """
+    _run = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._run = sql_profiler.start(self.connection, sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq = iter(seq_of_parameters)
+        first = next(seq, None)  # Paramètres du plan ; la suite est rendue intacte
+        if first is not None:
+            seq = chain((first,), seq)
+        self._run = sql_profiler.start(self.connection, sql, first if first is not None else ())
+        return self._timed(super().executemany, sql, seq)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._count(len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._count(1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:  # Fin de l'interpréteur : module déjà démonté
+            pass
+
+    def _timed(self, method, *args):
+        start = perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._run is not None:
+                self._run.elapsed += perf_counter() - start
+
+    def _count(self, rows):
+        if self._run is not None:
+            self._run.rows += rows
+
+    def _finish(self):
+        run, self._run = self._run, None
+        if run is not None:
+            if run.rows == 0 and self.rowcount > 0:  # INSERT / UPDATE / DELETE
+                run.rows = self.rowcount
+            sql_profiler.finish(run)
+
+
+class SqlProfiler:
+    def __init__(self):
+        self._lock = threading.RLock()  # Un curseur peut être libéré (__del__) pendant une mise à jour
+        self._local = threading.local()
+        self._stats = {}
+        self._log = None
+        self.enabled = False
+        self.threshold = SLOW_QUERY_MS / 1000
+        self.log_path = None
+
+    def enable(self, threshold_ms=SLOW_QUERY_MS, log_path=SQL_PROFILE_LOG):
+        """Instrumente toutes les connexions ; log_path=None : pas de journal des requêtes lentes."""
+        self.threshold = threshold_ms / 1000
+        if log_path and self._log is None:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self._log = logging.getLogger("resto.sql")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            self._log.addHandler(handler)
+            self.log_path = log_path
+        self.enabled = True
+        db.set_cursor_factory(ProfiledCursor)
+
+    def disable(self):
+        db.set_cursor_factory(None)
+        self.enabled = False
+        if self._log is not None:
+            for handler in list(self._log.handlers):
+                self._log.removeHandler(handler)
+                handler.close()
+            self._log = None
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    @contextmanager
+    def site(self, name):
+        """Nomme le point d'entrée des requêtes lancées dans le bloc (thread courant)."""
+        previous = getattr(self._local, "site", None)
+        self._local.site = name
+        try:
+            yield
+        finally:
+            self._local.site = previous
+
+    def start(self, conn, sql, parameters):
+        shape = statement_shape(sql)
+        with self._lock:
+            stats = self._stats.get(shape)
+            new = stats is None
+            if new:
+                stats = self._stats[shape] = StatementStats(shape)
+        if new:
+            stats.plan = query_plan(conn, sql, parameters)
+        return _Run(stats, call_site(getattr(self._local, "site", None)))
+
+    def finish(self, run):
+        stats = run.stats
+        with self._lock:
+            stats.count += 1
+            stats.total += run.elapsed
+            stats.worst = max(stats.worst, run.elapsed)
+            stats.rows += run.rows
+            stats.sites[run.site] += 1
+        if run.elapsed >= self.threshold and self._log is not None:
+            plan = "".join(f"\n    | {line}" for line in stats.plan or ())
+            self._log.info(f"{run.elapsed * 1000:.1f} ms, {run.rows} ligne(s), {run.site}\n    {stats.shape}{plan}")
+
+    def statements(self):
+        """Mesures par forme de requête, de la plus coûteuse (temps total) à la moins coûteuse."""
+        with self._lock:
+            return sorted(
+                (StatementStats(s.shape, s.count, s.total, s.worst, s.rows, Counter(s.sites), s.plan) for s in self._stats.values() if s.count),
+                key=lambda s: s.total, reverse=True
+            )
+
+    def summary(self, limit=SUMMARY_LIMIT, width=110):
+        """Résumé texte : requêtes les plus coûteuses avec appelants et plan."""
+        statements = self.statements()
+        total = sum(s.total for s in statements)
+        lines = [
+            f"Profil SQL : {sum(s.count for s in statements)} exécution(s), {len(statements)} requête(s) distincte(s), "
+            f"{total * 1000:.1f} ms au total (seuil lent : {self.threshold * 1000:g} ms)",
+            f"{'appels':>7} {'total ms':>10} {'moy. ms':>9} {'max ms':>9} {'lignes':>9}  requête",
+        ]
+        for s in statements[:limit]:
+            shape = s.shape if len(s.shape) <= width else s.shape[:width - 3] + "..."
+            lines.append(f"{s.count:>7} {s.total * 1000:>10.2f} {s.mean * 1000:>9.3f} {s.worst * 1000:>9.2f} {s.rows:>9}  {shape}")
+            sites = ", ".join(f"{site} ({n})" for site, n in s.sites.most_common(3))
+            lines.append(f"{'':>48}appelants : {sites}")
+            for step in s.plan or ():
+                lines.append(f"{'':>48}plan : {step}")
+        if len(statements) > limit:
+            lines.append(f"... {len(statements) - limit} autre(s) requête(s)")
+        return "\n".join(lines)
+
+    def report(self, limit=SUMMARY_LIMIT):
+        """Résumé, également ajouté au journal (fermeture de l'appli)."""
+        text = self.summary(limit)
+        if self._log is not None:
+            self._log.info("\n" + text)
+        return text
+
+
+sql_profiler = SqlProfiler()
+
+
+def enable_from_environment(argv=None):
+    """Active le profilage si --profile-sql est passé ou si RESTO_PROFILE_SQL est définie (seuil en ms)."""
+    argv = sys.argv if argv is None else argv
+    value = os.environ.get("RESTO_PROFILE_SQL")
+    if "--profile-sql" not in argv and not value:
+        return False
+    try:
+        threshold = float(value) if value else SLOW_QUERY_MS
+    except ValueError:
+        threshold = SLOW_QUERY_MS
+    sql_profiler.enable(threshold)
+    return True
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+def profile_standard_reads():
+    """Lectures d'une session type : compteurs, graphiques, bilans du mois et de l'année, tendances, PDF."""
+    from datetime import date, timedelta
+    from Core.counters import today_counters
+    from Core.stats import StatsService
+    from Core.trends import load_trends
+
+    today = date.today()
+    month, year = today.replace(day=1).isoformat(), (today - timedelta(days=364)).isoformat()
+    with sql_profiler.site("refresh_counters"):
+        today_counters.seed()
+        today_counters.snapshot()
+    with sql_profiler.site("update_charts"):
+        StatsService.dashboard()
+    with sql_profiler.site("bilan du mois"):
+        StatsService.get_stats_range(month, today.isoformat())
+        StatsService.get_recharges_range(month, today.isoformat())
+    with sql_profiler.site("refresh_trends"):
+        load_trends()
+    if HAS_REPORTLAB:
+        from Core.pdf_generator import generate_custom_pdf_logic
+        with sql_profiler.site("generate_custom_pdf_logic"):
+            generate_custom_pdf_logic(year, today.isoformat(), db.get_ticket_price())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil SQL des lectures habituelles du tableau de bord")
+    parser.add_argument("--db", help="Base à profiler (défaut : base de l'appli)")
+    parser.add_argument("--threshold", type=float, default=SLOW_QUERY_MS, help="Seuil des requêtes lentes (ms)")
+    parser.add_argument("--limit", type=int, default=SUMMARY_LIMIT)
+    args = parser.parse_args()
+
+    if args.db:
+        db.use_database(args.db)
+    sql_profiler.enable(args.threshold)
+    try:
+        db.init_db()
+        profile_standard_reads()
+        print(sql_profiler.report(args.limit))
+        print(f"\nRequêtes lentes : {sql_profiler.log_path}")
+    finally:
+        db.close_all_connections()
+        sql_profiler.disable()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Cumuls tenus par triggers (daily_stats, user_day_conso) : contrôle et recalcul.
+
+    python -m Core.rollups --check
+    python -m Core.rollups --rebuild [table ...]
+"""
+import os
+import sys
+import argparse
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+
+# ============================================================================
+# CONTRÔLE DE COHÉRENCE
+# ============================================================================
+def check_rollup(table):
+    """
+    Compare un cumul à l'agrégat recalculé depuis l'historique.
+    Retourne (lignes manquantes ou fausses, lignes en trop).
+    """
+    columns, query = db.ROLLUPS[table]
+    with db.connection() as conn:
+        # Les lignes archivées comptent aussi dans les cumuls
+        expected = query.format(source=db.history_source(conn), where="1")
+        missing = conn.execute(f"SELECT COUNT(*) FROM ({expected} EXCEPT SELECT {columns} FROM {table})").fetchone()[0]
+        extra = conn.execute(f"SELECT COUNT(*) FROM (SELECT {columns} FROM {table} EXCEPT {expected})").fetchone()[0]
+    return missing, extra
+
+
+def check_rollups():
+    """{table: (manquantes, en trop)} pour chaque cumul."""
+    return {table: check_rollup(table) for table in db.ROLLUPS}
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Contrôle / recalcul des cumuls de l'historique")
+    parser.add_argument("--check", action="store_true", help="compare les cumuls à l'historique")
+    parser.add_argument("--rebuild", nargs="*", metavar="TABLE", help="recalcule les cumuls (tous par défaut)")
+    parser.add_argument("--db", help="fichier de base (défaut : base de l'application)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.use_database(args.db)
+    db.init_db()
+
+    if args.rebuild is not None:
+        tables = args.rebuild or list(db.ROLLUPS)
+        unknown = [t for t in tables if t not in db.ROLLUPS]
+        if unknown:
+            parser.error(f"cumul inconnu : {', '.join(unknown)}")
+        db.rebuild_rollups(tables)
+        print(f"Recalculé : {', '.join(tables)}")
+
+    if args.check or args.rebuild is None:
+        ok = True
+        for table, (missing, extra) in check_rollups().items():
+            state = "ok" if missing == extra == 0 else "INCOHÉRENT"
+            print(f"{table:<16} {state:<11} manquantes/fausses : {missing}  en trop : {extra}")
+            ok = ok and missing == extra == 0
+        return 0 if ok else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Liste des usagers tenue en mémoire, pour la liste principale et ses filtres.
+
+Chargée une fois, puis tenue à jour par les écritures : après chaque commit de ce
+processus, data_version.follow_usagers transmet les id des usagers ajoutés, modifiés
+ou supprimés (triggers de database._watch_usagers), et seuls ceux-là sont relus au
+prochain refresh(). Une écriture d'un autre processus ou une restauration provoque
+un rechargement complet.
+
+Chaque usager occupe un emplacement (slot) : records[slot] est la ligne affichée
+(tuple roster_row), names (Core/search.py) l'index de ses noms normalisés. Pour chaque
+critère de filtre (statut affiché, sexe, Positif / Négatif), un entier sert d'ensemble
+de bits des slots concernés : cocher ou décocher un filtre ne coûte que quelques
+opérations sur ces masques, sans requête.
+
+    roster_store.refresh(ticket_price)
+    slots = roster_store.slots(roster_store.visible_mask(filters))
+    scores = roster_store.search(strip_accents(text), slots)
+"""
+import threading
+
+import database as db
+from Core.search import NameIndex, search_scores
+
+ROSTER_SQL = "SELECT id, nom, prenom, sexe, statut, ticket, commentaire, passage FROM usagers"
+COL_ID, COL_NOM, COL_PRENOM, COL_SEXE, COL_STATUT, COL_SOLDE, COL_TICKET, COL_COMMENTAIRE, COL_PASSAGE = range(9)
+RELOAD_THRESHOLD = 500  # Au-delà, un rechargement complet coûte moins que la relecture par id
+
+# Positions des bits à 1 de chaque octet (extraction des slots d'un masque)
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+def roster_row(record, ticket_price):
+    """Ligne affichée d'un usager (id, nom, prenom, sexe, statut, ticket, commentaire, passage)."""
+    uid, nom, prenom, sexe, statut, ticket, commentaire, passage = record
+    ticket = ticket or 0
+    # Payés / Avances suivent le signe du nombre de tickets
+    if statut in ("Payés", "Avances"):
+        if ticket < 0: statut = "Avances"
+        elif ticket > 0: statut = "Payés"
+    return (uid, nom or "", prenom or "", sexe or "", statut or "", ticket * ticket_price, ticket, commentaire or "", passage or "")
+
+
+def filter_keys(row):
+    """Critères de filtre d'une ligne : statut affiché, sexe, signe du solde."""
+    return (row[COL_STATUT], row[COL_SEXE], "Positif" if row[COL_SOLDE] >= 0 else "Négatif")
+
+
+def mask_slots(mask):
+    """Slots (positions des bits à 1) d'un masque, par ordre croissant."""
+    slots = []
+    for i, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, "little")):
+        if byte:
+            base = i * 8
+            slots.extend(base + bit for bit in _BYTE_BITS[byte])
+    return slots
+
+
+class RosterStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()    # id modifiés depuis le dernier refresh()
+        self._generation = None  # data_version du dernier chargement complet (None : jamais chargé)
+        self.ticket_price = None
+        self._clear()
+
+    def _clear(self):
+        self.records = []        # slot -> roster_row, None si l'usager a été supprimé
+        self.names = NameIndex() # slot -> noms normalisés, recherche par préfixe
+        self._slot_of = {}       # id -> slot
+        self._masks = {}         # critère -> bits des slots
+        self._live = 0           # bits des slots occupés
+        self._names = {}         # Statuts et sexes partagés entre les lignes
+
+    def refresh(self, ticket_price):
+        """
+        Met la liste à jour : relit les seuls usagers modifiés depuis l'appel précédent,
+        tout si une modification n'a pas pu être suivie ou si le prix du ticket a changé.
+        Retourne True si la liste a changé.
+        """
+        if (self._generation is None or ticket_price != self.ticket_price
+                or db.data_version.changed_unknown_since(self._generation)):
+            self._load(ticket_price)
+            return True
+        with self._lock:
+            ids, self._pending = self._pending, set()
+        if not ids:
+            return False
+        if len(ids) > RELOAD_THRESHOLD:
+            self._load(ticket_price)
+        else:
+            self._update(ids)
+        return True
+
+    def _changed(self, ids):
+        """Usagers modifiés par un commit (appelé dans le thread qui a validé)."""
+        with self._lock:
+            self._pending |= ids
+
+    def _load(self, ticket_price):
+        db.data_version.follow_usagers(self._changed)
+        with self._lock:
+            self._pending = set()  # Les commits suivants seront relus au prochain refresh()
+        generation = db.data_version.current()
+        with db.connection() as conn:
+            records = conn.execute(ROSTER_SQL).fetchall()
+        self._clear()
+        self.ticket_price = ticket_price
+        bits = {}
+        for slot, record in enumerate(records):
+            row = self._store(record, slot)
+            for key in filter_keys(row):
+                bits.setdefault(key, []).append(slot)
+        # Masques construits en une fois (un OR par ligne recopierait l'entier à chaque fois)
+        size = (len(records) + 7) // 8
+        for key, slots in bits.items():
+            self._masks[key] = self._mask_of(slots, size)
+        self._live = (1 << len(records)) - 1
+        self._generation = generation
+
+    @staticmethod
+    def _mask_of(slots, size):
+        data = bytearray(size)
+        for slot in slots:
+            data[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(data, "little")
+
+    def _store(self, record, slot):
+        uid, nom, prenom, sexe, statut, *rest = record
+        names = self._names  # Une seule chaîne par statut / sexe pour toute la liste
+        row = roster_row((uid, nom, prenom, names.setdefault(sexe, sexe), names.setdefault(statut, statut), *rest), self.ticket_price)
+        if slot == len(self.records):
+            self.records.append(row)
+        else:
+            self.records[slot] = row
+        self.names.set(slot, row[COL_NOM], row[COL_PRENOM])
+        self._slot_of[row[COL_ID]] = slot
+        return row
+
+    def _update(self, ids):
+        ids = list(ids)
+        with db.connection() as conn:
+            found = {r[0]: r for r in conn.execute(f"{ROSTER_SQL} WHERE id IN ({','.join('?' * len(ids))})", ids)}
+        for uid in ids:
+            slot = self._slot_of.pop(uid, None)
+            if slot is not None:
+                self._unmask(slot)
+            record = found.get(uid)
+            if record is None:
+                if slot is not None:
+                    self.records[slot] = None
+                    self.names.remove(slot)
+                continue
+            slot = len(self.records) if slot is None else slot
+            row = self._store(record, slot)
+            bit = 1 << slot
+            self._live |= bit
+            for key in filter_keys(row):
+                self._masks[key] = self._masks.get(key, 0) | bit
+
+    def _unmask(self, slot):
+        keep = ~(1 << slot)
+        self._live &= keep
+        for key in filter_keys(self.records[slot]):
+            self._masks[key] &= keep
+
+    def visible_mask(self, filters):
+        """Slots à afficher : filters = {critère: coché}, un critère décoché masque ses usagers."""
+        hidden = 0
+        for key, shown in filters.items():
+            if not shown:
+                hidden |= self._masks.get(key, 0)
+        return self._live & ~hidden
+
+    def search(self, text, slots):
+        """{slot: score} des slots qui correspondent à text (normalisé par strip_accents)."""
+        try:
+            uid = int(text)
+        except ValueError:
+            uid = None
+        id_slot = self._slot_of.get(uid) if str(uid) == text else None
+        return search_scores(self.names, text, slots, id_slot)
+
+    def slots(self, mask=None):
+        return mask_slots(self._live if mask is None else mask)
+
+    def count(self, mask=None):
+        return bin(self._live if mask is None else mask).count("1")
+
+
+roster_store = RosterStore()
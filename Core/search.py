@@ -0,0 +1,155 @@
+"""
+Recherche d'usagers par nom : index des noms normalisés et scores de la liste principale.
+
+Les noms ne sont normalisés (strip_accents) qu'une fois, à l'ajout ou à la modification
+d'un usager. Une table triée de clés (nom, prénom, "nom prénom", "prénom nom") donne par
+dichotomie les usagers dont un nom commence par le texte cherché :
+
+      100  id exact
+       95  le nom ou le prénom commence par le texte
+       90  "nom prénom" ou "prénom nom" commence par le texte
+       70  le texte apparaît dans "nom prénom" ou "prénom nom"
+    36-60  ressemblance (difflib) supérieure à 0.6, x 60
+
+Seuls les scores 70 et moins demandent de parcourir les usagers ; la table sert aussi
+aux propositions de l'autocomplétion.
+"""
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+
+from Core.normalize import strip_accents
+
+NOM, PRENOM, FULL, INVERSE = range(4)  # Formes d'un nom : index dans NameIndex.forms[slot]
+FUZZY_THRESHOLD = 0.6
+
+
+def _keys(slot, forms):
+    # Clés de la table triée d'un usager (les formes vides ne commencent par rien)
+    return [(key, kind, slot) for kind, key in enumerate(forms) if key.strip()]
+
+
+class NameIndex:
+    """
+    Noms des usagers, par slot de la liste en mémoire (Core/roster.py) :
+    forms[slot] = (nom, prénom, "nom prénom", "prénom nom") normalisés,
+    labels[slot] = ("Nom Prénom", "Prénom Nom") tels que saisis, pour l'autocomplétion.
+    La table triée n'est construite qu'à la première recherche, puis tenue à jour.
+    """
+    def __init__(self):
+        self.forms = []
+        self.labels = []
+        self._table = None  # [(clé, forme, slot)] triée
+
+    def set(self, slot, nom, prenom):
+        n, p = strip_accents(nom), strip_accents(prenom)
+        forms = (n, p, f"{n} {p}", f"{p} {n}")
+        labels = (f"{nom} {prenom}".strip(), f"{prenom} {nom}".strip())
+        if slot == len(self.forms):
+            self.forms.append(forms)
+            self.labels.append(labels)
+        else:
+            self._unindex(slot)
+            self.forms[slot], self.labels[slot] = forms, labels
+        if self._table is not None:
+            for key in _keys(slot, forms):
+                insort(self._table, key)
+
+    def remove(self, slot):
+        self._unindex(slot)
+        self.forms[slot] = self.labels[slot] = None
+
+    def _unindex(self, slot):
+        if self._table is None or self.forms[slot] is None:
+            return
+        for key in _keys(slot, self.forms[slot]):
+            del self._table[bisect_left(self._table, key)]
+
+    def _sorted(self):
+        if self._table is None:
+            self._table = sorted(key for slot, forms in enumerate(self.forms) if forms is not None
+                                 for key in _keys(slot, forms))
+        return self._table
+
+    def _starting_with(self, text):
+        """Entrées (clé, forme, slot) dont la clé commence par text, dans l'ordre de la table."""
+        table = self._sorted()
+        i = bisect_left(table, (text,))
+        while i < len(table) and table[i][0].startswith(text):
+            yield table[i]
+            i += 1
+
+    def prefix_scores(self, text):
+        """{slot: 95 ou 90} des usagers dont un nom commence par text (normalisé)."""
+        scores = {}
+        for _, kind, slot in self._starting_with(text):
+            score = 95 if kind in (NOM, PRENOM) else 90
+            if scores.get(slot, 0) < score:
+                scores[slot] = score
+        return scores
+
+    def completions(self, text, limit=10, mask=None):
+        """Noms (tels que saisis) commençant par text, sans doublon, parmi les slots de mask."""
+        labels = []
+        for _, kind, slot in self._starting_with(strip_accents(text)):
+            # Si le nom (prénom) commence par text, "nom prénom" ("prénom nom") aussi :
+            # seules ces formes complètes sont proposées, déjà dans l'ordre alphabétique
+            if kind in (NOM, PRENOM) or (mask is not None and not mask >> slot & 1):
+                continue
+            label = self.labels[slot][kind == INVERSE]
+            if label not in labels:
+                labels.append(label)
+                if len(labels) == limit:
+                    break
+        return labels
+
+
+class Similarity:
+    """
+    ratio() de difflib entre le texte cherché et des noms, 0 s'il ne peut dépasser le seuil.
+    ratio = 2 * caractères appariés / somme des longueurs : les appariés ne dépassent ni la
+    plus courte longueur, ni le nombre de caractères du nom présents dans le texte. Quand
+    ces bornes n'atteignent pas le seuil, la comparaison (coûteuse) est évitée ; un même
+    nom (prénom fréquent) n'est comparé qu'une fois.
+    """
+    def __init__(self, text):
+        self.text = text
+        self._chars = set(text)
+        self._ratios = {}
+
+    def __call__(self, name):
+        text = self.text
+        total = len(text) + len(name)
+        if 2.0 * min(len(text), len(name)) / total <= FUZZY_THRESHOLD:
+            return 0.0
+        if 2.0 * sum(map(self._chars.__contains__, name)) / total <= FUZZY_THRESHOLD:
+            return 0.0
+        ratio = self._ratios.get(name)
+        if ratio is None:
+            ratio = self._ratios[name] = SequenceMatcher(None, text, name).ratio()
+        return ratio
+
+
+def fuzzy_score(similarity, forms):
+    """Score d'un usager qu'aucun préfixe ne désigne : 70 (texte contenu), ressemblance, ou 0."""
+    text = similarity.text
+    nom, prenom, full, inverse = forms
+    if text in full or text in inverse:
+        return 70
+    best = max(similarity(nom), similarity(prenom), similarity(full))
+    return int(best * 60) if best > FUZZY_THRESHOLD else 0
+
+
+def search_scores(index, text, slots, id_slot=None):
+    """
+    {slot: score > 0} des slots qui correspondent à text (déjà normalisé par strip_accents),
+    id_slot : slot de l'usager dont l'id est text.
+    """
+    prefixed = index.prefix_scores(text)
+    if id_slot is not None:
+        prefixed[id_slot] = 100
+    scores, similarity, forms = {}, Similarity(text), index.forms
+    for slot in slots:
+        score = prefixed.get(slot) or fuzzy_score(similarity, forms[slot])
+        if score:
+            scores[slot] = score
+    return scores
@@ -1,24 +1,339 @@
-from database import get_connection
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from constants import HAS_NUMPY
+from database import connection, history_source, data_version
+from Core.periods import period_bounds, day_bounds, month_bounds, range_clause
+
+if HAS_NUMPY:
+    import numpy as np
+
+# Catégories de statut (compteurs, graphique "statut" et bilans)
+CARTE_STATUTS = ('Payés', 'Pas de crédit', 'Anonyme')
+PREMIERE_FOIS_STATUTS = ('1ère fois', 'Offert')
+CARTE_STATUTS_SQL = "('Payés', 'Pas de crédit', 'Anonyme')"
+PREMIERE_FOIS_STATUTS_SQL = "('1ère fois', 'Offert')"
+
+# (champ, colonne de daily_stats sommée, condition) : une colonne SUM(CASE ...) par champ
+_DAILY_FIGURES = (
+    ("total_h", "quantite", "sexe = 'H'"),
+    ("total_f", "quantite", "sexe = 'F'"),
+    ("tickets_carte", "quantite", f"statut_au_passage IN {CARTE_STATUTS_SQL}"),
+    ("tickets_avance", "quantite", "statut_au_passage = 'Avances'"),
+    ("tickets_tutelle", "quantite", "statut_au_passage = 'Tutelles'"),
+    ("tickets_1ere_fois", "quantite", f"statut_au_passage IN {PREMIERE_FOIS_STATUTS_SQL}"),
+    ("anon_paye", "nb", "action = 'PAYE'"),
+    ("anonymes", "nb", "action IN ('PAYE', '1ERE_FOIS')"),
+)
+
+
+def _figures_sql(prefix="", period=None):
+    """Colonnes SUM(CASE ...) de _DAILY_FIGURES, restreintes à une sous-période si besoin."""
+    cols = []
+    for name, column, cond in _DAILY_FIGURES:
+        if period:
+            cond = f"{cond} AND {period}"
+        cols.append(f"IFNULL(SUM(CASE WHEN {cond} THEN {column} END), 0) AS {prefix}{name}")
+    return ",\n        ".join(cols)
+
+
+# Requêtes sur [début, fin[ (paramètres : début, fin), contrôlées par tests/test_query_plans.py
+PERIOD_FIGURES_SQL = f"SELECT {_figures_sql()} FROM daily_stats WHERE {range_clause()}"
+SERIES_SQL = f"SELECT date_passage, {_figures_sql()} FROM daily_stats WHERE {range_clause()} GROUP BY date_passage"
+
+
+def recharges_sql(source="historique_passages"):
+    return f"SELECT IFNULL(SUM(montant), 0) FROM {source} WHERE action = 'Recharge Compte' AND {range_clause()}"
+
+
+def dashboard_sql(source="historique_passages"):
+    """Requête unique du tableau de bord (paramètres :day, :next_day, :month, :next_month)."""
+    in_month = "date_passage >= :month AND date_passage < :next_month"
+    in_day = "date_passage >= :day AND date_passage < :next_day"
+    return f"""
+        WITH figures AS (
+            SELECT
+            {_figures_sql("day_", in_day)},
+            {_figures_sql("month_")}
+            FROM daily_stats WHERE {in_month}
+        ),
+        recharges AS (
+            SELECT IFNULL(SUM(CASE WHEN {in_day} THEN montant END), 0) AS day_recharges,
+                   IFNULL(SUM(montant), 0) AS month_recharges
+            FROM {source} WHERE action = 'Recharge Compte' AND {in_month}
+        ),
+        passages AS (
+            SELECT CASE WHEN u.statut = 'Tutelles' THEN 1 WHEN u.solde >= 0 THEN 0 ELSE 1 END AS negatif,
+                   MAX(x.date_passage >= :day AND x.date_passage < :next_day) AS today
+            FROM user_day_conso x JOIN usagers u ON u.id = x.usager_id
+            WHERE x.date_passage >= :month AND x.date_passage < :next_month
+            GROUP BY u.id
+        ),
+        soldes AS (
+            SELECT IFNULL(SUM(today AND NOT negatif), 0) AS day_usagers_positif,
+                   IFNULL(SUM(today AND negatif), 0) AS day_usagers_negatif,
+                   IFNULL(SUM(NOT negatif), 0) AS month_usagers_positif,
+                   IFNULL(SUM(negatif), 0) AS month_usagers_negatif
+            FROM passages
+        )
+        SELECT * FROM figures, recharges, soldes
+    """
+
+
+@dataclass
+class PeriodStats:
+    """Chiffres du tableau de bord pour une période (jour ou mois)."""
+    total_h: int = 0
+    total_f: int = 0
+    tickets_carte: int = 0
+    tickets_avance: int = 0
+    tickets_tutelle: int = 0
+    tickets_1ere_fois: int = 0
+    anon_paye: int = 0        # Ventes anonymes (action PAYE)
+    anonymes: int = 0         # Passages anonymes (PAYE + 1ERE_FOIS)
+    recharges: float = 0.0
+    usagers_positif: int = 0  # Usagers passés dans la période, par solde
+    usagers_negatif: int = 0
+
+    @property
+    def total_passages(self):
+        return self.total_h + self.total_f
+
+    def caisse(self, ticket_price):
+        return self.recharges + self.anon_paye * ticket_price
+
+    def chart_sexe(self):
+        return {k: v for k, v in (("F", self.total_f), ("H", self.total_h)) if v}
+
+    def chart_statut(self):
+        return {"Payés": self.tickets_carte, "Avances": self.tickets_avance, "Tutelles": self.tickets_tutelle, "1ère fois": self.tickets_1ere_fois}
+
+    def chart_solde(self):
+        data = {"Négatif": self.usagers_negatif} if self.usagers_negatif else {}
+        data["Positif"] = self.usagers_positif + self.anonymes  # Les anonymes ont payé
+        return data
+
+
+@dataclass
+class Dashboard:
+    day: PeriodStats = field(default_factory=PeriodStats)
+    month: PeriodStats = field(default_factory=PeriodStats)
+
+
+def read_period(cursor, start, end):
+    """
+    PeriodStats de [start, end[ (sans la répartition des usagers par solde), lu avec
+    le curseur de l'appelant : dans sa transaction, sans passer par le cache.
+    """
+    row = cursor.execute(PERIOD_FIGURES_SQL, (start, end)).fetchone()
+    stats = PeriodStats(**dict(zip((name for name, _, _ in _DAILY_FIGURES), row)))
+    source = history_source(cursor.connection, start)
+    stats.recharges = cursor.execute(recharges_sql(source), (start, end)).fetchone()[0]
+    return stats
+
+
+# ============================================================================
+# SÉRIES (UNE VALEUR PAR JOUR / SEMAINE / MOIS)
+# ============================================================================
+SERIES_BUCKETS = ("day", "week", "month")  # Semaines du lundi au dimanche
+SERIES_FIELDS = tuple(name for name, _, _ in _DAILY_FIGURES)
+
+
+def _bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, bucket):
+    if bucket == "week":
+        return day + timedelta(days=7)
+    if bucket == "month":
+        return (day + timedelta(days=32)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _zeros(n):
+    """Colonne d'entiers : tableau NumPy si disponible, sinon array('q')."""
+    if HAS_NUMPY:
+        return np.zeros(n, dtype=np.int64)
+    return array('q', bytes(8 * n))
+
+
+@dataclass
+class StatsSeries:
+    """
+    Chiffres de get_stats_range découpés par pas, en colonnes : starts[i] est le début
+    du pas i (ISO), total_h[i] etc. ses valeurs. Les pas sans passage valent 0.
+    Le premier et le dernier pas peuvent être partiels (bornes de la période).
+    """
+    bucket: str
+    starts: list
+    total_h: object
+    total_f: object
+    tickets_carte: object
+    tickets_avance: object
+    tickets_tutelle: object
+    tickets_1ere_fois: object
+    anon_paye: object
+    anonymes: object
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def total_passages(self):
+        if HAS_NUMPY:
+            return self.total_h + self.total_f
+        return array('q', (h + f for h, f in zip(self.total_h, self.total_f)))
+
+    def totals(self):
+        """Sommes de la période, au format de get_stats_range."""
+        stats = {name: int(sum(getattr(self, name))) for name in SERIES_FIELDS if name not in ('anon_paye', 'anonymes')}
+        stats['total_passages'] = stats['total_h'] + stats['total_f']
+        return stats
+
+
+class _StatsCache:
+    """
+    Résultats de StatsService par (requête, période), valables tant que data_version
+    n'a pas bougé : un succès ne coûte qu'une lecture de PRAGMA data_version.
+    Une période entièrement passée survit aux écritures qui ne touchent pas ses dates
+    (les passages du jour n'invalident pas le bilan du mois dernier).
+    """
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (version, résultat)
+
+    def get(self, key, compute, history_range=None):
+        """
+        compute() si besoin. history_range = [début, fin[ des dates d'historique lues,
+        à donner seulement si la requête ne dépend que de l'historique (pas des usagers).
+        """
+        version = data_version.current()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            cached_version, value = entry
+            if cached_version == version or (
+                history_range and history_range[1] <= date.today().isoformat()
+                and data_version.history_unchanged(cached_version, *history_range)
+            ):
+                with self._lock:
+                    self._entries[key] = (version, value)
+                return value
+
+        value = compute()  # Version lue avant le calcul : une écriture concurrente l'invalide
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+stats_cache = _StatsCache()
+
 
 class StatsService:
+    # Les agrégats lisent daily_stats (cumuls journaliers tenus par triggers)
+    # Les dates reçues sont incluses : converties en intervalle semi-ouvert
+    # Résultats mis en cache (stats_cache) : ne pas modifier les objets retournés
     @staticmethod
     def get_stats_range(date_start_str, date_end_str):
-        conn = get_connection(); c = conn.cursor()
-        where_clause = "WHERE date_passage BETWEEN ? AND ?"
-        params = (date_start_str, date_end_str)
-        stats = {'total_h': 0, 'total_f': 0, 'tickets_carte': 0, 'tickets_avance': 0, 'tickets_tutelle': 0, 'tickets_1ere_fois': 0, 'total_passages': 0}
-        
-        c.execute(f"SELECT sexe, SUM(quantite) FROM view_conso_nettoyees {where_clause} GROUP BY sexe", params)
-        for row in c.fetchall():
-            if row[0] == 'H': stats['total_h'] = row[1] if row[1] else 0
-            elif row[0] == 'F': stats['total_f'] = row[1] if row[1] else 0
-        stats['total_passages'] = stats['total_h'] + stats['total_f']
-        
-        c.execute(f"""SELECT CASE WHEN statut_au_passage IN ('Payés', 'Pas de crédit', 'Anonyme') THEN 'Carte' WHEN statut_au_passage = 'Avances' THEN 'Avance' WHEN statut_au_passage = 'Tutelles' THEN 'Tutelle' WHEN statut_au_passage IN ('1ère fois', 'Offert') THEN '1ere_fois' ELSE 'Autre' END as cat, SUM(quantite) FROM view_conso_nettoyees {where_clause} GROUP BY cat""", params)
-        for row in c.fetchall():
-            if row[0] == 'Carte': stats['tickets_carte'] = row[1]
-            elif row[0] == 'Avance': stats['tickets_avance'] = row[1]
-            elif row[0] == 'Tutelle': stats['tickets_tutelle'] = row[1]
-            elif row[0] == '1ere_fois': stats['tickets_1ere_fois'] = row[1]
-        conn.close()
-        return stats
\ No newline at end of file
+        params = list(period_bounds(date_start_str, date_end_str))
+
+        def compute():
+            with connection() as conn:
+                # Un seul passage sur la période (agrégation conditionnelle)
+                row = conn.execute(PERIOD_FIGURES_SQL, params).fetchone()
+            stats = dict(zip((name for name, _, _ in _DAILY_FIGURES), row))
+            del stats['anon_paye'], stats['anonymes']
+            stats['total_passages'] = stats['total_h'] + stats['total_f']
+            return stats
+
+        return dict(stats_cache.get(("stats", *params), compute, params))
+
+    @staticmethod
+    def get_recharges_range(date_start_str, date_end_str):
+        """Total des recharges de la période (SUM indexé sur la colonne montant)."""
+        params = list(period_bounds(date_start_str, date_end_str))
+
+        def compute():
+            with connection() as conn:
+                source = history_source(conn, params[0])
+                res = conn.execute(recharges_sql(source), params).fetchone()
+            return res[0] or 0.0
+
+        return stats_cache.get(("recharges", *params), compute, params)
+
+    @staticmethod
+    def series(date_start_str, date_end_str, bucket="day"):
+        """
+        Les chiffres de get_stats_range pour chaque jour, semaine ou mois de la période
+        (fin incluse), en une requête groupée. Retourne un StatsSeries.
+        SQLite regroupe par jour (sans fonction de date par ligne), les jours sont
+        ensuite cumulés dans leur pas.
+        """
+        if bucket not in SERIES_BUCKETS:
+            raise ValueError(f"Pas inconnu : {bucket}")
+        start, end = period_bounds(date_start_str, date_end_str)
+
+        def compute():
+            starts, index = [], {}  # index : jour ISO -> numéro de son pas
+            day, last = date.fromisoformat(start), date.fromisoformat(end)
+            bucket_end = day
+            while day < last:
+                if day >= bucket_end:
+                    bucket_start = _bucket_start(day, bucket)
+                    bucket_end = _next_bucket(bucket_start, bucket)
+                    starts.append(bucket_start.isoformat())
+                index[day.isoformat()] = len(starts) - 1
+                day += timedelta(days=1)
+            columns = {name: _zeros(len(starts)) for name in SERIES_FIELDS}
+
+            params = list(period_bounds(date_start_str, date_end_str))
+            with connection() as conn:
+                rows = conn.execute(SERIES_SQL, params).fetchall()
+            for day_str, *values in rows:
+                i = index[day_str]
+                for name, value in zip(SERIES_FIELDS, values):
+                    columns[name][i] += value
+            return StatsSeries(bucket, starts, **columns)
+
+        return stats_cache.get(("series", bucket, start, end), compute, [start, end])
+
+    @staticmethod
+    def dashboard(now=None):
+        """
+        Tout le panneau de droite (compteurs, caisse, graphiques) pour le jour et le mois
+        de 'now', en une requête : un parcours du mois par table, le jour en sous-agrégat.
+        """
+        day, next_day = day_bounds(now or datetime.now())
+        month, next_month = month_bounds(day)
+        params = {"day": day, "next_day": next_day, "month": month, "next_month": next_month}
+
+        def compute():
+            with connection() as conn:
+                cur = conn.execute(dashboard_sql(history_source(conn, month)), params)
+                row = dict(zip((d[0] for d in cur.description), cur.fetchone()))
+            result = Dashboard()
+            for name, value in row.items():
+                period, field_name = name.split("_", 1)
+                setattr(getattr(result, period), field_name, value)
+            return result
+
+        # Dépend aussi des soldes des usagers : valable jusqu'au prochain commit
+        return stats_cache.get(("dashboard", day), compute)
@@ -0,0 +1,150 @@
+"""
+Tendances de fréquentation : moyennes glissantes, écarts d'une semaine et d'une année
+sur l'autre, profil par jour de la semaine.
+
+La série quotidienne des passages (StatsService.series) est chargée une fois, jusqu'à
+hier : les jours complets ne changent plus, le résultat reste donc en cache (stats_cache)
+tant que l'historique de ces dates n'est pas modifié.
+Calculs vectorisés avec NumPy ; sans NumPy, boucles Python aux résultats identiques.
+
+    trends = load_trends()
+    trends.latest("mean_7"), trends.latest("yoy"), trends.weekday_profile
+"""
+import math
+from array import array
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from constants import HAS_NUMPY
+from Core.stats import StatsService, stats_cache
+
+if HAS_NUMPY:
+    import numpy as np
+
+TREND_HISTORY_YEARS = 10
+WEEKDAY_PROFILE_DAYS = 52 * 7  # Profil calculé sur la dernière année (semaines entières)
+YEAR_LAG = 364                 # 52 semaines : on compare les mêmes jours de la semaine
+SPARKLINE_DAYS = 182           # Jours affichés par la courbe du tableau de bord
+WEEKDAY_NAMES = ("Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim")
+
+
+@dataclass
+class Trends:
+    """
+    Séries alignées sur days (un jour par élément, NaN tant que l'historique est trop court) :
+    - mean_7, mean_28 : passages moyens par jour sur 7 / 28 jours glissants
+    - wow : variation (%) des 7 derniers jours par rapport aux 7 précédents
+    - yoy : variation (%) des 28 derniers jours par rapport aux mêmes 28 jours un an plus tôt
+    weekday_profile : passages moyens par jour de la semaine (lundi d'abord).
+    """
+    days: list
+    passages: object
+    mean_7: object
+    mean_28: object
+    wow: object
+    yoy: object
+    weekday_profile: list
+
+    def latest(self, name):
+        """Dernière valeur d'une série, None si elle n'est pas définie."""
+        values = getattr(self, name)
+        if not len(values):
+            return None
+        value = float(values[-1])
+        return None if math.isnan(value) else value
+
+
+# ============================================================================
+# CALCULS
+# ============================================================================
+def _pct(current, previous):
+    return (current - previous) * 100.0 / previous if previous > 0 else math.nan
+
+
+def _trends_numpy(first_day, passages, profile_days):
+    p = np.asarray(passages, dtype=np.float64)
+    n = len(p)
+    cumsum = np.concatenate(([0.0], np.cumsum(p)))
+
+    def rolling_sum(window):
+        out = np.full(n, np.nan)
+        if n >= window:
+            out[window - 1:] = cumsum[window:] - cumsum[:n - window + 1]
+        return out
+
+    def pct_vs(values, lag):
+        out = np.full(n, np.nan)
+        if n > lag:
+            previous = values[:-lag]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out[lag:] = np.where(previous > 0, (values[lag:] - previous) * 100.0 / previous, np.nan)
+        return out
+
+    sum_7, sum_28 = rolling_sum(7), rolling_sum(28)
+    weekdays = (first_day.weekday() + np.arange(n)) % 7
+    recent = slice(max(0, n - profile_days), n)
+    totals = np.bincount(weekdays[recent], weights=p[recent], minlength=7)
+    counts = np.bincount(weekdays[recent], minlength=7)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profile = np.where(counts > 0, totals / counts, 0.0)
+    return sum_7 / 7, sum_28 / 28, pct_vs(sum_7, 7), pct_vs(sum_28, YEAR_LAG), [float(v) for v in profile]
+
+
+def _trends_python(first_day, passages, profile_days):
+    n = len(passages)
+    nan_array = lambda: array('d', [math.nan]) * n
+
+    def rolling_sum(window):
+        out, running = nan_array(), 0.0
+        for i, value in enumerate(passages):
+            running += value
+            if i >= window:
+                running -= passages[i - window]
+            if i >= window - 1:
+                out[i] = running
+        return out
+
+    def pct_vs(values, lag):
+        out = nan_array()
+        for i in range(lag, n):
+            if not math.isnan(values[i - lag]):
+                out[i] = _pct(values[i], values[i - lag])
+        return out
+
+    sum_7, sum_28 = rolling_sum(7), rolling_sum(28)
+    totals, counts = [0.0] * 7, [0] * 7
+    offset = first_day.weekday()
+    for i in range(max(0, n - profile_days), n):
+        totals[(offset + i) % 7] += passages[i]
+        counts[(offset + i) % 7] += 1
+    profile = [t / c if c else 0.0 for t, c in zip(totals, counts)]
+    return (array('d', (v / 7 for v in sum_7)), array('d', (v / 28 for v in sum_28)),
+            pct_vs(sum_7, 7), pct_vs(sum_28, YEAR_LAG), profile)
+
+
+def compute_trends(days, passages, profile_days=WEEKDAY_PROFILE_DAYS):
+    """Tendances d'une série quotidienne continue (days[i] ISO, passages[i] du jour)."""
+    first_day = date.fromisoformat(days[0]) if days else date.today()
+    compute = _trends_numpy if HAS_NUMPY else _trends_python
+    mean_7, mean_28, wow, yoy, profile = compute(first_day, passages, profile_days)
+    return Trends(days, passages, mean_7, mean_28, wow, yoy, profile)
+
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+def load_trends(end=None, years=TREND_HISTORY_YEARS, profile_days=WEEKDAY_PROFILE_DAYS):
+    """
+    Tendances au jour end inclus (défaut : hier, dernier jour complet), sur years
+    années d'historique. Une requête groupée au premier appel, mis en cache ensuite.
+    """
+    end_day = date.fromisoformat(str(end)[:10]) if end else date.today() - timedelta(days=1)
+    start_day = end_day - timedelta(days=365 * years - 1)
+    start, end = start_day.isoformat(), end_day.isoformat()
+
+    def compute():
+        series = StatsService.series(start, end, "day")
+        return compute_trends(series.starts, series.total_passages, profile_days)
+
+    history_range = [start, (end_day + timedelta(days=1)).isoformat()]
+    return stats_cache.get(("trends", start, end, profile_days), compute, history_range)
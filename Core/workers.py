@@ -10,6 +10,10 @@ from datetime import datetime
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from constants import DB_FILE, APP_VERSION
+import database as db
+from Core.maintenance import run_maintenance, convert_auto_vacuum, MaintenanceCancelled
+from Core.importer import import_roster, read_text, read_file
+from Core.counters import today_counters
 
 # ============================================================================
 # WORKER : VÉRIFICATION DE MISE À JOUR (STABLE / BETA)
@@ -164,8 +168,105 @@ class PdfWorker(QThread):
             if hasattr(self.app, 'generate_pdf_logic_wrapper'):
                 self.app.generate_pdf_logic_wrapper(self.secondary_path, self.silent_mode)
         except: pass
+        finally:
+            # Le thread se termine : on rend sa connexion du pool
+            db.release_thread_connection()
         self.finished.emit()
 
+# ============================================================================
+# WORKER : MAINTENANCE (ARCHIVAGE, COMPACTAGE, ANALYSE)
+# ============================================================================
+class MaintenanceWorker(QThread):
+    progress = pyqtSignal(str, int)
+    finished = pyqtSignal(bool, str, int)  # succès, message, lignes archivées
+
+    def __init__(self, archive=False):
+        super().__init__()
+        self.archive = archive
+        self._stop_requested = False
+
+    def stop(self):
+        """Demande l'arrêt entre deux lots (fermeture de l'appli)."""
+        self._stop_requested = True
+
+    def run(self):
+        try:
+            archived = run_maintenance(
+                archive=self.archive,
+                progress=self.progress.emit,
+                should_stop=lambda: self._stop_requested
+            )
+            self.finished.emit(True, "Maintenance terminée", archived)
+        except MaintenanceCancelled:
+            self.finished.emit(False, "Maintenance interrompue", 0)
+        except Exception as e:
+            self.finished.emit(False, str(e), 0)
+        finally:
+            db.release_thread_connection()
+
+# ============================================================================
+# WORKER : CONVERSION EN AUTO_VACUUM INCRÉMENTAL (UNE FOIS, AU DÉMARRAGE)
+# ============================================================================
+class VacuumConversionWorker(QThread):
+    finished = pyqtSignal(bool, str)
+
+    def run(self):
+        try:
+            convert_auto_vacuum()
+            self.finished.emit(True, "Conversion terminée")
+        except Exception as e:
+            self.finished.emit(False, str(e))
+        finally:
+            db.release_thread_connection()
+
+# ============================================================================
+# WORKER : VÉRIFICATION DES COMPTEURS DU JOUR
+# ============================================================================
+class CountersCheckWorker(QThread):
+    finished = pyqtSignal(dict)  # écarts corrigés {champ: (mémoire, base)}
+
+    def run(self):
+        try:
+            self.finished.emit(today_counters.reconcile())
+        except Exception as e:
+            print(f"Erreur vérification compteurs : {e}")
+            self.finished.emit({})
+        finally:
+            db.release_thread_connection()
+
+# ============================================================================
+# WORKER : IMPORT EN MASSE
+# ============================================================================
+class ImportWorker(QThread):
+    progress = pyqtSignal(int)  # lignes traitées
+    finished = pyqtSignal(bool, str, int, int)  # succès, message, créés, mis à jour
+
+    def __init__(self, default_statut, ticket_price, text=None, path=None):
+        super().__init__()
+        self.default_statut = default_statut
+        self.ticket_price = ticket_price
+        self.text = text
+        self.path = path
+        self._stop_requested = False
+
+    def stop(self):
+        self._stop_requested = True
+
+    def run(self):
+        try:
+            records = read_file(self.path) if self.path else read_text(self.text)
+            result = import_roster(
+                records, self.default_statut, self.ticket_price,
+                progress=self.progress.emit,
+                should_stop=lambda: self._stop_requested
+            )
+            message = "Import interrompu" if result['cancelled'] else "Import terminé"
+            self.finished.emit(True, message, result['created'], result['updated'])
+        except Exception as e:
+            self.finished.emit(False, str(e), 0, 0)
+        finally:
+            db.release_thread_connection()
+
 # ============================================================================
 # WORKER : BACKUP
 # ============================================================================
@@ -185,19 +286,27 @@ class BackupWorker(QThread):
             backup_name = f"backup_{date_str}.db"
             dest_path = os.path.join(self.target_folder, backup_name)
             
-            try:
-                conn = sqlite3.connect(DB_FILE)
-                conn.execute(f"VACUUM INTO '{dest_path}'")
-                conn.close()
-            except:
-                shutil.copy2(DB_FILE, dest_path)
+            self.copy_database(DB_FILE, dest_path)
+            # L'historique ancien n'est que dans archive.db : sauvegardée avec la base
+            if os.path.exists(db.archive_path()):
+                self.copy_database(db.archive_path(), db.archive_backup_path(dest_path))
             
             self.clean_old_backups(self.target_folder)
             self.finished.emit(True, dest_path)
         except Exception as e:
             self.finished.emit(False, str(e))
 
+    @staticmethod
+    def copy_database(source, dest_path):
+        try:
+            conn = sqlite3.connect(source)
+            conn.execute(f"VACUUM INTO '{dest_path}'")
+            conn.close()
+        except:
+            shutil.copy2(source, dest_path)
+
     def clean_old_backups(self, folder):
+        # backup_<date>.db et backup_<date>_archive.db
         import time
         now = time.time()
         retention = 7 * 86400
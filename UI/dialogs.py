@@ -7,7 +7,9 @@ import shutil
 import glob
 from datetime import datetime
 
-from Core.workers import UpdateWorker
+from Core.workers import UpdateWorker, ImportWorker
+from Core.normalize import name_key
+from Core.profiling import sql_profiler
 
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
@@ -215,6 +217,15 @@ class AProposDialog(BaseDialog):
         lbl_support = QLabel(f"Support : <a href='mailto:jesthp@gmail.com?subject={sujet_encoded}' style='color: #3498db; text-decoration: none; font-weight:bold;'>jesthp@gmail.com</a>"); lbl_support.setOpenExternalLinks(True); lbl_support.setAlignment(Qt.AlignmentFlag.AlignCenter); lbl_support.setStyleSheet("font-size: 10pt; color: #7f8c8d;")
         v_credits.addWidget(lbl_dev); v_credits.addWidget(lbl_dev_name); v_credits.addWidget(lbl_support); self.layout.addLayout(v_credits); self.layout.addStretch()
         
+        # Profilage SQL (lancement avec --profile-sql) : résumé des requêtes de la session
+        if sql_profiler.enabled:
+            btn_profile = QPushButton("Profil SQL")
+            btn_profile.setCursor(Qt.CursorShape.PointingHandCursor)
+            btn_profile.setStyleSheet("background-color: #ecf0f1; color: #7f8c8d; border-radius: 10px; padding: 4px 15px; font-size: 10pt; font-weight: bold; border: none;")
+            btn_profile.clicked.connect(lambda: ProfilSqlDialog(self).exec())
+            h_profile = QHBoxLayout(); h_profile.addStretch(); h_profile.addWidget(btn_profile); h_profile.addStretch()
+            self.layout.addLayout(h_profile); self.layout.addSpacing(10)
+        
         btn_close = ModernButton("FERMER", "#95a5a6", self.accept, 40, 6); h_btn = QHBoxLayout(); h_btn.setContentsMargins(60, 0, 60, 0); h_btn.addWidget(btn_close); self.layout.addLayout(h_btn)
         
         self.shake_timer = QTimer(self); self.shake_timer.timeout.connect(self.do_shake); self.shake_duration_timer = QTimer(self); self.shake_duration_timer.setSingleShot(True); self.shake_duration_timer.timeout.connect(self.stop_shake); self.start_vibration_sequence()
@@ -259,6 +270,34 @@ class AProposDialog(BaseDialog):
     def do_shake(self): range_px = 4; x_off = random.randint(-range_px, range_px); y_off = random.randint(-range_px, range_px); self.img_container.setStyleSheet(f"QLabel {{ background-color: white; border-radius: 12px; border: 1px solid #ecf0f1; padding: {10+y_off}px {10-x_off}px {10-y_off}px {10+x_off}px; }}")
     def stop_shake(self): self.shake_timer.stop(); self.img_container.setStyleSheet("QLabel { background-color: white; border-radius: 12px; border: 1px solid #ecf0f1; padding: 10px; }")
 
+class ProfilSqlDialog(BaseDialog):
+    def __init__(self, parent):
+        super().__init__(parent, "Profil SQL de la session", 900, 600)
+        
+        lbl_sub = QLabel(f"Requêtes lentes : {sql_profiler.log_path or 'non journalisées'}")
+        lbl_sub.setStyleSheet(f"color: {AppColors.STATS_BG}; font-style: italic;")
+        self.layout.addWidget(lbl_sub)
+        
+        self.txt_display = QPlainTextEdit()
+        self.txt_display.setReadOnly(True)
+        self.txt_display.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.txt_display.setStyleSheet(f"QPlainTextEdit {{ font-family: 'Consolas', monospace; font-size: 9pt; color: {AppColors.MENU_BG}; }}")
+        self.layout.addWidget(self.txt_display)
+        
+        h_btns = QHBoxLayout()
+        h_btns.addWidget(ModernButton("ACTUALISER", AppColors.BTN_H_BG, self.refresh, 35, 6))
+        h_btns.addWidget(ModernButton("REMETTRE À ZÉRO", "#95a5a6", self.reset, 35, 6))
+        h_btns.addWidget(ModernButton("FERMER", AppColors.BTN_NEW_BG, self.accept, 35, 6))
+        self.layout.addLayout(h_btns)
+        self.refresh()
+
+    def refresh(self):
+        self.txt_display.setPlainText(sql_profiler.summary())
+
+    def reset(self):
+        sql_profiler.reset()
+        self.refresh()
+
 class PrixDialog(BaseDialog):
     def __init__(self, parent):
         super().__init__(parent, "Configuration Prix", 350, 200)
@@ -278,12 +317,11 @@ class PrixDialog(BaseDialog):
         try:
             p = float(self.entry.text().replace(',', '.'))
             if p <= 0: raise ValueError
-            db.set_ticket_price(p)
-            conn = db.get_connection()
-            c = conn.cursor()
-            c.execute("UPDATE usagers SET solde = ticket * ?", (p,))
-            conn.commit()
-            conn.close()
+            def apply(c):
+                db.set_ticket_price(p)  # Même transaction (connexion de l'écrivain)
+                c.execute("UPDATE usagers SET solde = ticket * ?", (p,))
+            
+            db.write_sync(apply)
             self.parent_app.load_data()
             self.accept()
         except ValueError: 
@@ -378,8 +416,9 @@ class ExportSupDialog(BaseDialog):
         if self.toggle_switch.isChecked() and not self.inp_path.text().strip(): 
             return CustomMessageBox(self, "Erreur", "Veuillez sélectionner un dossier.", error=True).exec()
         
-        db.set_config('EXPORT_SUP_ENABLED', '1' if self.toggle_switch.isChecked() else '0')
-        db.set_config('EXPORT_SUP_PATH', self.inp_path.text().strip())
+        with db.config_batch():
+            db.set_config('EXPORT_SUP_ENABLED', '1' if self.toggle_switch.isChecked() else '0')
+            db.set_config('EXPORT_SUP_PATH', self.inp_path.text().strip())
         self.accept()
 
 class ImportMasseDialog(BaseDialog):
@@ -405,114 +444,56 @@ class ImportMasseDialog(BaseDialog):
         
         h_btns = QHBoxLayout()
         h_btns.addWidget(ModernButton("ANNULER", "#95a5a6", self.reject, 35, 6))
-        btn_ok = ModernButton("IMPORTER", AppColors.BTN_NEW_BG, self.process_import, 35, 6)
-        btn_ok.setDefault(True)
-        h_btns.addWidget(btn_ok)
+        h_btns.addWidget(ModernButton("FICHIER...", "#3498db", self.import_file, 35, 6))
+        self.btn_ok = ModernButton("IMPORTER", AppColors.BTN_NEW_BG, self.process_import, 35, 6)
+        self.btn_ok.setDefault(True)
+        h_btns.addWidget(self.btn_ok)
         self.layout.addLayout(h_btns)
-    
-    def detect_gender(self, prenom): 
-        return 'F' if prenom.lower().endswith(('e', 'a', 'ine', 'ette')) else 'H'
+        self.import_worker = None
     
     def process_import(self):
         text = self.txt_input.toPlainText().strip()
         if not text: 
             return CustomMessageBox(self, "Erreur", "La zone de saisie est vide.", error=True).exec()
-            
-        dropdown_statut = self.combo_statut.currentText()
-        lines = text.split('\n')
-        
-        conn = db.get_connection()
-        c = conn.cursor()
+        self.start_import(text=text)
+
+    def import_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Choisir une liste", "", "Listes (*.txt *.csv);;Tous les fichiers (*)")
+        if path:
+            self.start_import(path=path)
+
+    def start_import(self, text=None, path=None):
+        # Lecture et écriture par lots en tâche de fond (Core/importer.py)
+        if self.import_worker is not None and self.import_worker.isRunning():
+            return
+        self.btn_ok.setEnabled(False)
+        self.import_worker = ImportWorker(self.combo_statut.currentText(), self.ticket_price, text=text, path=path)
+        self.import_worker.progress.connect(lambda n: self.btn_ok.setText(f"IMPORT... {n} LIGNES"))
+        self.import_worker.finished.connect(self.on_import_finished)
+        self.import_worker.start()
+
+    def on_import_finished(self, success, message, count_created, count_updated):
+        self.btn_ok.setEnabled(True)
+        self.btn_ok.setText("IMPORTER")
+        if not success:
+            QMessageBox.critical(self, "Erreur", message)
+            return
         
-        count_created = 0
-        count_updated = 0
+        CustomMessageBox(self, "Succès", f"{message}.\nCréés : {count_created}\nMis à jour : {count_updated}", error=False).exec()
         
-        try:
-            for line in lines:
-                parts = line.split()
-                if len(parts) < 2: continue
-                
-                ticket_index = -1
-                ticket_quantity = 0
-                for i in range(1, len(parts)):
-                    if parts[i].lstrip('-').isdigit(): 
-                        ticket_index = i
-                        ticket_quantity = abs(int(parts[i]))
-                        break 
-                
-                if ticket_index == -1: continue 
-                
-                name_parts = parts[:ticket_index]
-                comment_parts = parts[ticket_index+1:]
-                comment = " ".join(comment_parts)
-                
-                if not name_parts: continue
-                
-                if len(name_parts) == 1: 
-                    nom = name_parts[0].upper()
-                    prenom = ""
-                else: 
-                    nom = name_parts[0].upper()
-                    prenom = " ".join(name_parts[1:]).capitalize()
-                
-                sexe = self.detect_gender(prenom if prenom else nom)
-                
-                c.execute("SELECT id, ticket, solde, statut, commentaire FROM usagers WHERE nom=? AND prenom=?", (nom, prenom))
-                existing = c.fetchone()
-                
-                final_tickets = 0
-                user_statut = ""
-                
-                if existing:
-                    uid, old_t, old_s, current_statut, old_com = existing
-                    user_statut = current_statut
-                    new_com = comment if comment else old_com
-                    
-                    if current_statut in ["Avances", "Tutelles"]: 
-                        final_tickets = -ticket_quantity
-                    else: 
-                        final_tickets = ticket_quantity
-                    
-                    new_t = old_t + final_tickets
-                    new_s = old_s + (final_tickets * self.ticket_price)
-                    
-                    c.execute("UPDATE usagers SET ticket=?, solde=?, commentaire=? WHERE id=?", (new_t, new_s, new_com, uid))
-                    count_updated += 1
-                    action_txt = f"Import (Ajout {final_tickets})"
-                    
-                else:
-                    user_statut = dropdown_statut
-                    if user_statut in ["Avances", "Tutelles"]: 
-                        final_tickets = -ticket_quantity
-                    else: 
-                        final_tickets = ticket_quantity
-                    
-                    solde_val = final_tickets * self.ticket_price
-                    nid = db.get_next_usager_id(c)
-                    
-                    c.execute("INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)", (nid, nom, prenom, sexe, user_statut, solde_val, final_tickets, "", "", comment))
-                    db.set_config('LAST_USED_ID', str(nid))
-                    uid = nid
-                    count_created += 1
-                    action_txt = "Import (Création)"
-                
-                c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", (action_txt, str(final_tickets), sexe, uid, datetime.now().strftime("%Y-%m-%d"), user_statut))
-            
-            conn.commit()
-            
-            CustomMessageBox(self, "Succès", f"Import terminé.\nCréés : {count_created}\nMis à jour : {count_updated}", error=False).exec()
-            
+        self.parent_app.load_data()
+        self.parent_app.update_stats()
+        self.parent_app.generate_pdf(silent_mode=True)
+        self.accept()
+
+    def reject(self):
+        # Fermeture pendant l'import : on s'arrête proprement à la fin du lot en cours
+        if self.import_worker is not None and self.import_worker.isRunning():
+            self.import_worker.finished.disconnect(self.on_import_finished)
+            self.import_worker.stop()
+            self.import_worker.wait()
             self.parent_app.load_data()
-            self.parent_app.refresh_counters()
-            self.parent_app.update_stats()
-            self.parent_app.generate_pdf(silent_mode=True)
-            self.accept()
-            
-        except Exception as e: 
-            conn.rollback()
-            QMessageBox.critical(self, "Erreur", str(e))
-        finally: 
-            conn.close()
+        super().reject()
 
 class NouveauUsagerDialog(BaseDialog):
     def __init__(self, parent):
@@ -592,40 +573,35 @@ class NouveauUsagerDialog(BaseDialog):
         if not n and not p: 
             return CustomMessageBox(self, "Attention", "Nom ou Prénom requis.", error=True).exec()
         
-        conn = None
-        try:
-            conn = db.get_connection()
-            c = conn.cursor()
-            
-            # Vérification doublon
-            c.execute("SELECT id FROM usagers WHERE nom=? AND prenom=?", (n,p))
-            if c.fetchone(): 
-                return CustomMessageBox(self, "Doublon", "Usager existant", error=True).exec()
-            
-            # Récupération ID
-            nid = db.get_next_usager_id(c)
-            user_statut = self.i_sta.currentText()
+        user_statut = self.i_sta.currentText()
+        sexe = self.i_sex.currentText()
+        commentaire = self.i_com.text()
+
+        def apply(c):
+            # Vérification doublon (index nom_key : accents, casse et espaces ignorés)
+            if db.find_usager_id(c, n, p) is not None: 
+                return None
             
-            # 1. Insertion de l'usager
-            c.execute("INSERT INTO usagers (id,nom,prenom,sexe,statut,solde,ticket,passage,photo_filename, commentaire) VALUES (?,?,?,?,?,0,0,'','',?)", (nid, n, p, self.i_sex.currentText(), user_statut, self.i_com.text()))
+            # 1. Id réservé dans la transaction de l'écrivain (deux postes ne peuvent pas obtenir le même)
+            nid = db.reserve_ids(c)
             
-            # 2. Mise à jour config
-            c.execute("REPLACE INTO config (key, value) VALUES (?, ?)", ('LAST_USED_ID', str(nid)))
+            # 2. Insertion de l'usager
+            c.execute("INSERT INTO usagers (id,nom,prenom,sexe,statut,solde,ticket,passage,photo_filename, commentaire, nom_key) VALUES (?,?,?,?,?,0,0,'','',?,?)", (nid, n, p, sexe, user_statut, commentaire, name_key(n, p)))
             
             # 3. Historique
-            c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", ('Création usager', 'Initialisation', self.i_sex.currentText(), nid, datetime.now().strftime("%Y-%m-%d"), user_statut))
-            
-            conn.commit()
-            
-            # Actions UI différées
-            QTimer.singleShot(50, lambda: self.post_save_actions(nid))
-            
+            db.insert_history(c, ('Création usager', 'Initialisation', sexe, nid, datetime.now().strftime("%Y-%m-%d"), user_statut))
+            return nid
+
+        try:
+            nid = db.write_sync(apply)
         except Exception as e: 
-            if conn: conn.rollback()
-            CustomMessageBox(self, "Erreur", str(e), error=True).exec()
-        finally:
-            if conn:
-                conn.close()
+            return CustomMessageBox(self, "Erreur", str(e), error=True).exec()
+        
+        if nid is None:
+            return CustomMessageBox(self, "Doublon", "Usager existant", error=True).exec()
+        
+        # Actions UI différées
+        QTimer.singleShot(50, lambda: self.post_save_actions(nid))
 
     def post_save_actions(self, nid):
         self.parent_app.load_data()
@@ -640,11 +616,8 @@ class ModifierUsagerDialog(BaseDialog):
         self.uid = uid
         self.ticket_price = db.get_ticket_price()
         
-        conn = db.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT nom, prenom, sexe, statut, solde, commentaire FROM usagers WHERE id=?", (uid,))
-        self.data = c.fetchone()
-        conn.close()
+        with db.connection() as conn:
+            self.data = conn.execute("SELECT nom, prenom, sexe, statut, solde, commentaire FROM usagers WHERE id=?", (uid,)).fetchone()
         
         if not self.data: 
             self.reject()
@@ -735,14 +708,17 @@ class ModifierUsagerDialog(BaseDialog):
             
         ntick = round(nsol / self.ticket_price)
         
-        conn = db.get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE usagers SET nom=?, prenom=?, sexe=?, statut=?, solde=?, ticket=?, commentaire=? WHERE id=?", (nn, np, ns, nst, nsol, ntick, self.inp_com.text(), self.uid))
-        c.execute("UPDATE historique_passages SET sexe=? WHERE usager_id=?", (ns, self.uid))
-        c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", ('Modification usager', "Edition fiche", ns, self.uid, datetime.now().strftime("%Y-%m-%d"), self.data[3]))
+        comment = self.inp_com.text()
+        
+        def apply(c):
+            c.execute("UPDATE usagers SET nom=?, prenom=?, sexe=?, statut=?, solde=?, ticket=?, commentaire=?, nom_key=? WHERE id=?", (nn, np, ns, nst, nsol, ntick, comment, name_key(nn, np), self.uid))
+            c.execute("UPDATE historique_passages SET sexe=? WHERE usager_id=?", (ns, self.uid))
+            c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", ('Modification usager', "Edition fiche", ns, self.uid, datetime.now().strftime("%Y-%m-%d"), self.data[3]))
         
-        conn.commit()
-        conn.close()
+        try:
+            db.write_sync(apply)
+        except Exception as e:
+            return CustomMessageBox(self, "Erreur", str(e), error=True).exec()
         
         self.parent_app.load_data()
         self.parent_app.update_stats()
@@ -805,31 +781,29 @@ class ConsommerTicketDialog(BaseDialog):
                 else: 
                     tickets_to_record.append((num, "Avances"))
             
-            conn = db.get_connection()
-            c = conn.cursor()
             today = datetime.now().strftime("%Y-%m-%d")
-            
-            c.execute("SELECT sexe FROM usagers WHERE id=?", (self.uid,))
-            user_sexe = c.fetchone()[0]
-
-            created_hist_ids = [] 
-            history_data_to_save = []
-
-            for qty, st in tickets_to_record: 
-                data_tuple = ('Consommation ticket(s)', str(qty), user_sexe, self.uid, today, st)
-                c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", data_tuple)
-                created_hist_ids.append(c.lastrowid)
-                history_data_to_save.append(data_tuple)
 
             nst = self.status
             if self.status in ["Payés", "Avances"]: 
                 nst = "Avances" if nt < 0 else "Payés"
             
             new_solde = nt * db.get_ticket_price()
-            c.execute("UPDATE usagers SET ticket=?, solde=?, statut=?, passage=? WHERE id=?", (nt, new_solde, nst, datetime.now().strftime("%d/%m/%Y %H:%M:%S"), self.uid))
-            
-            conn.commit()
-            conn.close()
+
+            def apply(c):
+                c.execute("SELECT sexe FROM usagers WHERE id=?", (self.uid,))
+                user_sexe = c.fetchone()[0]
+                created_hist_ids = [] 
+                history_data_to_save = []
+
+                for qty, st in tickets_to_record: 
+                    data_tuple = ('Consommation ticket(s)', str(qty), user_sexe, self.uid, today, st)
+                    created_hist_ids.append(db.insert_history(c, data_tuple))
+                    history_data_to_save.append(data_tuple)
+
+                c.execute("UPDATE usagers SET ticket=?, solde=?, statut=?, passage=? WHERE id=?", (nt, new_solde, nst, datetime.now().strftime("%d/%m/%Y %H:%M:%S"), self.uid))
+                return created_hist_ids, history_data_to_save
+
+            created_hist_ids, history_data_to_save = db.write_sync(apply)
             
             # --- UNDO : Enregistrement complet ---
             new_state = {self.uid: {'solde': new_solde, 'ticket': nt, 'statut': nst}}
@@ -838,7 +812,6 @@ class ConsommerTicketDialog(BaseDialog):
                 self.parent_app.undo_manager.record_action('CONSUME', prev_state, new_state, created_hist_ids, history_data_to_save)
             
             self.parent_app.load_data()
-            self.parent_app.refresh_counters()
             self.parent_app.update_stats()
             self.parent_app.generate_pdf(silent_mode=True)
             self.accept()
@@ -888,12 +861,13 @@ class RechargerCompteDialog(BaseDialog):
             if self.status in ["Payés", "Avances"]: 
                 nst = "Avances" if ns < 0 else "Payés"
             
-            conn = db.get_connection()
-            c = conn.cursor()
-            c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, (SELECT sexe FROM usagers WHERE id=?), ?, ?, ?)", ('Recharge Compte', f"+{m:.2f} €", self.uid, self.uid, datetime.now().strftime("%Y-%m-%d"), old_status))
-            c.execute("UPDATE usagers SET solde=?, ticket=?, statut=? WHERE id=?", (ns, nt, nst, self.uid))
-            conn.commit()
-            conn.close()
+            def apply(c):
+                user_sexe = c.execute("SELECT sexe FROM usagers WHERE id=?", (self.uid,)).fetchone()[0]
+                # Le montant numérique est déduit du détail par insert_history
+                db.insert_history(c, ('Recharge Compte', f"+{m:.2f} €", user_sexe, self.uid, datetime.now().strftime("%Y-%m-%d"), old_status))
+                c.execute("UPDATE usagers SET solde=?, ticket=?, statut=? WHERE id=?", (ns, nt, nst, self.uid))
+
+            db.write_sync(apply)
             
             self.parent_app.load_data()
             self.parent_app.update_stats()
@@ -925,11 +899,12 @@ class HistoriqueDialog(BaseDialog):
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.layout.addWidget(self.table)
         
-        conn = db.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT date_passage, heure_passage, action, detail FROM historique_passages WHERE usager_id=? ORDER BY id DESC", (uid,))
+        with db.connection() as conn:
+            # Historique complet : lignes récentes puis archivées (ids conservés)
+            source = db.history_source(conn)
+            rows = conn.execute(db.usager_history_sql(source), (uid,)).fetchall()
         
-        for r in c.fetchall():
+        for r in rows:
             date_p, heure_p, action, detail = r
             datetime_str = f"{date_p.replace('-', '/')} {heure_p}"
             
@@ -947,8 +922,6 @@ class HistoriqueDialog(BaseDialog):
             it_det = QTableWidgetItem(detail)
             it_det.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
             self.table.setItem(row, 2, it_det)
-            
-        conn.close()
 
         self.layout.addSpacing(20)
         btn_close = ModernButton("FERMER", "#95a5a6", self.reject, 35, 6)
@@ -1005,7 +978,7 @@ class RestaurationDialog(BaseDialog):
         self.layout.addWidget(lbl_titre_maint)
         
         lbl_desc = QLabel(
-            "Cette option supprime l'historique vieux de plus de 2 ans pour accélérer le logiciel.\n"
+            "Cette option archive l'historique vieux de plus de 2 ans (archive.db) pour accélérer le logiciel.\n"
             "Les comptes usagers et les soldes actuels ne sont PAS touchés."
         )
         lbl_desc.setStyleSheet("color: #7f8c8d; font-size: 10pt;")
@@ -1042,8 +1015,8 @@ class RestaurationDialog(BaseDialog):
 
         self.layout.addSpacing(10)
 
-        btn_clean = ModernButton("LANCER LE NETTOYAGE MAINTENANT", "#e67e22", lambda: self.clean_db(silent=False), 35, 6)
-        self.layout.addWidget(btn_clean)
+        self.btn_clean = ModernButton("LANCER LE NETTOYAGE MAINTENANT", "#e67e22", lambda: self.clean_db(silent=False), 35, 6)
+        self.layout.addWidget(self.btn_clean)
 
         self.layout.addStretch()
         
@@ -1056,7 +1029,8 @@ class RestaurationDialog(BaseDialog):
         if not self.backup_dir or not os.path.exists(self.backup_dir):
             self.list_widget.setRowCount(0)
             return
-        files = glob.glob(os.path.join(self.backup_dir, "backup_*.db"))
+        # Les sauvegardes d'archive.db sont restaurées avec leur base, pas listées à part
+        files = [f for f in glob.glob(os.path.join(self.backup_dir, "backup_*.db")) if not db.is_archive_backup(f)]
         files.sort(key=os.path.getmtime, reverse=True)
         self.list_widget.setRowCount(0)
         self.backups = files
@@ -1079,13 +1053,23 @@ class RestaurationDialog(BaseDialog):
         selected_file = self.backups[idx]
         if ConfirmationDialog(self, "Attention", "Toutes les données actuelles seront remplacées par cette sauvegarde.\nLe logiciel va redémarrer.\n\nContinuer ?").exec():
             try:
+                # Fermeture du pool : checkpoint WAL et libération du fichier
+                db.close_all_connections()
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(DB_FILE + suffix): os.remove(DB_FILE + suffix)
                 if os.path.exists(DB_FILE): shutil.move(DB_FILE, f"{DB_FILE}.pre_restore")
                 shutil.copy2(selected_file, DB_FILE)
+                # archive.db suit sa sauvegarde : l'archive actuelle ne correspond plus à la base restaurée
+                archive = db.archive_path()
+                if os.path.exists(archive): shutil.move(archive, f"{archive}.pre_restore")
+                if os.path.exists(db.archive_backup_path(selected_file)):
+                    shutil.copy2(db.archive_backup_path(selected_file), archive)
                 CustomMessageBox(self, "Succès", "Restauration terminée.\nLe logiciel va redémarrer.", success=True).exec()
                 subprocess.Popen([sys.executable] + sys.argv)
                 sys.exit()
             except Exception as e:
                 if os.path.exists(f"{DB_FILE}.pre_restore"): shutil.move(f"{DB_FILE}.pre_restore", DB_FILE)
+                if os.path.exists(f"{db.archive_path()}.pre_restore"): shutil.move(f"{db.archive_path()}.pre_restore", db.archive_path())
                 CustomMessageBox(self, "Erreur", f"Échec de la restauration : {e}", error=True).exec()
 
     def on_toggle_auto(self, checked):
@@ -1105,22 +1089,34 @@ class RestaurationDialog(BaseDialog):
             self.lbl_auto_text.setStyleSheet(f"{base_style} color: #bdc3c7;")
 
     def clean_db(self, silent=False):
-        # (Garder le code existant)
+        # Archivage + compactage en tâche de fond (MaintenanceWorker) : la fenêtre reste utilisable
+        self.silent_clean = silent
+        worker = self.parent_app.start_maintenance(archive=True)
+        if worker is None:
+            if not silent:
+                CustomMessageBox(self, "Information", "Une maintenance est déjà en cours.\nVeuillez patienter quelques instants.", success=True).exec()
+            return
+        self.btn_clean.setEnabled(False)
+        worker.progress.connect(self.on_clean_progress)
+        worker.finished.connect(self.on_clean_finished)
+
+    def on_clean_progress(self, message, percent):
+        self.btn_clean.setText(f"{message.upper()} ({percent}%)")
+
+    def on_clean_finished(self, success, message, archived_count):
+        silent = self.silent_clean
+        self.btn_clean.setEnabled(True)
+        self.btn_clean.setText("LANCER LE NETTOYAGE MAINTENANT")
         try:
-            conn = db.get_connection()
-            c = conn.cursor()
-            c.execute("DELETE FROM historique_passages WHERE date_passage < date('now', '-2 years')")
-            deleted_count = c.rowcount 
-            conn.commit()
-            conn.execute("VACUUM")
-            conn.close()
+            if not success:
+                raise RuntimeError(message)
             if not silent:
-                if deleted_count > 0:
-                    CustomMessageBox(self, "Maintenance Terminée", f"Nettoyage effectué avec succès.\n{deleted_count} anciennes lignes supprimées.", success=True).exec()
+                if archived_count > 0:
+                    CustomMessageBox(self, "Maintenance Terminée", f"Nettoyage effectué avec succès.\n{archived_count} anciennes lignes archivées.", success=True).exec()
                 else:
                     CustomMessageBox(self, "Information", "La base de données est déjà propre.\nAucune donnée vieille de plus de 2 ans.", success=True).exec()
             else:
-                print(f"[Auto-Clean] {deleted_count} lignes supprimées.")
+                print(f"[Auto-Clean] {archived_count} lignes archivées.")
         except Exception as e:
             if not silent:
                 CustomMessageBox(self, "Erreur", f"Erreur lors de la maintenance : {e}", error=True).exec()
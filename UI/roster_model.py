@@ -0,0 +1,158 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt6.QtGui import QColor, QFont, QFontMetrics
+
+from constants import AppColors
+from Core.roster import COL_ID, COL_SEXE, COL_STATUT, COL_SOLDE, COL_TICKET, COL_PASSAGE
+
+# ============================================================================
+# LISTE DES USAGERS (MODÈLE / VUE)
+# ============================================================================
+# Une ligne du modèle = un tuple roster_row (Core/roster.py), dans l'ordre des colonnes ;
+# couleurs, info-bulles et clés de tri sont calculées à la demande (rôles Qt) pour les
+# seules cellules affichées.
+ROSTER_COLUMNS = ["ID", "NOM", "PRENOM", "SEXE", "STATUT", "SOLDE", "TICKET", "COMMENTAIRE", "DERNIER PASSAGE"]
+
+SORT_ROLE = Qt.ItemDataRole.UserRole  # Clé de tri (nombre pour ID / solde / ticket)
+
+# Colonnes étroites : largeur fixe calculée sur un texte type (au lieu de ResizeToContents,
+# qui relit les cellules à chaque changement de la liste)
+FIXED_COLUMN_SAMPLES = {
+    COL_ID: "000000", COL_SEXE: "SEXE", COL_STATUT: "Pas de crédit", COL_SOLDE: "-0000.00 €",
+    COL_TICKET: "TICKET", COL_PASSAGE: "00/00/0000 00:00:00",
+}
+
+STATUS_COLORS = {
+    "Payés": QColor(AppColors.ROW_PAYE), "Avances": QColor(AppColors.ROW_AVANCE),
+    "Tutelles": QColor(AppColors.ROW_TUTELLE), "Pas de crédit": QColor(AppColors.ROW_NOCREDIT),
+}
+DEFAULT_COLOR = QColor("white")
+
+
+def _passage_key(passage):
+    # "jj/mm/aaaa hh:mm:ss" trié chronologiquement
+    if len(passage) >= 10 and passage[2] == "/" and passage[5] == "/":
+        return passage[6:10] + passage[3:5] + passage[0:2] + passage[10:]
+    return passage
+
+
+def sort_key(row, column):
+    if column == COL_PASSAGE:
+        return _passage_key(row[column])
+    return row[column]
+
+
+def display_text(row, column):
+    if column == COL_SOLDE:
+        return f"{row[COL_SOLDE]:.2f} €"
+    return str(row[column])
+
+
+def tooltip_html(row):
+    uid, nom, prenom, sexe, statut, solde, ticket, commentaire, passage = row
+    return (f"<b>{nom} {prenom}</b> ({sexe})<br>Statut: {statut}<br>Solde: {solde:.2f} € ({ticket} tickets)"
+            f"<br>Dernier passage: {passage}<br>-----------------<br><i>{commentaire if commentaire else 'Aucun commentaire'}</i>")
+
+
+class RosterModel(QAbstractTableModel):
+    """
+    Usagers affichés (tuples de roster_row), dans l'ordre de tri courant : le tri se fait
+    ici, en Python, en une passe, et le dernier tri demandé est réappliqué à chaque rechargement.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self._row_of = None  # {id: ligne}, reconstruit après un tri
+        self._sort = (-1, Qt.SortOrder.AscendingOrder)
+
+    def set_rows(self, rows, order=None):
+        """Remplace la liste ; order (clé de tri) prime sur le tri de l'en-tête."""
+        self.beginResetModel()
+        self.rows = list(rows)
+        column, sort_order = self._sort
+        if order is not None:
+            self.rows.sort(key=order)
+        elif column >= 0:
+            self.rows.sort(key=lambda row: sort_key(row, column), reverse=sort_order == Qt.SortOrder.DescendingOrder)
+        self._row_of = None
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(ROSTER_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return ROSTER_COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return display_text(row, index.column())
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return STATUS_COLORS.get(row[COL_STATUT], DEFAULT_COLOR)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return tooltip_html(row)
+        if role == SORT_ROLE:
+            return sort_key(row, index.column())
+        return None
+
+    def usager(self, row):
+        return self.rows[row]
+
+    def row_of(self, uid):
+        """Ligne de l'usager uid, None s'il n'est pas dans la liste."""
+        if self._row_of is None:
+            self._row_of = {row[COL_ID]: i for i, row in enumerate(self.rows)}
+        return self._row_of.get(uid)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Tri de l'en-tête ; sélection et index persistants suivent leurs usagers."""
+        self._sort = (column, order)
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        uids = [self.rows[i.row()][COL_ID] for i in persistent]
+        self.rows.sort(key=lambda row: sort_key(row, column), reverse=order == Qt.SortOrder.DescendingOrder)
+        self._row_of = None
+        self.changePersistentIndexList(persistent, [self.index(self.row_of(uid), i.column()) for uid, i in zip(uids, persistent)])
+        self.layoutChanged.emit()
+
+
+class RosterProxy(QSortFilterProxyModel):
+    """
+    Vue triée de RosterModel. Les filtres (statut, sexe, solde) et la recherche sont
+    appliqués avant, par les masques de Core/roster.py : le modèle ne reçoit que les
+    usagers affichés. Le tri demandé par l'en-tête est confié au modèle : trier ici
+    appellerait data() à chaque comparaison.
+    """
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if column >= 0:
+            self.sourceModel().sort(column, order)
+
+    def usager_at(self, proxy_row):
+        """Tuple de la ligne affichée proxy_row."""
+        source = self.mapToSource(self.index(proxy_row, 0))
+        return self.sourceModel().usager(source.row())
+
+    def proxy_row_of(self, uid):
+        """Ligne affichée de l'usager uid, None s'il est filtré ou absent."""
+        row = self.sourceModel().row_of(uid)
+        if row is None:
+            return None
+        index = self.mapFromSource(self.sourceModel().index(row, 0))
+        return index.row() if index.isValid() else None
+
+
+def fixed_column_widths(font):
+    """{colonne: largeur} des colonnes étroites pour la police d'en-tête (gras) donnée."""
+    font = QFont(font)
+    font.setBold(True)
+    metrics = QFontMetrics(font)
+    return {
+        column: max(metrics.horizontalAdvance(sample), metrics.horizontalAdvance(ROSTER_COLUMNS[column])) + 30
+        for column, sample in FIXED_COLUMN_SAMPLES.items()
+    }
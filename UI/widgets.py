@@ -1,7 +1,7 @@
 import math
 from PyQt6.QtWidgets import (
     QWidget, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, 
-    QFrame, QTableWidgetItem, QCheckBox, QSizePolicy, QLayout
+    QFrame, QCheckBox, QSizePolicy, QLayout
 )
 from PyQt6.QtCore import (
     Qt, QPropertyAnimation, QEasingCurve, pyqtProperty, 
@@ -36,18 +36,6 @@ class StatusSpinner(QLabel):
     def start(self): self.timer.start()
     def stop(self): self.timer.stop(); self.setText("")
 
-# ============================================================================
-# TABLE ITEM (TRI NUMÉRIQUE)
-# ============================================================================
-class NumericTableWidgetItem(QTableWidgetItem):
-    def __lt__(self, other):
-        try:
-            text_self = self.text().replace('€', '').replace(' ', '').replace(',', '.').strip()
-            text_other = other.text().replace('€', '').replace(' ', '').replace(',', '.').strip()
-            return float(text_self) < float(text_other)
-        except ValueError: 
-            return super().__lt__(other)
-
 # ============================================================================
 # TOGGLE SWITCH
 # ============================================================================
@@ -241,4 +229,27 @@ class RingChart(QWidget):
             painter.drawText(rect.translated(0, 15), Qt.AlignmentFlag.AlignCenter, f"{val}")
         else:
             painter.setPen(QColor("#bdc3c7")); painter.setFont(QFont("Segoe UI", 10)); painter.setOpacity(self._anim_progress)
-            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f"Total\n{self.total}"); painter.end()
\ No newline at end of file
+            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f"Total\n{self.total}"); painter.end()
+
+# ============================================================================
+# COURBE DE TENDANCE (SPARKLINE)
+# ============================================================================
+class Sparkline(QWidget):
+    """Courbe compacte (tendance des passages) : NaN ignorés, dernière valeur pointée."""
+    def __init__(self, parent=None, width=250, height=40, color="#1abc9c"):
+        super().__init__(parent); self.setFixedSize(width, height)
+        self.values = []; self.color = color
+    def set_data(self, values):
+        values = [float(v) for v in values if not math.isnan(float(v))]
+        if values == self.values: return
+        self.values = values; self.update()
+    def paintEvent(self, event):
+        painter = QPainter(self); painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        margin = 4; w = self.width() - 2 * margin; h = self.height() - 2 * margin
+        if len(self.values) < 2:
+            painter.setPen(QPen(QColor("#7f8c8d"), 1, Qt.PenStyle.DashLine)); painter.drawLine(margin, self.height() // 2, self.width() - margin, self.height() // 2); painter.end(); return
+        lo = min(self.values); hi = max(self.values); span = (hi - lo) or 1.0; step = w / (len(self.values) - 1)
+        points = [QPointF(margin + i * step, margin + h - (v - lo) / span * h) for i, v in enumerate(self.values)]
+        painter.setPen(QPen(QColor(self.color), 1.5))
+        for a, b in zip(points, points[1:]): painter.drawLine(a, b)
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QBrush(QColor("white"))); painter.drawEllipse(points[-1], 2.5, 2.5); painter.end()
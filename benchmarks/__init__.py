@@ -0,0 +1,2 @@
+# Benchmarks de la couche base de données.
+# Lancement depuis la racine du dépôt : python -m benchmarks.<nom_du_script>
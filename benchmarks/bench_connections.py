@@ -0,0 +1,101 @@
+"""
+Connexions jetables (ancien comportement) contre pool de connexions par thread.
+
+Rejoue la séquence de requêtes d'une consommation de ticket telle que l'interface
+la déclenche : ouverture de la fiche, écriture, rechargement de la liste,
+compteurs, graphiques et lecture de la config pour le PDF silencieux.
+
+    python -m benchmarks.bench_connections [nb_actions]
+"""
+import sys
+import sqlite3
+import random
+from datetime import datetime
+
+from benchmarks.common import db, temp_database, measure, print_table
+
+NB_USAGERS = 500
+
+
+def seed(conn):
+    rnd = random.Random(42)
+    conn.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        [(i, f"NOM{i}", f"Prenom{i}", rnd.choice("HF"), "Payés", 5.0, 10, "", "", "") for i in range(1, NB_USAGERS + 1)]
+    )
+    conn.commit()
+
+
+def consume_sequence(open_conn, uid):
+    """Une consommation de ticket : environ 12 demandes de connexion."""
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def query(sql, params=(), write=False):
+        conn = open_conn()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+            if write:
+                conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    # MainWindow.action_consommer
+    query("SELECT nom, prenom, ticket, statut FROM usagers WHERE id=?", (uid,))
+    # ConsommerTicketDialog.process (prix lu deux fois + écriture)
+    price = float(query("SELECT value FROM config WHERE key='TICKET_PRICE'")[0][0])
+    conn = open_conn()
+    try:
+        c = conn.cursor()
+        sexe = c.execute("SELECT sexe FROM usagers WHERE id=?", (uid,)).fetchone()[0]
+        db.insert_history(c, ('Consommation ticket(s)', '1', sexe, uid, today, 'Payés'))
+        c.execute("UPDATE usagers SET ticket=ticket-1, solde=solde-? WHERE id=?", (price, uid))
+        conn.commit()
+    finally:
+        conn.close()
+    query("SELECT value FROM config WHERE key='TICKET_PRICE'")
+    # load_data + refresh_counters (x2) + update_charts
+    query("SELECT * FROM usagers")
+    for _ in range(2):
+        query("SELECT sexe, SUM(quantite) FROM view_conso_nettoyees WHERE date_passage BETWEEN ? AND ? GROUP BY sexe", (today, today))
+        query("SELECT detail FROM historique_passages WHERE action='Recharge Compte' AND date_passage=?", (today,))
+    query("SELECT statut_au_passage, SUM(quantite) FROM view_conso_nettoyees WHERE date_passage = ? GROUP BY statut_au_passage", (today,))
+    # generate_pdf silencieux : config de l'export secondaire
+    query("SELECT value FROM config WHERE key='EXPORT_SUP_ENABLED'")
+    query("SELECT value FROM config WHERE key='EXPORT_SUP_PATH'")
+
+
+def main():
+    nb_actions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with temp_database() as path:
+        conn = db.get_connection()
+        seed(conn)
+        conn.close()
+
+        # Mode historique : nouvelle connexion à chaque appel, journal en mode DELETE
+        db.close_all_connections()
+        raw = sqlite3.connect(path)
+        raw.execute("PRAGMA journal_mode=DELETE")
+        raw.close()
+
+        def open_churn():
+            conn = sqlite3.connect(path, timeout=10)
+            conn.create_function("REGEXP", 2, db.regexp)
+            return conn
+
+        uids = iter(random.Random(1).choices(range(1, NB_USAGERS + 1), k=nb_actions * 2))
+        t_churn = measure(lambda: consume_sequence(open_churn, next(uids)), nb_actions)
+
+        # Mode pool : connexion par thread, WAL et pragmas réglés
+        t_pool = measure(lambda: consume_sequence(db.get_connection, next(uids)), nb_actions)
+
+    print_table(f"Consommation de ticket ({nb_actions} actions)", [
+        ("Connexions jetables", f"{t_churn * 1000:.2f} ms / action"),
+        ("Pool par thread", f"{t_pool * 1000:.2f} ms / action"),
+        ("Gain", f"x{t_churn / t_pool:.1f}"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
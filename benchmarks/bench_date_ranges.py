@@ -0,0 +1,90 @@
+"""
+Filtre de mois : strftime('%Y-%m', date_passage) = ? contre intervalle semi-ouvert.
+
+Construit un historique de plusieurs années puis mesure, pour les requêtes
+mensuelles des graphiques et du bilan PDF, la durée et le plan d'exécution
+des deux formes. Le script échoue si une forme "intervalle" n'utilise pas d'index.
+
+    python -m benchmarks.bench_date_ranges [nb_annees]
+"""
+import sys
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import db, temp_database, measure, print_table
+from Core.periods import month_range
+
+PASSAGES_PAR_JOUR = 120
+NB_USAGERS = 400
+
+# (libellé, requête avec {where}, paramètres placés avant le filtre de date)
+QUERIES = [
+    ("historique : conso par sexe",
+     "SELECT sexe, SUM(quantite) FROM view_conso_nettoyees WHERE {where} GROUP BY sexe", []),
+    ("daily_stats : par statut",
+     "SELECT statut_au_passage, SUM(quantite) FROM daily_stats WHERE {where} GROUP BY statut_au_passage", []),
+    ("user_day_conso : grille PDF",
+     "SELECT usager_id, date_passage, SUM(quantite) FROM user_day_conso WHERE statut_au_passage IN (?, ?) AND {where} GROUP BY usager_id, date_passage",
+     ["Payés", "Pas de crédit"]),
+    ("historique : recharges",
+     "SELECT SUM(montant) FROM historique_passages WHERE action='Recharge Compte' AND {where}", []),
+]
+
+
+def seed(conn, nb_years):
+    rnd = random.Random(9)
+    conn.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        [(i, f"NOM{i}", "", rnd.choice("HF"), "Payés", 0.0, 0, "", "", "") for i in range(1, NB_USAGERS + 1)]
+    )
+    c = conn.cursor()
+    day = date.today() - timedelta(days=365 * nb_years)
+    while day <= date.today():
+        d = day.isoformat()
+        for _ in range(PASSAGES_PAR_JOUR):
+            uid = rnd.randint(1, NB_USAGERS)
+            db.insert_history(c, ('Consommation ticket(s)', str(rnd.randint(1, 2)), rnd.choice("HF"), uid, d, rnd.choice(["Payés", "Avances", "Tutelles"])))
+        db.insert_history(c, ('Recharge Compte', "+10.00 €", "H", 1, d, "Payés"))
+        day += timedelta(days=1)
+    conn.commit()
+
+
+def plan(conn, sql, params):
+    return " | ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall())
+
+
+def main():
+    nb_years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    month = date.today().replace(day=1) - timedelta(days=200)
+    rows, failures = [], 0
+
+    with temp_database("ranges.db"):
+        with db.connection() as conn:
+            seed(conn, nb_years)
+            conn.execute("ANALYZE")
+            nb = conn.execute("SELECT COUNT(*) FROM historique_passages").fetchone()[0]
+
+            for name, sql, before in QUERIES:
+                old_sql = sql.format(where="strftime('%Y-%m', date_passage) = ?")
+                old_params = before + [month.strftime("%Y-%m")]
+                clause, bounds = month_range(month)
+                new_sql = sql.format(where=clause)
+                new_params = before + bounds
+
+                assert conn.execute(old_sql, old_params).fetchall() == conn.execute(new_sql, new_params).fetchall()
+                t_old = measure(lambda: conn.execute(old_sql, old_params).fetchall(), 5)
+                t_new = measure(lambda: conn.execute(new_sql, new_params).fetchall(), 5)
+                new_plan = plan(conn, new_sql, new_params)
+                uses_index = "SEARCH" in new_plan
+                failures += not uses_index
+
+                rows.append((name, f"{t_old * 1000:8.2f} ms -> {t_new * 1000:6.2f} ms  (x{t_old / max(t_new, 1e-9):.0f})"))
+                rows.append(("    plan intervalle", new_plan if uses_index else f"SANS INDEX : {new_plan}"))
+
+    print_table(f"Filtre mensuel sur {nb_years} an(s) d'historique ({nb} lignes)", rows)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
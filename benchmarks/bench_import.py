@@ -0,0 +1,139 @@
+"""
+Import en masse : ancienne boucle ligne à ligne contre Core/importer.py.
+
+Génère un fichier de N lignes (défaut 100 000) mêlant usagers existants, nouveaux
+et doublons, puis mesure :
+- l'ancien algorithme (SELECT nom/prenom + INSERT/UPDATE + historique ligne à ligne),
+  sur un extrait du fichier car il est quadratique sans index sur (nom, prenom)
+- import_roster() sur le fichier complet, lu au fil de l'eau
+Vérifie aussi sur l'extrait que les deux donnent les mêmes usagers et le même historique.
+
+    python -m benchmarks.bench_import [nb_lignes]
+"""
+import os
+import sys
+import random
+import tempfile
+from datetime import datetime
+
+from benchmarks.common import db, temp_database, measure, print_table
+from Core.importer import import_roster, read_file, detect_gender
+from Core.normalize import name_key
+
+NB_EXISTANTS = 5000
+LEGACY_LINES = 5000
+PRICE = 0.5
+
+
+def write_file(path, nb_lines):
+    rnd = random.Random(5)
+    prenoms = ["jean", "marie", "paul", "lucie", "karim", "fatou", ""]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(nb_lines):
+            n = rnd.randint(1, NB_EXISTANTS * 3)  # 1/3 existants, 2/3 nouveaux (avec doublons)
+            prenom = prenoms[n % len(prenoms)]
+            comment = rnd.choice(["", "", "TUTEUR UDAF"])
+            f.write(f"NOM{n} {prenom} {rnd.randint(-3, 9)} {comment}\n")
+
+
+def seed(conn):
+    prenoms = ["Jean", "Marie", "Paul", "Lucie", "Karim", "Fatou", ""]
+    conn.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire, nom_key) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+        [(i, f"NOM{i}", prenoms[i % 7], "H", ["Payés", "Avances", "Tutelles"][i % 3], 1.0, 2, "", "", "old", name_key(f"NOM{i}", prenoms[i % 7]))
+         for i in range(1, NB_EXISTANTS + 1)]
+    )
+    conn.commit()
+
+
+def legacy_import(lines, dropdown_statut):
+    """Copie de l'ancien ImportMasseDialog.process_import (sans l'interface)."""
+    conn = db.get_connection()
+    c = conn.cursor()
+    try:
+        for line in lines:
+            parts = line.split()
+            if len(parts) < 2: continue
+            ticket_index = -1
+            for i in range(1, len(parts)):
+                if parts[i].lstrip('-').isdigit():
+                    ticket_index = i
+                    ticket_quantity = abs(int(parts[i]))
+                    break
+            if ticket_index == -1: continue
+            name_parts = parts[:ticket_index]
+            comment = " ".join(parts[ticket_index + 1:])
+            nom = name_parts[0].upper()
+            prenom = "" if len(name_parts) == 1 else " ".join(name_parts[1:]).capitalize()
+            sexe = detect_gender(prenom if prenom else nom)
+            existing = c.execute("SELECT id, ticket, solde, statut, commentaire FROM usagers WHERE nom=? AND prenom=?", (nom, prenom)).fetchone()
+            if existing:
+                uid, old_t, old_s, user_statut, old_com = existing
+                final = -ticket_quantity if user_statut in ["Avances", "Tutelles"] else ticket_quantity
+                c.execute("UPDATE usagers SET ticket=?, solde=?, commentaire=? WHERE id=?", (old_t + final, old_s + final * PRICE, comment if comment else old_com, uid))
+                action_txt = f"Import (Ajout {final})"
+            else:
+                user_statut = dropdown_statut
+                final = -ticket_quantity if user_statut in ["Avances", "Tutelles"] else ticket_quantity
+                # Ancien get_next_usager_id : LAST_USED_ID + MAX(id) à chaque création
+                config_last = int(c.execute("SELECT value FROM config WHERE key='LAST_USED_ID'").fetchone()[0])
+                uid = max(config_last, c.execute("SELECT IFNULL(MAX(id), 0) FROM usagers").fetchone()[0]) + 1
+                c.execute("INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)", (uid, nom, prenom, sexe, user_statut, final * PRICE, final, "", "", comment))
+                c.execute("REPLACE INTO config (key, value) VALUES ('LAST_USED_ID', ?)", (str(uid),))
+                action_txt = "Import (Création)"
+            db.insert_history(c, (action_txt, str(final), sexe, uid, datetime.now().strftime("%Y-%m-%d"), user_statut))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def snapshot():
+    with db.connection() as conn:
+        users = conn.execute("SELECT id, nom, prenom, sexe, statut, ROUND(solde, 6), ticket, commentaire FROM usagers ORDER BY id").fetchall()
+        history = conn.execute("SELECT action, detail, sexe, usager_id, statut_au_passage, quantite FROM historique_passages ORDER BY id").fetchall()
+    return users, history
+
+
+def main():
+    nb_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tmp_dir = tempfile.mkdtemp(prefix="resto_import_")
+    path = os.path.join(tmp_dir, "liste.txt")
+    write_file(path, nb_lines)
+    with open(path, encoding="utf-8") as f:
+        extract = [next(f) for _ in range(min(LEGACY_LINES, nb_lines))]
+    extract_path = os.path.join(tmp_dir, "extrait.txt")
+    with open(extract_path, "w", encoding="utf-8") as f:
+        f.writelines(extract)
+
+    # Parité sur l'extrait (petits lots pour traverser les frontières de lot)
+    with temp_database("legacy.db"):
+        with db.connection() as conn:
+            seed(conn)
+        t_legacy = measure(lambda: legacy_import(extract, "Avances"))
+        expected = snapshot()
+    with temp_database("parity.db"):
+        with db.connection() as conn:
+            seed(conn)
+        import_roster(read_file(extract_path), "Avances", PRICE, chunk_size=97)
+        assert snapshot() == expected, "import_roster diverge de l'ancien import"
+
+    # Fichier complet
+    with temp_database("import.db"):
+        with db.connection() as conn:
+            seed(conn)
+        result = {}
+        t_new = measure(lambda: result.update(import_roster(read_file(path), "Avances", PRICE)))
+
+    rate_legacy = len(extract) / t_legacy
+    rate_new = result['lines'] / t_new
+    print_table(f"Import en masse ({nb_lines} lignes, {NB_EXISTANTS} usagers existants)", [
+        (f"Ancien import ({len(extract)} lignes)", f"{t_legacy:7.2f} s  ({rate_legacy:8.0f} lignes/s)"),
+        ("import_roster (fichier complet)", f"{t_new:7.2f} s  ({rate_new:8.0f} lignes/s)"),
+        ("Créés / mis à jour", f"{result['created']} / {result['updated']}"),
+        ("Gain (lignes/s)", f"x{rate_new / rate_legacy:.0f}"),
+        ("Parité sur l'extrait", "ok"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
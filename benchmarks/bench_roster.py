@@ -0,0 +1,186 @@
+"""
+Liste des usagers : QTableWidget rempli cellule par cellule contre modèle / vue.
+
+Sur 10 000 usagers (benchmarks/synthetic.py), mesure le rechargement complet de la liste
+jusqu'à l'affichage :
+- avant : insertRow + 9 QTableWidgetItem par usager (couleur, info-bulle HTML), colonnes
+  ResizeToContents, tri par NumericTableWidgetItem.__lt__ (texte relu à chaque comparaison)
+- après : RosterModel / RosterProxy (UI/roster_model.py), cellules lues à la demande
+Ainsi que le tri par solde, la mémoire du processus (Linux) après remplissage, et la
+préparation des lignes (sans affichage) quand on coche un filtre ou qu'un usager change :
+- avant : SELECT de tous les usagers puis filtrage ligne par ligne en Python
+- après : Core/roster.py, masques de bits en mémoire, relecture des seuls usagers modifiés
+
+    python -m benchmarks.bench_roster
+"""
+import os
+import sys
+import random
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmarks.common import db, temp_database, measure, print_table
+from benchmarks.synthetic import seed_usagers, NB_USAGERS
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QTableView, QHeaderView
+from constants import AppColors
+from Core.roster import roster_store, roster_row, filter_keys, ROSTER_SQL, COL_SOLDE
+from UI.roster_model import RosterModel, RosterProxy, ROSTER_COLUMNS, fixed_column_widths
+
+TICKET_PRICE = 0.5
+REPEAT = 5
+
+
+class NumericTableWidgetItem(QTableWidgetItem):
+    """Ancien tri numérique des colonnes ID / solde / ticket."""
+    def __lt__(self, other):
+        try:
+            return float(self.text().replace('€', '').replace(' ', '').replace(',', '.').strip()) < \
+                   float(other.text().replace('€', '').replace(' ', '').replace(',', '.').strip())
+        except ValueError:
+            return super().__lt__(other)
+
+
+def fill_table_widget(table, records):
+    """Ancien load_data : une ligne et neuf items par usager."""
+    bg_map = {"Payés": AppColors.ROW_PAYE, "Avances": AppColors.ROW_AVANCE, "Tutelles": AppColors.ROW_TUTELLE, "Pas de crédit": AppColors.ROW_NOCREDIT}
+    table.setUpdatesEnabled(False)
+    table.setSortingEnabled(False)
+    table.setRowCount(0)
+    for row in sorted((roster_row(r, TICKET_PRICE) for r in records), key=lambda r: r[1]):
+        uid, n, p, s, st, sol, tick, comment, passg = row
+        idx = table.rowCount()
+        table.insertRow(idx)
+        bg = QColor(bg_map.get(st, "white"))
+        tooltip = f"<b>{n} {p}</b> ({s})<br>Statut: {st}<br>Solde: {sol:.2f} € ({tick} tickets)<br>Dernier passage: {passg}<br>-----------------<br><i>{comment or 'Aucun commentaire'}</i>"
+        for i, val in enumerate([uid, n, p, s, st, f"{sol:.2f} €", tick, comment, passg]):
+            it = NumericTableWidgetItem(str(val)) if i in (0, 5, 6) else QTableWidgetItem(str(val))
+            it.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            it.setBackground(bg)
+            it.setToolTip(tooltip)
+            table.setItem(idx, i, it)
+    table.setSortingEnabled(True)
+    table.setUpdatesEnabled(True)
+
+
+def select_filtered(filters):
+    """Ancien chemin : toute la table relue, filtres appliqués ligne par ligne."""
+    hidden = {key for key, shown in filters.items() if not shown}
+    with db.connection() as conn:
+        rows = [roster_row(r, TICKET_PRICE) for r in conn.execute(ROSTER_SQL)]
+    return [row for row in rows if hidden.isdisjoint(filter_keys(row))]
+
+
+def store_filtered(filters):
+    roster_store.refresh(TICKET_PRICE)
+    return [roster_store.records[slot] for slot in roster_store.slots(roster_store.visible_mask(filters))]
+
+
+def rss_mb():
+    """Mémoire résidente du processus (Mo), None hors Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    app = QApplication(sys.argv)
+    with temp_database("roster.db"):
+        with db.connection() as conn:
+            seed_usagers(conn, random.Random(1))
+        with db.connection() as conn:
+            records = conn.execute(ROSTER_SQL).fetchall()
+
+        # --- Filtres et mise à jour d'un usager (préparation des lignes seule) ---
+        filters = {"H": False, "Négatif": False, "Tutelles": False}
+        assert sorted(select_filtered(filters)) == sorted(store_filtered(filters))
+        t_filter_select = measure(lambda: select_filtered(filters), REPEAT)
+        t_filter_store = measure(lambda: store_filtered(filters), REPEAT)
+        counter = iter(range(10 ** 6))
+
+        def touch_one():
+            with db.connection() as conn:
+                conn.execute("UPDATE usagers SET ticket = ? WHERE id = 1", (next(counter) % 7,))
+
+        t_touch = measure(touch_one, REPEAT)
+        t_update_select = measure(lambda: (touch_one(), select_filtered(filters)), REPEAT) - t_touch
+        t_update_store = measure(lambda: (touch_one(), store_filtered(filters)), REPEAT) - t_touch
+
+        # --- Après : modèle / vue ---
+        rss_start = rss_mb()
+        model, proxy = RosterModel(), RosterProxy()
+        proxy.setSourceModel(model)
+        view = QTableView()
+        view.setModel(proxy)
+        header = view.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        for column, width in fixed_column_widths(header.font()).items():
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.Fixed)
+            header.resizeSection(column, width)
+        view.setSortingEnabled(True)
+        view.resize(1200, 800)
+        view.show()
+
+        def reload_view():
+            model.set_rows([roster_row(r, TICKET_PRICE) for r in records])
+            app.processEvents()
+
+        t_view = measure(reload_view, REPEAT)
+        rss_view = rss_mb()
+
+        def sort_view():
+            view.sortByColumn(COL_SOLDE, Qt.SortOrder.DescendingOrder)
+            view.sortByColumn(COL_SOLDE, Qt.SortOrder.AscendingOrder)
+            app.processEvents()
+
+        t_sort_view = measure(sort_view, REPEAT) / 2
+        view.close()
+
+        # --- Avant : QTableWidget ---
+        table = QTableWidget(0, len(ROSTER_COLUMNS))
+        table.setHorizontalHeaderLabels(ROSTER_COLUMNS)
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        for column in (0, 3, 4, 5, 6, 8):
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.ResizeToContents)
+        table.resize(1200, 800)
+        table.show()
+
+        def reload_widget():
+            fill_table_widget(table, records)
+            app.processEvents()
+
+        t_widget = measure(reload_widget, REPEAT)
+        rss_widget = rss_mb()
+
+        def sort_widget():
+            table.sortByColumn(COL_SOLDE, Qt.SortOrder.DescendingOrder)
+            table.sortByColumn(COL_SOLDE, Qt.SortOrder.AscendingOrder)
+            app.processEvents()
+
+        t_sort_widget = measure(sort_widget, 1) / 2
+        table.close()
+
+    rows = [
+        ("Filtre coché : SELECT + filtrage (avant)", f"{t_filter_select * 1000:8.1f} ms"),
+        ("Filtre coché : masques en mémoire", f"{t_filter_store * 1000:8.1f} ms  (x{t_filter_select / t_filter_store:.0f})"),
+        ("Un usager modifié : SELECT + filtrage (avant)", f"{t_update_select * 1000:8.1f} ms"),
+        ("Un usager modifié : relecture de l'usager", f"{t_update_store * 1000:8.1f} ms  (x{t_update_select / t_update_store:.0f})"),
+        ("Rechargement QTableWidget (avant)", f"{t_widget * 1000:8.1f} ms"),
+        ("Rechargement modèle / vue", f"{t_view * 1000:8.1f} ms  (x{t_widget / t_view:.0f})"),
+        ("Tri par solde QTableWidget (avant)", f"{t_sort_widget * 1000:8.1f} ms"),
+        ("Tri par solde modèle / vue", f"{t_sort_view * 1000:8.1f} ms  (x{t_sort_widget / t_sort_view:.0f})"),
+    ]
+    if rss_start is not None:
+        rows += [
+            ("Mémoire ajoutée : modèle / vue", f"{rss_view - rss_start:8.1f} Mo"),
+            ("Mémoire ajoutée : QTableWidget (avant)", f"{rss_widget - rss_view:8.1f} Mo"),
+        ]
+    print_table(f"Liste des usagers ({NB_USAGERS} usagers)", rows)
+
+
+if __name__ == "__main__":
+    main()
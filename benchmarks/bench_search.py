@@ -0,0 +1,94 @@
+"""
+Recherche d'usagers : ancien score calculé usager par usager contre Core/search.py.
+
+Sur 10 000 usagers aux noms variés (accents, noms composés, prénoms absents), mesure
+pour quelques saisies typiques :
+- avant : MainWindow.calculate_match_score sur chaque usager (noms normalisés à chaque
+  recherche, SequenceMatcher sur tous ceux qu'aucun préfixe ne désigne)
+- après : RosterStore.search (table triée des préfixes, ressemblance bornée)
+Vérifie que les deux donnent les mêmes scores, et mesure la construction de la table
+et les propositions de l'autocomplétion.
+
+    python -m benchmarks.bench_search
+"""
+import random
+from difflib import SequenceMatcher
+
+from benchmarks.common import db, temp_database, measure, print_table
+from Core.normalize import strip_accents
+from Core.roster import roster_store, COL_ID, COL_NOM, COL_PRENOM
+
+NB_USAGERS = 10_000
+REPEAT = 3
+NOMS = ["Martin", "Bernard", "Dubois", "Durand", "Lefèvre", "Moreau", "Laurent", "Garcia", "N'Diaye", "Le Gall",
+        "Müller", "Diallo", "Traoré", "Nguyen", "Da Silva", "Benali", "Hébert", "Roux", "Fontaine", "Chevalier"]
+PRENOMS = ["Jean", "Marie", "Jean-Pierre", "Zoé", "Éric", "Fatou", "Karim", "Anne Marie", "Lucie", "Paul", ""]
+SAISIES = ["1234", "mar", "dubois j", "jean", "le gall", "zoe", "ndiay", "lefevre", "durant", "xq"]
+
+
+def legacy_score(search_text, uid, nom, prenom):
+    """Copie de l'ancien MainWindow.calculate_match_score (noms normalisés à chaque appel)."""
+    n_clean = strip_accents(nom)
+    p_clean = strip_accents(prenom)
+    if str(uid) == search_text: return 100
+    full_name = f"{n_clean} {p_clean}"
+    inv_name = f"{p_clean} {n_clean}"
+    if n_clean.startswith(search_text) or p_clean.startswith(search_text): return 95
+    if full_name.startswith(search_text) or inv_name.startswith(search_text): return 90
+    if search_text in full_name or search_text in inv_name: return 70
+    best_ratio = max(SequenceMatcher(None, search_text, n_clean).ratio(),
+                     SequenceMatcher(None, search_text, p_clean).ratio(),
+                     SequenceMatcher(None, search_text, full_name).ratio())
+    if best_ratio > 0.6: return int(best_ratio * 60)
+    return 0
+
+
+def legacy_search(text, records):
+    scores = {}
+    for row in records:
+        score = legacy_score(text, row[COL_ID], row[COL_NOM], row[COL_PRENOM])
+        if score:
+            scores[row[COL_ID]] = score
+    return scores
+
+
+def seed(conn):
+    rnd = random.Random(7)
+    rows = []
+    for uid in range(1, NB_USAGERS + 1):
+        nom = rnd.choice(NOMS) + ("" if rnd.random() < 0.7 else f"-{rnd.choice(NOMS)}")
+        rows.append((uid, nom.upper(), rnd.choice(PRENOMS), rnd.choice("HF"), "Payés", 0, 1, "", "", ""))
+    conn.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        rows
+    )
+
+
+def main():
+    with temp_database("search.db"):
+        with db.connection() as conn:
+            seed(conn)
+        roster_store.refresh(0.5)
+        slots = roster_store.slots()
+        records = [roster_store.records[slot] for slot in slots]
+
+        names = roster_store.names
+        names._table = None  # Construite à la première recherche
+        t_build = measure(names._sorted, 1)
+
+        rows = [("Construction de la table des préfixes", f"{t_build * 1000:8.1f} ms")]
+        for text in SAISIES:
+            text = strip_accents(text)
+            expected = legacy_search(text, records)
+            found = {roster_store.records[slot][COL_ID]: score for slot, score in roster_store.search(text, slots).items()}
+            assert found == expected, text
+            t_old = measure(lambda: legacy_search(text, records), REPEAT)
+            t_new = measure(lambda: roster_store.search(text, slots), REPEAT)
+            rows.append((f"'{text}' ({len(found)} résultats)", f"{t_old * 1000:8.1f} ms -> {t_new * 1000:6.1f} ms  (x{t_old / t_new:.0f})"))
+        t_complete = measure(lambda: names.completions("dub"), 100)
+        rows.append(("Autocomplétion 'dub' (10 noms)", f"{t_complete * 1000:8.3f} ms"))
+    print_table(f"Recherche ({NB_USAGERS} usagers) : avant -> après", rows)
+
+
+if __name__ == "__main__":
+    main()
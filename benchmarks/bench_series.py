@@ -0,0 +1,66 @@
+"""
+Série annuelle pour un graphique : un get_stats_range par jour contre StatsService.series().
+
+    python -m benchmarks.bench_series [nb_annees]
+"""
+import sys
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import db, temp_database, measure, print_table
+from constants import HAS_NUMPY
+from Core.stats import StatsService, stats_cache
+
+PASSAGES_PAR_JOUR = 120
+NB_USAGERS = 400
+
+
+def seed(conn, nb_years):
+    rnd = random.Random(6)
+    rows = []
+    day = date.today() - timedelta(days=365 * nb_years)
+    while day <= date.today():
+        rows += [(rnd.choice(['Consommation ticket(s)', 'PAYE', '1ERE_FOIS']), '1', rnd.choice("HF"), rnd.randint(1, NB_USAGERS),
+                  day.isoformat(), rnd.choice(["Payés", "Avances", "Tutelles", "1ère fois"])) for _ in range(PASSAGES_PAR_JOUR)]
+        day += timedelta(days=1)
+    db.insert_history_many(conn.cursor(), rows)
+
+
+def per_day(start, end):
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return [StatsService.get_stats_range(d.isoformat(), d.isoformat()) for d in days]
+
+
+def main():
+    nb_years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=364)
+    rows = []
+
+    with temp_database("series.db"):
+        with db.connection() as conn:
+            seed(conn, nb_years)
+
+        legacy = per_day(start, end)
+        series = StatsService.series(start.isoformat(), end.isoformat())
+        for i, expected in enumerate(legacy):
+            assert int(series.total_passages[i]) == expected['total_passages']
+            assert int(series.tickets_avance[i]) == expected['tickets_avance']
+
+        def cold(func):
+            def run():
+                stats_cache.clear()
+                func()
+            return run
+
+        t_legacy = measure(cold(lambda: per_day(start, end)), 3)
+        for bucket in ("day", "week", "month"):
+            t = measure(cold(lambda: StatsService.series(start.isoformat(), end.isoformat(), bucket)), 20)
+            rows.append((f"series(bucket='{bucket}')", f"{t * 1000:8.2f} ms  (x{t_legacy / t:.0f})"))
+
+    print_table(f"365 jours de chiffres ({nb_years} an(s) d'historique, {'NumPy' if HAS_NUMPY else 'array'})",
+                [("365 x get_stats_range", f"{t_legacy * 1000:8.2f} ms")] + rows)
+
+
+if __name__ == "__main__":
+    main()
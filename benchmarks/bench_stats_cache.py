@@ -0,0 +1,88 @@
+"""
+Cache de StatsService : recalcul à chaque rafraîchissement contre cache versionné.
+
+Construit plusieurs années d'historique puis mesure :
+- le tableau de bord (requête unique) recalculé, puis servi par le cache
+- le bilan d'un mois passé après un passage du jour (doit rester en cache)
+- le tableau de bord après un passage du jour (doit être recalculé)
+
+    python -m benchmarks.bench_stats_cache [nb_annees]
+"""
+import sys
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import db, temp_database, measure, print_table
+from Core.stats import StatsService, stats_cache
+
+PASSAGES_PAR_JOUR = 120
+NB_USAGERS = 400
+REPEAT = 200
+
+
+def seed(conn, nb_years):
+    rnd = random.Random(4)
+    conn.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        [(i, f"NOM{i}", "", rnd.choice("HF"), "Payés", rnd.choice([-1.0, 2.0]), 0, "", "", "") for i in range(1, NB_USAGERS + 1)]
+    )
+    rows = []
+    day = date.today() - timedelta(days=365 * nb_years)
+    while day <= date.today():
+        d = day.isoformat()
+        rows += [('Consommation ticket(s)', '1', rnd.choice("HF"), rnd.randint(1, NB_USAGERS), d, rnd.choice(["Payés", "Avances", "Tutelles"]))
+                 for _ in range(PASSAGES_PAR_JOUR)]
+        rows.append(('Recharge Compte', "+10.00 €", "H", 1, d, "Payés"))
+        day += timedelta(days=1)
+    db.insert_history_many(conn.cursor(), rows)
+
+
+def click():
+    db.write_sync(db.insert_history, ("PAYE", "Anonyme", "H", None, date.today().isoformat(), "Payés"))
+
+
+def main():
+    nb_years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    last_month = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+    month_end = date.today().replace(day=1) - timedelta(days=1)
+
+    with temp_database("stats_cache.db"):
+        with db.connection() as conn:
+            seed(conn, nb_years)
+
+        def dashboard_miss():
+            stats_cache.clear()
+            StatsService.dashboard()
+
+        t_miss = measure(dashboard_miss, REPEAT)
+        t_hit = measure(StatsService.dashboard, REPEAT)
+
+        def past_stats_miss():
+            stats_cache.clear()
+            StatsService.get_stats_range(last_month, month_end)
+
+        t_past_miss = measure(past_stats_miss, REPEAT)
+        expected = StatsService.get_stats_range(last_month, month_end)
+
+        t_past_click = 0.0  # Lecture seule, l'écriture du passage n'est pas chronométrée
+        for _ in range(REPEAT):
+            click()
+            t_past_click += measure(lambda: StatsService.get_stats_range(last_month, month_end)) / REPEAT
+        assert StatsService.get_stats_range(last_month, month_end) == expected
+
+        before = StatsService.dashboard()
+        click()
+        after = StatsService.dashboard()
+        assert after.day.anon_paye == before.day.anon_paye + 1, "tableau de bord non invalidé"
+
+    print_table(f"Cache StatsService ({nb_years} an(s) d'historique)", [
+        ("Tableau de bord recalculé", f"{t_miss * 1000:8.3f} ms"),
+        ("Tableau de bord en cache", f"{t_hit * 1000:8.3f} ms  (x{t_miss / t_hit:.0f})"),
+        ("Bilan du mois dernier recalculé", f"{t_past_miss * 1000:8.3f} ms"),
+        ("Bilan du mois dernier après un passage", f"{t_past_click * 1000:8.3f} ms  (resté en cache)"),
+        ("Tableau de bord après un passage", "recalculé"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
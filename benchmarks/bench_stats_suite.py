@@ -0,0 +1,146 @@
+"""
+Suite de référence de la couche statistiques sur des historiques synthétiques de
+1, 5 et 10 ans (jusqu'à un million de lignes, 10 000 usagers, benchmarks/synthetic.py).
+
+Mesure pour un jour, un mois et une année :
+- StatsService.get_stats_range / get_recharges_range / series
+- la requête des graphiques (update_charts : StatsService.dashboard), à froid et en cache
+- refresh_counters (compteurs en mémoire) et leur amorçage SQL
+- generate_custom_pdf_logic (bilan personnalisé complet)
+Les requêtes sont mesurées cache vidé (stats_cache) : c'est la couche SQL qui est suivie.
+
+Résultats : tableau à l'écran et JSON (--json) ; avec --baseline, compare à un JSON
+précédent et sort en erreur (code 1) si un cas ralentit au-delà de --max-ratio.
+
+    python -m benchmarks.bench_stats_suite [--years 1 5 10] [--json resultats.json]
+                                           [--baseline ref.json] [--cache-dir DOSSIER]
+"""
+import sys
+import json
+import sqlite3
+import argparse
+import platform
+from datetime import date, datetime, timedelta
+from statistics import median
+
+from benchmarks.common import measure_runs, print_table
+from benchmarks.synthetic import synthetic_database
+from constants import HAS_NUMPY, HAS_REPORTLAB
+from Core.stats import StatsService, stats_cache
+from Core.counters import today_counters
+from Core.trends import load_trends
+
+REPEAT = 5
+PDF_REPEAT = 3
+
+
+def ranges():
+    today = date.today()
+    return {
+        "jour": (today, today),
+        "mois": (today.replace(day=1), today),
+        "annee": (today - timedelta(days=364), today),
+    }
+
+
+def cold(func):
+    def run():
+        stats_cache.clear()
+        func()
+    return run
+
+
+def cases():
+    """(cas, période, fonction, répétitions) mesurés sur chaque base."""
+    out = []
+    for name, (start, end) in ranges().items():
+        s, e = start.isoformat(), end.isoformat()
+        out.append(("get_stats_range", name, cold(lambda s=s, e=e: StatsService.get_stats_range(s, e)), REPEAT))
+        out.append(("get_recharges_range", name, cold(lambda s=s, e=e: StatsService.get_recharges_range(s, e)), REPEAT))
+        if HAS_REPORTLAB:
+            from Core.pdf_generator import generate_custom_pdf_logic
+            out.append(("generate_custom_pdf_logic", name, cold(lambda s=s, e=e: generate_custom_pdf_logic(s, e, 0.5)), PDF_REPEAT))
+    start, end = ranges()["annee"]
+    for bucket in ("day", "month"):
+        out.append((f"series({bucket})", "annee", cold(lambda b=bucket: StatsService.series(start.isoformat(), end.isoformat(), b)), REPEAT))
+    out.append(("update_charts (dashboard)", "jour+mois", cold(StatsService.dashboard), REPEAT))
+    out.append(("update_charts (en cache)", "jour+mois", StatsService.dashboard, REPEAT * 20))
+    out.append(("refresh_counters (mémoire)", "jour", today_counters.snapshot, REPEAT * 20))
+    out.append(("compteurs : amorçage SQL", "jour", today_counters.seed, REPEAT))
+    out.append(("load_trends", "10 ans", cold(load_trends), REPEAT))
+    return out
+
+
+def run_suite(years_list, cache_dir=None):
+    results = []
+    for years in years_list:
+        with synthetic_database(years, cache_dir=cache_dir) as info:
+            print(f"Base {years} an(s) : {info['rows']} lignes, {info['usagers']} usagers"
+                  f"{' (construite)' if info['built'] else ''}", flush=True)
+            StatsService.dashboard()  # Ouverture de la connexion, pages chaudes
+            today_counters.seed()
+            for case, period, func, repeat in cases():
+                runs = measure_runs(func, repeat)
+                results.append({
+                    "years": years, "rows": info["rows"], "case": case, "range": period,
+                    "median_ms": round(median(runs) * 1000, 4), "min_ms": round(runs[0] * 1000, 4), "runs": repeat,
+                })
+    return results
+
+
+def compare(results, baseline, max_ratio, min_delta_ms):
+    """Cas ralentis : médiane > max_ratio x référence et au moins min_delta_ms de plus."""
+    ref = {(r["years"], r["case"], r["range"]): r["median_ms"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = ref.get((r["years"], r["case"], r["range"]))
+        if old is None:
+            continue
+        if r["median_ms"] > old * max_ratio and r["median_ms"] - old >= min_delta_ms:
+            regressions.append((r, old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de référence StatsService")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--json", help="Fichier de résultats JSON à écrire")
+    parser.add_argument("--baseline", help="JSON de référence à comparer")
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    parser.add_argument("--cache-dir", help="Dossier où garder les bases construites")
+    args = parser.parse_args()
+
+    results = run_suite(args.years, args.cache_dir)
+    for years in args.years:
+        rows = [(f"{r['case']} [{r['range']}]", f"{r['median_ms']:10.3f} ms") for r in results if r["years"] == years]
+        print_table(f"{years} an(s) d'historique", rows)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": HAS_NUMPY,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats écrits dans {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_ratio, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) (> x{args.max_ratio}) :")
+            for r, old in regressions:
+                print(f"  {r['years']} an(s) {r['case']} [{r['range']}] : {old:.3f} ms -> {r['median_ms']:.3f} ms")
+            sys.exit(1)
+        print("\nAucune régression par rapport à la référence.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Tendances sur dix ans d'historique : chargement, calcul NumPy / Python, cache.
+
+    python -m benchmarks.bench_trends [nb_annees]
+"""
+import sys
+import math
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import db, temp_database, measure, print_table
+import Core.trends as trends
+from Core.stats import StatsService, stats_cache
+
+PASSAGES_MAX = 60
+
+
+def seed(conn, nb_years):
+    rnd = random.Random(8)
+    rows = []
+    day = date.today() - timedelta(days=365 * nb_years)
+    while day < date.today():
+        if day.weekday() < 5:
+            rows += [('Consommation ticket(s)', '1', rnd.choice("HF"), 1, day.isoformat(), 'Payés')] * rnd.randint(10, PASSAGES_MAX)
+        day += timedelta(days=1)
+    db.insert_history_many(conn.cursor(), rows)
+
+
+def same(a, b):
+    return len(a) == len(b) and all((math.isnan(x) and math.isnan(y)) or abs(x - y) < 1e-9 for x, y in zip(map(float, a), map(float, b)))
+
+
+def main():
+    nb_years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rows = []
+
+    with temp_database("trends.db"):
+        with db.connection() as conn:
+            seed(conn, nb_years)
+
+        def cold_load():
+            stats_cache.clear()
+            trends.load_trends(years=nb_years)
+
+        t_load = measure(cold_load, 5)
+        t_hit = measure(lambda: trends.load_trends(years=nb_years), 200)
+        current = trends.load_trends(years=nb_years)
+        series = StatsService.series(current.days[0], current.days[-1])
+        passages = list(series.total_passages)
+
+        rows.append(("Chargement + calcul (cache vide)", f"{t_load * 1000:8.2f} ms"))
+        rows.append(("Tendances en cache", f"{t_hit * 1000:8.3f} ms"))
+        results = {}
+        for use_numpy in ((True, False) if trends.HAS_NUMPY else (False,)):
+            trends.HAS_NUMPY = use_numpy
+            results[use_numpy] = trends.compute_trends(series.starts, passages)
+            t = measure(lambda: trends.compute_trends(series.starts, passages), 20)
+            rows.append((f"Calcul seul ({'NumPy' if use_numpy else 'Python'})", f"{t * 1000:8.2f} ms"))
+        if len(results) == 2:
+            for name in ("mean_7", "mean_28", "wow", "yoy", "weekday_profile"):
+                assert same(getattr(results[True], name), getattr(results[False], name)), name
+            rows.append(("Parité NumPy / Python", "ok"))
+
+    print_table(f"Tendances ({nb_years} an(s), {len(series)} jours)", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Clics "passage anonyme" en rafale : un commit par clic contre écrivain unique.
+
+Mode direct (ancien comportement) : chaque clic ouvre sa transaction et la valide.
+Mode écrivain : chaque clic soumet l'insertion à db.write() sans attendre ;
+les clics arrivés dans la même fenêtre de quelques millisecondes partagent un commit.
+Mesuré avec synchronous=NORMAL (réglage de l'application) et FULL (un fsync par commit).
+
+    python -m benchmarks.bench_writer [nb_clics]
+"""
+import sys
+from datetime import date
+
+from benchmarks.common import db, temp_database, measure, print_table
+
+
+def click_row(i):
+    return ("PAYE" if i % 3 else "1ERE_FOIS", "Anonyme", "HF"[i % 2], None, date.today().isoformat(), "Payés")
+
+
+def click_direct(i):
+    with db.connection() as conn:
+        db.insert_history(conn.cursor(), click_row(i))
+
+
+def run_clicks(click, nb_clicks):
+    counter = iter(range(nb_clicks))
+    return measure(lambda: click(next(counter)), nb_clicks)
+
+
+def main():
+    nb_clicks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    app_pragmas = db.PRAGMAS
+    rows = []
+
+    for sync in ("NORMAL", "FULL"):
+        db.PRAGMAS = tuple(p if not p.startswith("PRAGMA synchronous") else f"PRAGMA synchronous={sync}" for p in app_pragmas)
+        try:
+            with temp_database("writer.db"):
+                t_direct = run_clicks(click_direct, nb_clicks)
+
+                futures = []
+                t_submit = run_clicks(lambda i: futures.append(db.write(db.insert_history, click_row(i))), nb_clicks)
+                t_total = measure(lambda: [f.result() for f in futures]) / nb_clicks + t_submit
+
+                with db.connection() as conn:
+                    stored = conn.execute("SELECT SUM(nb) FROM daily_stats").fetchone()[0]
+                assert stored == 2 * nb_clicks, stored
+        finally:
+            db.PRAGMAS = app_pragmas
+
+        rows += [
+            (f"[{sync}] commit par clic", f"{1 / t_direct:10.0f} clics/s"),
+            (f"[{sync}] écrivain (clic seul)", f"{1 / t_submit:10.0f} clics/s  (temps d'interface)"),
+            (f"[{sync}] écrivain (jusqu'au commit)", f"{1 / t_total:10.0f} clics/s  (x{t_direct / t_total:.1f})"),
+        ]
+
+    print_table(f"Passages anonymes ({nb_clicks} clics)", rows)
+
+
+if __name__ == "__main__":
+    main()
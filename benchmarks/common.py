@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Les scripts sont lancés avec "python -m benchmarks.xxx" depuis la racine
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database as db
+
+
+@contextmanager
+def temp_database(name="bench.db"):
+    """Crée une base vierge dans un dossier temporaire et y pointe le module database."""
+    tmp_dir = tempfile.mkdtemp(prefix="resto_bench_")
+    path = os.path.join(tmp_dir, name)
+    db.use_database(path)
+    try:
+        db.init_db()
+        yield path
+    finally:
+        db.close_all_connections()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def measure(func, repeat=1):
+    """Exécute func() 'repeat' fois et retourne la durée moyenne en secondes."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def print_table(title, rows):
+    """Affiche des lignes (libellé, valeur) alignées."""
+    print(f"\n=== {title} ===")
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)} : {value}")
+
+
+def measure_runs(func, repeat=5):
+    """Durées (secondes) de 'repeat' exécutions de func(), triées : médiane robuste au bruit."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return sorted(runs)
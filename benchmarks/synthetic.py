@@ -0,0 +1,122 @@
+"""
+Bases synthétiques reproductibles : N années d'historique et 10 000 usagers.
+
+Le volume quotidien imite un restaurant fréquenté (consommations d'usagers de tous
+statuts, passages anonymes, recharges, offerts) : 10 ans font environ un million de
+lignes d'historique. Une même graine donne toujours la même base.
+
+    with synthetic_database(5) as info:
+        info["rows"]  # lignes d'historique
+
+Avec cache_dir, la base construite est gardée (synth_<années>y_<graine>.db) et
+réutilisée aux lancements suivants.
+"""
+import os
+import shutil
+import random
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from benchmarks.common import db
+from Core.normalize import name_key
+
+NB_USAGERS = 10_000
+CONSO_PAR_JOUR = 240
+ANONYMES_PAR_JOUR = 25
+RECHARGES_PAR_JOUR = 12
+STATUTS = ["Payés", "Payés", "Payés", "Avances", "Tutelles", "Pas de crédit"]
+PRENOMS = ["Jean", "Marie", "Paul", "Lucie", "Karim", "Fatou", "Ali", "Sophie", ""]
+
+
+def seed_usagers(conn, rnd):
+    rows = []
+    for i in range(1, NB_USAGERS + 1):
+        prenom = PRENOMS[i % len(PRENOMS)]
+        rows.append((i, f"NOM{i}", prenom, rnd.choice("HF"), rnd.choice(STATUTS), round(rnd.uniform(-20, 40), 2),
+                     rnd.randint(-5, 20), "", "", "", name_key(f"NOM{i}", prenom)))
+    conn.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire, nom_key) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+        rows
+    )
+    conn.execute("UPDATE sequences SET value = ? WHERE name = 'usagers'", (NB_USAGERS,))
+    return {uid: (sexe, statut) for uid, _, _, sexe, statut, *_ in rows}
+
+
+def _day_rows(rnd, day, usagers):
+    d = day.isoformat()
+    rows = []
+    for _ in range(CONSO_PAR_JOUR):
+        uid = rnd.randint(1, NB_USAGERS)
+        sexe, statut = usagers[uid]
+        rows.append(('Consommation ticket(s)', str(rnd.choice((1, 1, 1, 2))), sexe, uid, d, statut))
+    for _ in range(ANONYMES_PAR_JOUR):
+        action = rnd.choice(('PAYE', 'PAYE', 'PAYE', '1ERE_FOIS'))
+        rows.append((action, 'Anonyme', rnd.choice("HF"), None, d, 'Payés' if action == 'PAYE' else '1ère fois'))
+    for _ in range(RECHARGES_PAR_JOUR):
+        uid = rnd.randint(1, NB_USAGERS)
+        rows.append(('Recharge Compte', f"+{rnd.choice((2, 5, 10, 20)):.2f} €", usagers[uid][0], uid, d, usagers[uid][1]))
+    if rnd.random() < 0.3:
+        uid = rnd.randint(1, NB_USAGERS)
+        rows.append(('Offert', '1', usagers[uid][0], uid, d, 'Offert'))
+    return rows
+
+
+def _last_day(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT MAX(date_passage) FROM historique_passages").fetchone()[0]
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def build_history(years, seed=1, end=None):
+    """Remplit la base courante (vierge) : usagers puis historique jour par jour jusqu'à end (défaut : aujourd'hui)."""
+    rnd = random.Random(seed)
+    end = end or date.today()
+    with db.connection() as conn:
+        usagers = seed_usagers(conn, rnd)
+        c = conn.cursor()
+        day = end - timedelta(days=365 * years - 1)
+        while day <= end:
+            db.insert_history_many(c, _day_rows(rnd, day, usagers))
+            day += timedelta(days=1)
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+
+
+@contextmanager
+def synthetic_database(years, seed=1, cache_dir=None):
+    """
+    Pointe le module database vers une base synthétique de 'years' années.
+    Retourne {'path', 'years', 'rows', 'usagers', 'built'} (built : construite à l'instant).
+    """
+    tmp_dir = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"synth_{years}y_{seed}.db")
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="resto_synth_")
+        path = os.path.join(tmp_dir, "synth.db")
+    if os.path.exists(path) and _last_day(path) != date.today().isoformat():
+        # Base gardée construite un autre jour : son historique ne va pas jusqu'à aujourd'hui
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    built = not os.path.exists(path)
+    db.use_database(path)
+    try:
+        db.init_db()
+        if built:
+            build_history(years, seed)
+        with db.connection() as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM historique_passages").fetchone()[0]
+            usagers = conn.execute("SELECT COUNT(*) FROM usagers").fetchone()[0]
+        yield {"path": path, "years": years, "rows": rows, "usagers": usagers, "built": built}
+    finally:
+        db.close_all_connections()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -1,5 +1,6 @@
 import sys
 import os
+import importlib.util
 
 # ============================================================================
 # 1. VERSIONS ET DEPENDANCES
@@ -21,6 +22,9 @@ try:
 except ImportError:
     HAS_PIL = False
 
+# NumPy (séries et tendances) : détecté sans être importé, Core/ l'importe au besoin
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
 # ============================================================================
 # 2. GESTION DES CHEMINS (PATHS)
 # ============================================================================
@@ -34,6 +38,7 @@ else:
 DB_DIR = os.path.join(BASE_DIR, "db")
 ARCHIVE_DIR = os.path.join(BASE_DIR, "Archive") 
 DB_FILE = os.path.join(DB_DIR, "database.db")
+SQL_PROFILE_LOG = os.path.join(DB_DIR, "requetes_lentes.log")  # Profilage SQL (--profile-sql)
 PDF_FILENAME = "Bilan_Mensuel.pdf"
 
 IMG_DIR = os.path.join(INTERNAL_RES_DIR, "Images")
@@ -208,7 +213,7 @@ GLOBAL_STYLESHEET = f"""
     QDialog QLabel {{ color: #2c3e50; }}
     
     /* --- TABLEAUX : SANS BORDURES --- */
-    QTableWidget {{ 
+    QTableWidget, QTableView#roster {{ 
         background-color: white; 
         gridline-color: #ecf0f1; 
         color: black; 
@@ -219,7 +224,7 @@ GLOBAL_STYLESHEET = f"""
         border-radius: 0px;
         outline: none; 
     }}
-    QTableWidget:focus {{ border: none; }} 
+    QTableWidget:focus, QTableView#roster:focus {{ border: none; }} 
     
     QScrollBar:horizontal {{ height: 0px; }}
     
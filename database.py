@@ -1,56 +1,384 @@
 import sqlite3
 import os
 import re  # <--- INDISPENSABLE pour la fonction REGEXP
+import json
+import time
+import queue
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from constants import DB_DIR, DB_FILE
+from Core.normalize import name_key
 
 # ============================================================================
 # FONCTION PYHTON POUR REGEX SQLITE
 # ============================================================================
+@lru_cache(maxsize=32)
+def _compile(expr):
+    return re.compile(expr)
+
 def regexp(expr, item):
     """Fonction qui permet d'utiliser REGEXP dans les requêtes SQL."""
     try:
         # Si l'item est vide ou None, ça ne matche pas
         if item is None:
             return False
-        reg = re.compile(expr)
-        return reg.search(str(item)) is not None
+        return _compile(expr).search(str(item)) is not None
     except Exception:
         return False
 
 # ============================================================================
-# GESTION CONNEXION
+# QUANTITÉ CONSOMMÉE (colonne historique_passages.quantite)
 # ============================================================================
-def get_connection():
+# Actions qui comptent comme un passage au restaurant
+CONSO_ACTIONS = ('Consommation ticket(s)', 'PAYE', '1ERE_FOIS', 'Offert')
+CONSO_ACTIONS_SQL = "('Consommation ticket(s)', 'PAYE', '1ERE_FOIS', 'Offert')"
+
+_QUANTITE_RE = re.compile(r'-?[0-9]+')  # fullmatch : même règle que QUANTITE_SQL
+
+# Équivalent SQL (sans fonction Python) de quantite_from_detail, pour les rattrapages
+QUANTITE_SQL = """CASE
+    WHEN (detail GLOB '[0-9]*' AND detail NOT GLOB '*[^0-9]*')
+      OR (detail GLOB '-[0-9]*' AND substr(detail, 2) NOT GLOB '*[^0-9]*')
+    THEN CAST(detail AS INTEGER)
+    ELSE 1
+END"""
+
+def quantite_from_detail(action, detail):
     """
-    Crée et retourne une connexion à la base de données.
-    TIMEOUT=10 : Attend 10s avant de planter si la base est occupée.
+    Nombre de tickets d'une ligne d'historique : "detail" s'il est entier, sinon 1.
+    None pour les actions qui ne sont pas des consommations.
+    """
+    if action not in CONSO_ACTIONS:
+        return None
+    if detail is not None and _QUANTITE_RE.fullmatch(str(detail)):
+        return int(detail)
+    return 1
+
+def montant_from_detail(action, detail):
+    """Montant d'une recharge ("+5.00 €" -> 5.0), None si illisible ou autre action."""
+    if action != 'Recharge Compte' or detail is None:
+        return None
+    try:
+        return float(str(detail).replace('€', '').replace('+', '').strip())
+    except ValueError:
+        return None
+
+def insert_history(cursor, row):
+    """
+    Insère une ligne d'historique et retourne son id.
+    row = (action, detail, sexe, usager_id, date_passage, statut_au_passage),
+    format conservé tel quel par l'UndoManager. quantite et montant en sont déduits.
+    """
+    cursor.execute(
+        "INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage, quantite, montant) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        tuple(row) + (quantite_from_detail(row[0], row[1]), montant_from_detail(row[0], row[1]))
+    )
+    return cursor.lastrowid
+
+def insert_history_many(cursor, rows):
+    """Variante groupée (executemany) de insert_history, sans retour des ids."""
+    cursor.executemany(
+        "INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage, quantite, montant) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (tuple(row) + (quantite_from_detail(row[0], row[1]), montant_from_detail(row[0], row[1])) for row in rows)
+    )
+
+# ============================================================================
+# GESTION CONNEXION (POOL : UNE CONNEXION PAR THREAD)
+# ============================================================================
+# Réglages appliqués une seule fois à l'ouverture de chaque connexion
+# Base neuve uniquement (une base existante est convertie au démarrage, Core/maintenance.py) :
+# sur une base existante, ce PRAGMA réécrit l'en-tête et change le data_version des autres connexions
+NEW_DATABASE_PRAGMA = "PRAGMA auto_vacuum=INCREMENTAL"
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",       # Lecteurs et écrivain ne se bloquent plus
+    "PRAGMA synchronous=NORMAL",     # Suffisant en WAL, beaucoup moins de fsync
+    "PRAGMA cache_size=-16000",      # ~16 Mo de cache de pages
+    "PRAGMA mmap_size=67108864",     # 64 Mo lus directement en mémoire
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=OFF",
+)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_cursor_factory = None  # Curseur instrumenté (Core/profiling.py) ; None : curseur standard de sqlite3
+_all_connections = weakref.WeakSet()
+_pool_lock = threading.Lock()
+_pool_generation = 0  # Incrémenté par close_all_connections() : les threads rouvrent
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connexion longue durée partagée par tout un thread.
+    get_connection() / close() s'emboîtent : close() ne ferme rien, il annule
+    seulement une transaction oubliée quand le dernier utilisateur rend la main.
     """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.users = 0
+        self.history_span = None    # [première, dernière] date d'historique modifiée par la transaction
+        self.day_rows = []          # Lignes du jour suivi (data_version.follow_day) modifiées par la transaction
+        self.usager_ids = set()     # Usagers ajoutés, modifiés ou supprimés par la transaction
+
+    def history_changed(self, sign, day, action, sexe, statut, quantite, montant):
+        """Appelée par les triggers temporaires de _watch_history, ligne par ligne (sign : +1 ajout, -1 retrait)."""
+        if day is None:
+            return
+        span = self.history_span
+        if span is None:
+            self.history_span = [day, day]
+        elif day < span[0]:
+            span[0] = day
+        elif day > span[1]:
+            span[1] = day
+        if day == data_version.followed_day:
+            self.day_rows.append((day, sign, action, sexe, statut, quantite, montant))
+
+    def usager_changed(self, uid):
+        """Appelée par les triggers temporaires de _watch_usagers pour chaque ligne touchée."""
+        self.usager_ids.add(uid)
+
+    def tracked_changes(self):
+        """Copie de ce que les triggers temporaires ont noté dans la transaction (avant un SAVEPOINT)."""
+        return (list(self.history_span) if self.history_span else None, len(self.day_rows), set(self.usager_ids))
+
+    def restore_tracked_changes(self, snapshot):
+        """Après ROLLBACK TO : oublie ce que les triggers ont noté depuis tracked_changes()."""
+        span, nb_rows, self.usager_ids = snapshot
+        self.history_span = span
+        del self.day_rows[nb_rows:]
+
+    def cursor(self, factory=None):
+        factory = factory or _cursor_factory
+        return super().cursor(factory) if factory else super().cursor()
+
+    def execute(self, sql, parameters=()):
+        if _cursor_factory is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if _cursor_factory is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        super().commit()
+        span, self.history_span = self.history_span, None
+        rows, self.day_rows = self.day_rows, []
+        ids, self.usager_ids = self.usager_ids, set()
+        data_version.committed(tuple(span) if span else (), rows, ids)
+
+    def close(self):
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self.in_transaction:
+            self.rollback()
+
+    def rollback(self):
+        super().rollback()
+        self.history_span = None
+        self.day_rows = []
+        self.usager_ids = set()
+        # Des écritures de config faites dans la transaction viennent d'être annulées
+        config_store.invalidate()
+
+    def really_close(self):
+        super().close()
+
+
+def _open_connection():
     # SÉCURITÉ : On s'assure que le dossier existe avant de se connecter
     if not os.path.exists(DB_DIR):
         os.makedirs(DB_DIR, exist_ok=True)
-        
-    conn = sqlite3.connect(DB_FILE, timeout=10)
-    
-    # --- C'EST ICI LA RÉPARATION ---
-    # On "apprend" à SQLite comment utiliser la fonction REGEXP
+    new_database = not os.path.exists(DB_FILE) or os.path.getsize(DB_FILE) == 0
+
+    conn = sqlite3.connect(
+        DB_FILE, timeout=10, factory=PooledConnection,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False  # Pour que close_all_connections() ferme tout
+    )
+    # On "apprend" à SQLite comment utiliser la fonction REGEXP (une seule fois)
     conn.create_function("REGEXP", 2, regexp)
-    
+    conn.create_function("history_changed", 7, conn.history_changed)
+    conn.create_function("usager_changed", 1, conn.usager_changed)
+    if new_database:
+        conn.execute(NEW_DATABASE_PRAGMA)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _watch_history(conn)
+    _watch_usagers(conn)
     return conn
 
+
+def _watch_history(conn):
+    """
+    Triggers temporaires (propres à la connexion) qui notent les lignes d'historique
+    modifiées par la transaction : data_version sait ainsi quelles périodes ont changé,
+    et transmet celles du jour suivi (compteurs du jour, Core/counters.py).
+    Sans effet tant que la table n'existe pas (base neuve, avant migrate()).
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='historique_passages'").fetchone():
+        return
+    for event, rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+        calls = " ".join(
+            f"SELECT history_changed({-1 if row == 'OLD' else 1}, {row}.date_passage, {row}.action, {row}.sexe, "
+            f"{row}.statut_au_passage, {row}.quantite, {row}.montant);"
+            for row in rows
+        )
+        conn.execute(f"""CREATE TEMP TRIGGER IF NOT EXISTS watch_history_{event.lower()}
+            AFTER {event} ON main.historique_passages BEGIN {calls} END""")
+
+
+def _watch_usagers(conn):
+    """
+    Triggers temporaires qui notent les usagers ajoutés, modifiés ou supprimés par la
+    transaction : la liste en mémoire (Core/roster.py) ne relit qu'eux après le commit.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='usagers'").fetchone():
+        return
+    for event, rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+        calls = " ".join(f"SELECT usager_changed({row}.id);" for row in rows)
+        conn.execute(f"""CREATE TEMP TRIGGER IF NOT EXISTS watch_usagers_{event.lower()}
+            AFTER {event} ON main.usagers BEGIN {calls} END""")
+
+
+def get_connection():
+    """
+    Retourne la connexion du thread courant (ouverte au premier appel).
+    TIMEOUT=10 : Attend 10s avant de planter si la base est occupée.
+    Les appelants continuent à faire conn.close() : la connexion reste ouverte.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _pool_generation:
+        conn = _open_connection()
+        _local.conn = conn
+        _local.generation = _pool_generation
+        with _pool_lock:
+            _all_connections.add(conn)
+    conn.users += 1
+    return conn
+
+
+@contextmanager
+def connection():
+    """
+    Fournit la connexion du thread dans un bloc transactionnel :
+    COMMIT si tout s'est bien passé, ROLLBACK en cas d'exception.
+    Un bloc ouvert pendant une transaction en cours la rejoint simplement.
+    """
+    conn = get_connection()
+    outermost = not conn.in_transaction
+    try:
+        yield conn
+        if outermost and conn.in_transaction:
+            conn.commit()
+    except Exception:
+        if outermost and conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def release_thread_connection():
+    """Ferme la connexion du thread courant (fin d'un worker) si plus personne ne s'en sert."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and conn.users == 0:
+        _local.conn = None
+        with _pool_lock:
+            _all_connections.discard(conn)
+        conn.really_close()
+
+
+def close_all_connections():
+    """
+    Ferme toutes les connexions du pool (fermeture de l'appli, restauration).
+    La dernière fermeture fait le checkpoint WAL et supprime les fichiers -wal/-shm.
+    """
+    global _pool_generation
+    writer.stop()  # Valide les écritures en file avant de fermer
+    with _pool_lock:
+        conns = list(_all_connections)
+        _all_connections.clear()
+        _pool_generation += 1
+    for conn in conns:
+        try:
+            conn.really_close()
+        except sqlite3.Error:
+            pass
+    _local.conn = None
+    config_store.invalidate()
+    data_version.invalidate()
+
+
+def set_cursor_factory(factory):
+    """
+    Classe de curseur utilisée par toutes les connexions du pool (profilage SQL),
+    None pour revenir au curseur standard. Prend effet immédiatement, connexions ouvertes comprises.
+    """
+    global _cursor_factory
+    _cursor_factory = factory
+
+
+def use_database(path):
+    """Pointe le module vers un autre fichier (benchmarks, outils)."""
+    global DB_FILE, DB_DIR
+    close_all_connections()
+    DB_FILE = path
+    DB_DIR = os.path.dirname(os.path.abspath(path))
+
 # ============================================================================
-# INITIALISATION DB
+# INITIALISATION DB (MIGRATIONS VERSIONNÉES)
 # ============================================================================
+# La version du schéma est stockée dans PRAGMA user_version.
+# Base à jour : init_db() ne lit qu'un entier, aucun DDL n'est exécuté.
+# Pour faire évoluer le schéma : ajouter une fonction _migration_N en fin de liste.
+
 def init_db():
-    # SÉCURITÉ : Création du dossier si inexistant
-    if not os.path.exists(DB_DIR):
-        os.makedirs(DB_DIR, exist_ok=True)
+    migrate()
+    # Avant les recalculs de cumuls, qui lisent l'historique récent + l'archive
+    finish_archiving()
+    run_pending_backfills()
 
-    conn = sqlite3.connect(DB_FILE)
-    # On ajoute aussi la fonction ici pour éviter les erreurs lors de la création de vues
-    conn.create_function("REGEXP", 2, regexp)
-    
-    c = conn.cursor()
-    
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate():
+    """Applique les migrations en attente, toutes dans une seule transaction."""
+    with connection() as conn:
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return
+        # IMMEDIATE : une seconde instance de l'appli attend au lieu de migrer en double
+        conn.execute("BEGIN IMMEDIATE")
+        current = schema_version(conn)
+        c = conn.cursor()
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            if version > current:
+                migration(c)
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    # Des valeurs par défaut ont pu être ajoutées directement en SQL
+    config_store.invalidate()
+    # Base neuve : historique_passages et usagers n'existaient pas à l'ouverture de la connexion
+    with connection() as conn:
+        _watch_history(conn)
+        _watch_usagers(conn)
+
+
+def _add_column_if_missing(c, table, column, decl):
+    columns = [r[1] for r in c.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migration_1_base(c):
+    """Schéma d'origine (les bases créées avant les migrations l'ont déjà)."""
     # Création de la table Usagers
     c.execute("""CREATE TABLE IF NOT EXISTS usagers (
         id INTEGER PRIMARY KEY,
@@ -81,7 +409,7 @@ def init_db():
     # Création de la table Config
     c.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
     
-    # --- MISE A JOUR DES VALEURS PAR DÉFAUT ---
+    # --- VALEURS PAR DÉFAUT ---
     defaults = [
         ('TICKET_PRICE', '0.5'),
         ('LAST_RESET', ''),
@@ -95,12 +423,18 @@ def init_db():
     
     for k, v in defaults:
         c.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", (k, v))
+
+
+def _migration_2_quantite(c):
+    """Colonne "quantite" remplie à l'insertion, vue sans fonction Python."""
+    _add_column_if_missing(c, "historique_passages", "quantite", "INTEGER")
+    # Les lignes existantes sont complétées par tranches après la migration
+    register_backfill("quantite")
     
-    # --- CRÉATION DES VUES (Optimisation) ---
     # Vue pour simplifier les calculs de stats et graphiques
-    # Elle utilise REGEXP pour distinguer si "detail" est un nombre (quantité de tickets) ou du texte
+    # La quantité est stockée à l'insertion : simple projection, aucune fonction Python
     c.execute("DROP VIEW IF EXISTS view_conso_nettoyees")
-    c.execute("""
+    c.execute(f"""
     CREATE VIEW view_conso_nettoyees AS
     SELECT 
         h.id,
@@ -109,34 +443,789 @@ def init_db():
         h.action,
         h.statut_au_passage,
         h.usager_id,
-        CASE 
-            WHEN h.detail REGEXP '^-?[0-9]+$' THEN CAST(h.detail AS INTEGER)
-            ELSE 1 
-        END as quantite
+        h.quantite
     FROM historique_passages h
-    WHERE h.action IN ('Consommation ticket(s)', 'PAYE', '1ERE_FOIS', 'Offert')
+    WHERE h.action IN {CONSO_ACTIONS_SQL}
     """)
+
+
+def _migration_3_index(c):
+    """Index construits d'après les requêtes des stats, graphiques, PDF et historique."""
+    # Passages de consommation par date : couvre les agrégats sexe / statut / usager
+    c.execute(f"""CREATE INDEX IF NOT EXISTS idx_hist_conso_date
+        ON historique_passages (date_passage, sexe, statut_au_passage, usager_id, action, quantite)
+        WHERE action IN {CONSO_ACTIONS_SQL}""")
+    # Recharges, ventes anonymes, lignes anonymes du PDF, liste des usagers du bilan
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hist_action_date ON historique_passages (action, date_passage)")
+    # Historique d'un usager (plus récent d'abord) et sous-requêtes par usager du PDF
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hist_usager ON historique_passages (usager_id, id DESC)")
+
+
+# Corps des triggers des cumuls (NEW : ligne ajoutée, OLD : ligne retirée)
+_DAILY_STATS_ADD = f"""
+        INSERT INTO daily_stats (date_passage, sexe, action, statut_au_passage, quantite, nb)
+        SELECT NEW.date_passage, IFNULL(NEW.sexe, ''), NEW.action, IFNULL(NEW.statut_au_passage, ''), IFNULL(NEW.quantite, 0), 1
+        WHERE NEW.action IN {CONSO_ACTIONS_SQL}
+        ON CONFLICT (date_passage, sexe, action, statut_au_passage)
+        DO UPDATE SET quantite = quantite + excluded.quantite, nb = nb + 1;"""
+_DAILY_STATS_REMOVE = f"""
+        UPDATE daily_stats SET quantite = quantite - IFNULL(OLD.quantite, 0), nb = nb - 1
+        WHERE OLD.action IN {CONSO_ACTIONS_SQL}
+        AND date_passage = OLD.date_passage AND sexe = IFNULL(OLD.sexe, '')
+        AND action = OLD.action AND statut_au_passage = IFNULL(OLD.statut_au_passage, '');
+        DELETE FROM daily_stats
+        WHERE OLD.action IN {CONSO_ACTIONS_SQL} AND nb <= 0
+        AND date_passage = OLD.date_passage AND sexe = IFNULL(OLD.sexe, '')
+        AND action = OLD.action AND statut_au_passage = IFNULL(OLD.statut_au_passage, '');"""
+
+_USER_DAY_CONSO_ADD = f"""
+        INSERT INTO user_day_conso (date_passage, usager_id, statut_au_passage, quantite, nb_tickets, nb)
+        SELECT NEW.date_passage, NEW.usager_id, IFNULL(NEW.statut_au_passage, ''), IFNULL(NEW.quantite, 0), NEW.action = 'Consommation ticket(s)', 1
+        WHERE NEW.action IN {CONSO_ACTIONS_SQL} AND NEW.usager_id IS NOT NULL
+        ON CONFLICT (date_passage, usager_id, statut_au_passage)
+        DO UPDATE SET quantite = quantite + excluded.quantite, nb_tickets = nb_tickets + excluded.nb_tickets, nb = nb + 1;"""
+_USER_DAY_CONSO_REMOVE = f"""
+        UPDATE user_day_conso SET quantite = quantite - IFNULL(OLD.quantite, 0), nb_tickets = nb_tickets - (OLD.action = 'Consommation ticket(s)'), nb = nb - 1
+        WHERE OLD.action IN {CONSO_ACTIONS_SQL}
+        AND date_passage = OLD.date_passage AND usager_id = OLD.usager_id
+        AND statut_au_passage = IFNULL(OLD.statut_au_passage, '');
+        DELETE FROM user_day_conso
+        WHERE OLD.action IN {CONSO_ACTIONS_SQL} AND nb <= 0
+        AND date_passage = OLD.date_passage AND usager_id = OLD.usager_id
+        AND statut_au_passage = IFNULL(OLD.statut_au_passage, '');"""
+
+
+def _migration_4_daily_stats(c):
+    """
+    Cumuls journaliers des consommations (compteurs, graphiques, stats) tenus
+    à jour par triggers : le coût d'une lecture dépend du nombre de jours, pas de l'historique.
+    sexe et statut vides valent '' (un NULL ne déclencherait pas le ON CONFLICT).
+    """
+    c.execute("""CREATE TABLE IF NOT EXISTS daily_stats (
+        date_passage DATE NOT NULL,
+        sexe TEXT NOT NULL,
+        action TEXT NOT NULL,
+        statut_au_passage TEXT NOT NULL,
+        quantite INTEGER NOT NULL DEFAULT 0,
+        nb INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date_passage, sexe, action, statut_au_passage)
+    ) WITHOUT ROWID""")
     
-    conn.commit()
-    conn.close()
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_daily_stats_insert AFTER INSERT ON historique_passages BEGIN {_DAILY_STATS_ADD} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_daily_stats_delete AFTER DELETE ON historique_passages BEGIN {_DAILY_STATS_REMOVE} END")
+    # Modification de la fiche (sexe), rattrapage Tutelles du PDF (statut), rattrapage quantite
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_daily_stats_update
+        AFTER UPDATE OF action, date_passage, sexe, statut_au_passage, quantite ON historique_passages
+        BEGIN {_DAILY_STATS_REMOVE} {_DAILY_STATS_ADD} END""")
+    
+    register_backfill("daily_stats", "")
+
+
+def _migration_5_user_day_conso(c):
+    """
+    Consommations par usager, jour et statut (grille du bilan mensuel PDF),
+    tenues à jour par triggers. nb_tickets compte les lignes 'Consommation ticket(s)'
+    (liste des usagers du bilan), nb toutes les lignes (suppression du cumul à 0).
+    Clé commençant par la date : un mois se lit d'un seul tenant.
+    """
+    c.execute("""CREATE TABLE IF NOT EXISTS user_day_conso (
+        date_passage DATE NOT NULL,
+        usager_id INTEGER NOT NULL,
+        statut_au_passage TEXT NOT NULL,
+        quantite INTEGER NOT NULL DEFAULT 0,
+        nb_tickets INTEGER NOT NULL DEFAULT 0,
+        nb INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date_passage, usager_id, statut_au_passage)
+    ) WITHOUT ROWID""")
+    
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_user_day_conso_insert AFTER INSERT ON historique_passages BEGIN {_USER_DAY_CONSO_ADD} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_user_day_conso_delete AFTER DELETE ON historique_passages BEGIN {_USER_DAY_CONSO_REMOVE} END")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_user_day_conso_update
+        AFTER UPDATE OF action, date_passage, usager_id, statut_au_passage, quantite ON historique_passages
+        BEGIN {_USER_DAY_CONSO_REMOVE} {_USER_DAY_CONSO_ADD} END""")
+    
+    register_backfill("user_day_conso", "")
+
+
+def _migration_6_montant(c):
+    """Montant numérique des recharges : les totaux de caisse deviennent un SUM() indexé."""
+    _add_column_if_missing(c, "historique_passages", "montant", "REAL")
+    # (action, date) couvre aussi le montant : SUM() des recharges sans lire la table
+    c.execute("DROP INDEX IF EXISTS idx_hist_action_date")
+    c.execute("CREATE INDEX idx_hist_action_date ON historique_passages (action, date_passage, montant)")
+    register_backfill("montant")
+
+
+def _migration_7_archive(c):
+    """
+    Archivage vers archive.db : les lignes déplacées restent comptées dans les cumuls.
+    Pendant un déplacement, rollup_guard contient une ligne (dans la transaction
+    d'archivage seulement) et les triggers de suppression ne retirent rien.
+    """
+    c.execute("CREATE TABLE IF NOT EXISTS rollup_guard (active INTEGER)")
+    guard = "WHEN NOT EXISTS (SELECT 1 FROM rollup_guard)"
+    c.execute("DROP TRIGGER IF EXISTS trg_daily_stats_delete")
+    c.execute(f"CREATE TRIGGER trg_daily_stats_delete AFTER DELETE ON historique_passages {guard} BEGIN {_DAILY_STATS_REMOVE} END")
+    c.execute("DROP TRIGGER IF EXISTS trg_user_day_conso_delete")
+    c.execute(f"CREATE TRIGGER trg_user_day_conso_delete AFTER DELETE ON historique_passages {guard} BEGIN {_USER_DAY_CONSO_REMOVE} END")
+    # Lignes antérieures à cette date : éventuellement dans archive.db
+    c.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('ARCHIVE_BEFORE', '')")
+
+
+def _migration_8_nom_key(c):
+    """Clé d'identité normalisée (Core/normalize.py) : détection des doublons par index."""
+    _add_column_if_missing(c, "usagers", "nom_key", "TEXT")
+    # Pas UNIQUE : une base existante peut déjà contenir des homonymes
+    c.execute("CREATE INDEX IF NOT EXISTS idx_usagers_nom_key ON usagers (nom_key)")
+    register_backfill("nom_key")
+
+
+def _migration_9_sequences(c):
+    """Séquences d'ids (reserve_ids) : remplace LAST_USED_ID + MAX(id) à chaque création."""
+    c.execute("CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID")
+    c.execute("""
+        INSERT OR IGNORE INTO sequences (name, value)
+        SELECT 'usagers', MAX(IFNULL((SELECT CAST(value AS INTEGER) FROM config WHERE key = 'LAST_USED_ID'), 0),
+                              IFNULL((SELECT MAX(id) FROM usagers), 0))
+    """)
+
+
+MIGRATIONS = [
+    _migration_1_base,
+    _migration_2_quantite,
+    _migration_3_index,
+    _migration_4_daily_stats,
+    _migration_5_user_day_conso,
+    _migration_6_montant,
+    _migration_7_archive,
+    _migration_8_nom_key,
+    _migration_9_sequences,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# ============================================================================
+# RATTRAPAGES DE DONNÉES (PAR TRANCHES, REPRENABLES)
+# ============================================================================
+# Les rattrapages en attente sont notés dans la config PENDING_BACKFILLS
+# ({"nom": dernier id traité}) : un lancement interrompu reprend où il s'était arrêté.
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _pending_backfills():
+    return json.loads(get_config('PENDING_BACKFILLS', '') or '{}')
+
+
+ROLLUP_DAYS_PER_CHUNK = 31
+
+# Cumuls tenus par triggers : colonnes et requête de recalcul depuis l'historique
+# ({source} : historique récent + archive, {where} : filtre de dates).
+# Utilisé par le recalcul et par Core/rollups.py.
+ROLLUPS = {
+    'daily_stats': (
+        "date_passage, sexe, action, statut_au_passage, quantite, nb",
+        f"""SELECT date_passage, IFNULL(sexe, ''), action, IFNULL(statut_au_passage, ''), IFNULL(SUM(quantite), 0), COUNT(*)
+        FROM {{source}}
+        WHERE action IN {CONSO_ACTIONS_SQL} AND {{where}}
+        GROUP BY 1, 2, 3, 4"""
+    ),
+    'user_day_conso': (
+        "date_passage, usager_id, statut_au_passage, quantite, nb_tickets, nb",
+        f"""SELECT date_passage, usager_id, IFNULL(statut_au_passage, ''), IFNULL(SUM(quantite), 0), SUM(action = 'Consommation ticket(s)'), COUNT(*)
+        FROM {{source}}
+        WHERE action IN {CONSO_ACTIONS_SQL} AND usager_id IS NOT NULL AND {{where}}
+        GROUP BY 1, 2, 3"""
+    ),
+}
+
+
+def register_backfill(name, position=0):
+    """
+    Inscrit un rattrapage à partir de "position" (à appeler depuis une migration :
+    même transaction). Un rattrapage déjà inscrit repart de cette position.
+    """
+    pending = _pending_backfills()
+    pending[name] = position
+    set_config('PENDING_BACKFILLS', json.dumps(pending))
+
+
+def _backfill_quantite(conn, last_id, batch_size):
+    max_id = conn.execute("SELECT MAX(id) FROM historique_passages").fetchone()[0] or 0
+    end = min(last_id + batch_size, max_id)
+    conn.execute(f"""
+        UPDATE historique_passages SET quantite = {QUANTITE_SQL}
+        WHERE id > ? AND id <= ? AND quantite IS NULL AND action IN {CONSO_ACTIONS_SQL}
+    """, (last_id, end))
+    return end if end < max_id else None
+
+
+def _backfill_montant(conn, last_id, batch_size):
+    # Lecture en Python : même règle que l'ancien calcul (float() du texte, lignes illisibles ignorées)
+    max_id = conn.execute("SELECT MAX(id) FROM historique_passages").fetchone()[0] or 0
+    end = min(last_id + batch_size, max_id)
+    rows = conn.execute("""
+        SELECT id, detail FROM historique_passages
+        WHERE id > ? AND id <= ? AND action = 'Recharge Compte' AND montant IS NULL
+    """, (last_id, end)).fetchall()
+    updates = [(montant_from_detail('Recharge Compte', detail), hid) for hid, detail in rows]
+    conn.executemany("UPDATE historique_passages SET montant = ? WHERE id = ?", [u for u in updates if u[0] is not None])
+    return end if end < max_id else None
+
+
+def _rebuild_rollup_chunk(table, conn, last_date, batch_size):
+    """Recalcule un cumul par tranches de jours (DELETE puis INSERT agrégé)."""
+    columns, query = ROLLUPS[table]
+    source = history_source(conn)
+    dates = [r[0] for r in conn.execute(f"""
+        SELECT DISTINCT date_passage FROM {source}
+        WHERE action IN {CONSO_ACTIONS_SQL} AND date_passage > ?
+        ORDER BY date_passage LIMIT ?
+    """, (last_date, ROLLUP_DAYS_PER_CHUNK)).fetchall()]
+    # Dernière tranche : jusqu'à la fin (efface aussi d'éventuels cumuls orphelins)
+    end = dates[-1] if len(dates) == ROLLUP_DAYS_PER_CHUNK else None
+    clause = "date_passage > ?" + (" AND date_passage <= ?" if end else "")
+    params = (last_date, end) if end else (last_date,)
+    conn.execute(f"DELETE FROM {table} WHERE {clause}", params)
+    conn.execute(f"INSERT INTO {table} ({columns}) {query.format(source=source, where=clause)}", params)
+    return end
+
+
+def _backfill_nom_key(conn, last_id, batch_size):
+    # Calcul en Python : la suppression des accents n'existe pas en SQL
+    rows = conn.execute("SELECT id, nom, prenom FROM usagers WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+    conn.executemany("UPDATE usagers SET nom_key = ? WHERE id = ?", [(name_key(nom, prenom), uid) for uid, nom, prenom in rows])
+    return rows[-1][0] if len(rows) == batch_size else None
+
+
+# nom -> fonction(conn, position, batch_size) qui traite une tranche et
+# retourne la position suivante, ou None quand le rattrapage est terminé
+BACKFILLS = {
+    'quantite': _backfill_quantite,
+    'montant': _backfill_montant,
+    'nom_key': _backfill_nom_key,
+    'daily_stats': partial(_rebuild_rollup_chunk, 'daily_stats'),
+    'user_day_conso': partial(_rebuild_rollup_chunk, 'user_day_conso'),
+}
+
+
+def run_pending_backfills(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Exécute les rattrapages en attente, dans l'ordre d'inscription,
+    une transaction courte par tranche. La position est enregistrée avec chaque tranche.
+    """
+    pending = _pending_backfills()
+    for name in list(pending):
+        position = pending[name]
+        while position is not None:
+            with connection() as conn:
+                position = BACKFILLS[name](conn, position, batch_size)
+                if position is None:
+                    del pending[name]
+                else:
+                    pending[name] = position
+                set_config('PENDING_BACKFILLS', json.dumps(pending))
+
+
+def rebuild_rollups(tables=tuple(ROLLUPS)):
+    """Recalcule entièrement les cumuls demandés depuis l'historique."""
+    for table in tables:
+        register_backfill(table, "")
+    run_pending_backfills()
+
+# ============================================================================
+# ARCHIVE (HISTORIQUE ANCIEN DANS archive.db, ATTACHÉE À LA DEMANDE)
+# ============================================================================
+# Colonnes copiées telles quelles (une colonne ajoutée à l'historique doit l'être ici aussi)
+HISTORY_COLUMNS = "id, action, detail, sexe, usager_id, date_passage, heure_passage, statut_au_passage, quantite, montant"
+ARCHIVE_BATCH_SIZE = 5000
+
+
+def archive_path():
+    return os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), "archive.db")
+
+
+def archive_backup_path(backup_path):
+    """Sauvegarde d'archive.db qui accompagne la sauvegarde backup_path (backup_<date>.db -> backup_<date>_archive.db)."""
+    return f"{os.path.splitext(backup_path)[0]}_archive.db"
+
+
+def is_archive_backup(path):
+    return path.endswith("_archive.db")
+
+
+def attach_archive(conn, create=False):
+    """
+    Attache archive.db à la connexion (à faire hors transaction) et crée la vue
+    temporaire historique_complet (récent + archive). False si l'archive n'existe pas.
+    """
+    if any(r[1] == 'archive' for r in conn.execute("PRAGMA database_list").fetchall()):
+        return True
+    path = archive_path()
+    if not create and not os.path.exists(path):
+        return False
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    conn.execute("""CREATE TABLE IF NOT EXISTS archive.historique_passages (
+        id INTEGER PRIMARY KEY,
+        action TEXT,
+        detail TEXT,
+        sexe TEXT,
+        usager_id INTEGER,
+        date_passage DATE,
+        heure_passage TEXT,
+        statut_au_passage TEXT,
+        quantite INTEGER,
+        montant REAL
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_arch_action_date ON historique_passages (action, date_passage, montant)")
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_arch_usager ON historique_passages (usager_id, id DESC)")
+    conn.execute(f"""CREATE TEMP VIEW IF NOT EXISTS historique_complet AS
+        SELECT {HISTORY_COLUMNS} FROM main.historique_passages
+        UNION ALL
+        SELECT {HISTORY_COLUMNS} FROM archive.historique_passages""")
+    return True
+
+
+def usager_history_sql(source="historique_passages"):
+    """Passages d'un usager (paramètre : usager_id), du plus récent au plus ancien."""
+    return f"SELECT date_passage, heure_passage, action, detail FROM {source} WHERE usager_id=? ORDER BY id DESC"
+
+
+def history_source(conn, date_start=None):
+    """
+    Table à interroger pour une période commençant à date_start (None : tout) :
+    l'historique récent seul, ou historique_complet si la période remonte
+    avant la date d'archivage.
+    """
+    cutoff = get_config('ARCHIVE_BEFORE')
+    if not cutoff or (date_start is not None and str(date_start) >= cutoff):
+        return "historique_passages"
+    return "historique_complet" if attach_archive(conn) else "historique_passages"
+
+
+def archive_old_history(before, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """
+    Déplace par lots vers archive.db les lignes d'historique antérieures à "before"
+    ('YYYY-MM-DD'). Rien n'est perdu et les cumuls ne changent pas.
+    progress(nb_deplacees) est appelé après chaque lot. Retourne le nombre de lignes déplacées.
+
+    En WAL, une transaction sur deux bases attachées n'est pas atomique entre elles : un
+    arrêt brutal peut valider la copie d'un lot sans son effacement. Seules les lignes
+    relues dans l'archive sont effacées, et finish_archiving() termine au démarrage.
+    """
+    # Annoncé avant le déplacement : pendant l'opération, les lectures font déjà l'union
+    if before > get_config('ARCHIVE_BEFORE'):
+        set_config('ARCHIVE_BEFORE', before)
+    
+    moved = 0
+    while True:
+        # Un lot par tâche de l'écrivain : les clics s'intercalent entre deux lots
+        copied, count = write_sync(_archive_batch, before, batch_size)
+        moved += count
+        if progress:
+            progress(moved)
+        if copied < batch_size:
+            return moved
+
+
+def needs_archive(fn):
+    """Tâche de l'écrivain qui utilise archive.db : attachée avant BEGIN (ATTACH est refusé dans une transaction)."""
+    fn.needs_archive = True
+    return fn
+
+
+@needs_archive
+def _archive_batch(c, before, batch_size):
+    """Copie puis efface un lot. Retourne (lignes copiées, lignes effacées)."""
+    select_ids = "SELECT id FROM main.historique_passages WHERE date_passage < ? ORDER BY id LIMIT ?"
+    c.execute("INSERT INTO rollup_guard VALUES (1)")
+    # OR REPLACE : un lot copié mais pas encore effacé (arrêt brutal) est recopié sans erreur
+    copied = c.execute(f"""INSERT OR REPLACE INTO archive.historique_passages ({HISTORY_COLUMNS})
+        SELECT {HISTORY_COLUMNS} FROM main.historique_passages WHERE id IN ({select_ids})""", (before, batch_size)).rowcount
+    count = c.execute(f"""DELETE FROM main.historique_passages WHERE id IN (
+        SELECT id FROM archive.historique_passages WHERE id IN ({select_ids}))""", (before, batch_size)).rowcount
+    c.execute("DELETE FROM rollup_guard")
+    return copied, count
+
+
+def finish_archiving():
+    """
+    Efface de l'historique récent les lignes déjà copiées dans archive.db (arrêt brutal
+    entre la copie et l'effacement d'un lot) : sans cela, historique_complet les compterait
+    deux fois. Retourne le nombre de lignes effacées.
+    """
+    cutoff = get_config('ARCHIVE_BEFORE')
+    if not cutoff or not os.path.exists(archive_path()):
+        return 0
+    with connection() as conn:
+        # Cas normal : plus aucune ligne récente avant la date d'archivage (index sur la date)
+        if not conn.execute("SELECT 1 FROM historique_passages WHERE date_passage < ? LIMIT 1", (cutoff,)).fetchone():
+            return 0
+    return write_sync(_finish_archiving, cutoff)
+
+
+@needs_archive
+def _finish_archiving(c, cutoff):
+    c.execute("INSERT INTO rollup_guard VALUES (1)")
+    count = c.execute("""DELETE FROM main.historique_passages WHERE date_passage < ?
+        AND id IN (SELECT id FROM archive.historique_passages)""", (cutoff,)).rowcount
+    c.execute("DELETE FROM rollup_guard")
+    return count
+
+# ============================================================================
+# ÉCRIVAIN UNIQUE (FILE D'ÉCRITURE + COMMIT GROUPÉ)
+# ============================================================================
+GROUP_COMMIT_WINDOW = 0.005  # Secondes : les écritures arrivées entre-temps partagent le commit
+GROUP_COMMIT_MAX_JOBS = 200
+
+
+class DbWriter:
+    """
+    Thread unique qui exécute les modifications de la base dans l'ordre d'arrivée.
+    Les tâches soumises à quelques millisecondes d'intervalle partagent une transaction
+    (un seul commit) ; chacune tourne dans son SAVEPOINT : une erreur n'annule que la sienne.
+
+        future = writer.submit(insert_history, row)   # fn(cursor, *args)
+        new_id = future.result()                      # attend le commit
+
+    Passent par ici les saisies, l'import, la config (set_config hors transaction),
+    l'archivage (un lot par tâche) et la maintenance (compactage, ANALYZE).
+    Restent hors de l'écrivain, car exécutés au démarrage avant toute saisie ou depuis
+    la ligne de commande : migrate(), les rattrapages (run_pending_backfills,
+    rebuild_rollups) et la conversion auto_vacuum (VACUUM impossible dans une transaction).
+    """
+    def __init__(self, window=GROUP_COMMIT_WINDOW, max_jobs=GROUP_COMMIT_MAX_JOBS):
+        self.window = window
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                # Une file par thread : un stop() suivi d'un submit() ne mélange pas les deux
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), name="DbWriter", daemon=True)
+                self._thread.start()
+            self._queue.put((future, fn, args))
+        return future
+
+    def flush(self):
+        """Attend que toutes les écritures déjà soumises soient validées."""
+        if self._thread is not None and not self.is_current_thread():
+            self.submit(lambda cursor: None).result()
+
+    def is_current_thread(self):
+        return threading.current_thread() is self._thread
+
+    def stop(self):
+        """Valide les écritures en attente puis arrête le thread (relancé au prochain submit)."""
+        with self._lock:
+            thread, q = self._thread, self._queue
+            self._thread = self._queue = None
+            if thread is None:
+                return
+            q.put(None)
+        if threading.current_thread() is not thread:
+            thread.join()
+
+    def _run(self, q):
+        try:
+            stopping = False
+            while not stopping:
+                job = q.get()
+                if job is None:
+                    break
+                batch = [job]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_jobs:
+                    try:
+                        job = q.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stopping = True
+                        break
+                    batch.append(job)
+                self._commit(batch)
+        finally:
+            release_thread_connection()
+
+    def _commit(self, batch):
+        jobs = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        outcomes = []
+        try:
+            with connection() as conn:
+                c = conn.cursor()
+                if any(getattr(fn, "needs_archive", False) for _, fn, _ in jobs):
+                    attach_archive(conn, create=True)
+                c.execute("BEGIN IMMEDIATE")
+                if len(jobs) == 1:
+                    # Tâche seule : pas de SAVEPOINT (les triggers de cumul y coûtent d'autant
+                    # plus que la base est grosse) ; son échec annule simplement la transaction
+                    future, fn, args = jobs[0]
+                    outcomes.append((future, fn(c, *args), None))
+                else:
+                    for future, fn, args in jobs:
+                        tracked = conn.tracked_changes()
+                        c.execute("SAVEPOINT write_job")
+                        try:
+                            result = fn(c, *args)
+                        except Exception as e:
+                            c.execute("ROLLBACK TO write_job")
+                            c.execute("RELEASE write_job")
+                            # Lignes annulées : ni compteurs du jour, ni invalidation de cache, ni usagers à relire
+                            conn.restore_tracked_changes(tracked)
+                            config_store.invalidate()  # Un set_config de la tâche a pu être annulé
+                            outcomes.append((future, None, e))
+                        else:
+                            c.execute("RELEASE write_job")
+                            outcomes.append((future, result, None))
+        except Exception as e:
+            # BEGIN, tâche seule ou COMMIT en échec : rien du lot n'a été écrit
+            for future, _, _ in jobs:
+                future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+writer = DbWriter()
+
+
+def write(fn, *args):
+    """Soumet fn(cursor, *args) à l'écrivain unique. Retourne un Future (résultat de fn)."""
+    return writer.submit(fn, *args)
+
+
+def in_transaction():
+    """Vrai si la connexion du thread courant a une transaction ouverte."""
+    conn = getattr(_local, "conn", None)
+    return conn is not None and conn.in_transaction
+
+
+def write_sync(fn, *args):
+    """Comme write(), mais attend le commit et retourne le résultat (ou lève l'erreur de fn)."""
+    if in_transaction():
+        # L'écrivain attendrait le verrou que ce thread détient
+        raise RuntimeError("write_sync() appelé pendant une transaction ouverte")
+    return writer.submit(fn, *args).result()
+
+
+# ============================================================================
+# VERSION DES DONNÉES (INVALIDATION DES CACHES DE LECTURE)
+# ============================================================================
+DATA_CHANGES_LOG_SIZE = 512  # Commits dont on garde la plage de dates d'historique
+
+
+class _DataVersion:
+    """
+    Numéro de version global des données, pour les caches de lecture (Core/stats.py).
+    - chaque commit de ce processus l'incrémente (PooledConnection.commit) et garde
+      la plage de dates d'historique qu'il a modifiée (triggers de _watch_history)
+    - un commit d'un autre processus n'est visible que par PRAGMA data_version, lu sur
+      une connexion dédiée : il l'incrémente sans plage connue, donc invalide tout
+    - les lignes d'un jour suivi (follow_day) sont transmises après chaque commit local,
+      de même que les usagers modifiés (follow_usagers)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = 0
+        self._changes = deque(maxlen=DATA_CHANGES_LOG_SIZE)  # (génération, (début, fin) | () | None)
+        self._watch = None
+        self._watch_version = None  # PRAGMA data_version après notre dernier commit
+        self.followed_day = None
+        self._day_listener = None
+        self._usagers_listener = None
+        self.unknown_generation = 0  # Dernière version aux modifications inconnues (autre processus, restauration)
+
+    def _read_watch(self):
+        if self._watch is None:
+            self._watch = sqlite3.connect(DB_FILE, timeout=10, check_same_thread=False)
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _bump(self, span):
+        self.generation += 1
+        self._changes.append((self.generation, span))
+        if span is None:
+            self.unknown_generation = self.generation
+
+    def committed(self, span, day_rows=(), usager_ids=()):
+        """
+        Commit local : span = (première, dernière) date d'historique modifiée, () si aucune ;
+        usager_ids = usagers ajoutés, modifiés ou supprimés.
+        """
+        with self._lock:
+            self._bump(span)
+            # Nos propres commits ne doivent pas passer pour ceux d'un autre processus
+            self._watch_version = self._read_watch()
+            listener, usagers_listener = self._day_listener, self._usagers_listener
+        if day_rows and listener is not None:
+            listener(day_rows)
+        if usager_ids and usagers_listener is not None:
+            usagers_listener(usager_ids)
+
+    def follow_day(self, day, listener):
+        """
+        Après chaque commit de ce processus, listener(rows) reçoit les lignes d'historique
+        du jour day modifiées : (jour, +1 / -1, action, sexe, statut, quantite, montant).
+        Une modification est un retrait (-1) suivi d'un ajout (+1).
+        """
+        with self._lock:
+            self.followed_day, self._day_listener = day, listener
+
+    def follow_usagers(self, listener):
+        """Après chaque commit de ce processus qui touche des usagers, listener(ids) reçoit leurs id."""
+        with self._lock:
+            self._usagers_listener = listener
+
+    def changed_unknown_since(self, since):
+        """Vrai si des modifications non suivies (autre processus, restauration) ont eu lieu depuis since."""
+        self.current()
+        return self.unknown_generation > since
+
+    def current(self):
+        """Version à jour (une lecture de PRAGMA data_version, sans accès aux tables)."""
+        with self._lock:
+            version = self._read_watch()
+            if version != self._watch_version:
+                if self._watch_version is not None:
+                    self._bump(None)  # Écriture d'un autre processus : dates inconnues
+                self._watch_version = version
+            return self.generation
+
+    def history_unchanged(self, since, start, end):
+        """Vrai si aucun commit postérieur à la version since n'a touché l'historique de [start, end[."""
+        with self._lock:
+            if since == self.generation:
+                return True
+            if not self._changes or self._changes[0][0] > since + 1:
+                return False  # Journal trop court pour conclure
+            for generation, span in reversed(self._changes):
+                if generation <= since:
+                    break
+                if span is None or (span and span[0] < end and span[1] >= start):
+                    return False
+            return True
+
+    def invalidate(self):
+        """Restauration, changement de base : plus rien de ce qui a été lu n'est sûr."""
+        with self._lock:
+            self._bump(None)
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+            self._watch_version = None
+
+
+data_version = _DataVersion()
+
+# ============================================================================
+# CONFIG (CACHE MÉMOIRE PARTAGÉ)
+# ============================================================================
+class _ConfigStore:
+    """
+    Copie en mémoire de la table config, partagée par tous les threads.
+    Lecture : dictionnaire, rechargé en entier (une requête) seulement après une écriture
+    que ce processus n'a pas suivie (autre processus, restauration) : data_version écarte
+    nos propres commits, dont les set() sont déjà dans la copie.
+    Écriture : immédiate, ou regroupée en une seule transaction dans un bloc batch() ;
+    par l'écrivain unique, sauf dans une transaction déjà ouverte (qu'elle rejoint).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._dirty = {}
+        self._batch_depth = 0
+        self._generation = 0  # Change à chaque écriture : un rechargement concurrent est ignoré
+        self._loaded_unknown = None  # data_version.unknown_generation au dernier chargement
+
+    def get(self, key, default=""):
+        data_version.current()  # Une lecture de PRAGMA data_version, partagée par les threads
+        unknown = data_version.unknown_generation
+        values = self._values
+        if values is None or self._loaded_unknown != unknown:
+            generation = self._generation
+            with connection() as conn:
+                values = dict(conn.execute("SELECT key, value FROM config").fetchall())
+            with self._lock:
+                values.update(self._dirty)
+                if generation == self._generation:
+                    self._values = values
+                    self._loaded_unknown = unknown
+        return values.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._dirty[key] = str(value)
+            if self._values is not None:
+                self._values = dict(self._values, **{key: str(value)})
+            self._generation += 1
+            deferred = self._batch_depth > 0
+        if not deferred:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Les set() du bloc sont écrits ensemble à la sortie (une transaction)."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                last = self._batch_depth == 0
+            if last:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            items = list(self._dirty.items())
+            self._dirty.clear()
+        if not items:
+            return
+        try:
+            if in_transaction() or writer.is_current_thread():
+                # Rejoint la transaction en cours du thread (tâche de l'écrivain, migration)
+                with connection() as conn:
+                    _write_config(conn.cursor(), items)
+            else:
+                write_sync(_write_config, items)
+        except Exception:
+            self.invalidate()
+            raise
+
+    def invalidate(self):
+        """Oublie la copie mémoire (rollback, restauration, changement de base)."""
+        with self._lock:
+            self._values = None
+            self._generation += 1
+
+
+def _write_config(c, items):
+    c.executemany("REPLACE INTO config (key, value) VALUES (?, ?)", items)
+
+
+config_store = _ConfigStore()
 
 # ============================================================================
 # HELPERS
 # ============================================================================
 def get_config(key, default=""):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT value FROM config WHERE key=?", (key,))
-    res = c.fetchone()
-    conn.close()
-    return res[0] if res else default
+    return config_store.get(key, default)
 
 def set_config(key, value):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (key, str(value)))
-    conn.commit()
-    conn.close()
+    config_store.set(key, value)
+
+def config_batch():
+    """with db.config_batch(): ... -> plusieurs set_config en une seule transaction."""
+    return config_store.batch()
 
 def get_ticket_price():
     return float(get_config('TICKET_PRICE', '0.5'))
@@ -144,11 +1233,21 @@ def get_ticket_price():
 def set_ticket_price(price):
     set_config('TICKET_PRICE', str(price))
 
-def get_next_usager_id(cursor):
-    cursor.execute("SELECT value FROM config WHERE key='LAST_USED_ID'")
-    res = cursor.fetchone()
-    config_last = int(res[0]) if res else 0
-    cursor.execute("SELECT MAX(id) FROM usagers")
-    res_db = cursor.fetchone()
-    db_max = res_db[0] if res_db[0] is not None else 0
-    return max(config_last, db_max) + 1
\ No newline at end of file
+FIND_USAGER_SQL = "SELECT id FROM usagers WHERE nom_key = ? ORDER BY id LIMIT 1"
+
+def find_usager_id(cursor, nom, prenom):
+    """Id de l'usager de même identité (accents, casse et espaces ignorés), sinon None."""
+    row = cursor.execute(FIND_USAGER_SQL, (name_key(nom, prenom),)).fetchone()
+    return row[0] if row else None
+
+def reserve_ids(cursor, count=1, name="usagers"):
+    """
+    Réserve count ids consécutifs de la séquence name (= table) et retourne le premier.
+    Un seul UPDATE : atomique dans la transaction d'écriture, en temps constant.
+    La séquence ne redescend jamais sous MAX(id) (lignes insérées par un autre chemin).
+    """
+    row = cursor.execute(f"""
+        UPDATE sequences SET value = MAX(value, (SELECT IFNULL(MAX(id), 0) FROM {name})) + ?
+        WHERE name = ? RETURNING value
+    """, (count, name)).fetchone()
+    return row[0] - count + 1
\ No newline at end of file
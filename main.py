@@ -8,18 +8,18 @@ import time
 import subprocess
 import ctypes
 import tempfile
-import unicodedata
-from difflib import SequenceMatcher
-from datetime import datetime, date
+from concurrent.futures import Future
+from datetime import datetime, date, timedelta
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-    QLabel, QFrame, QLineEdit, QTableWidget, QTableWidgetItem, 
+    QLabel, QFrame, QLineEdit, QTableView, 
     QHeaderView, QAbstractItemView, QCheckBox, QMessageBox, QMenu, 
-    QSizePolicy, QFileDialog, QDateEdit, QPushButton, QToolTip
+    QSizePolicy, QFileDialog, QDateEdit, QPushButton, QToolTip, QCompleter,
+    QProgressDialog
 )
 from PyQt6.QtCore import (
-    Qt, QTimer, QByteArray, QSize, QDate
+    Qt, QTimer, QByteArray, QSize, QDate, QStringListModel
 )
 from PyQt6.QtGui import (
     QColor, QIcon, QPixmap, QAction, QPalette
@@ -36,9 +36,10 @@ import database as db
 # Widgets et Dialogues (Dossier UI)
 from UI.widgets import (
     ModernButton, RoundedLabelButton, FilterGroup, 
-    IconManager, RingChart, ToggleSwitch, NumericTableWidgetItem,
-    StatusSpinner
+    IconManager, RingChart, ToggleSwitch,
+    StatusSpinner, Sparkline
 )
+from UI.roster_model import RosterModel, RosterProxy, fixed_column_widths
 from UI.dialogs import (
     NouveauUsagerDialog, ConsommerTicketDialog, RechargerCompteDialog,
     ModifierUsagerDialog, HistoriqueDialog, ConfirmationDialog,
@@ -49,10 +50,17 @@ from UI.dialogs import (
 
 # Workers et Logique Métier (Dossier Core)
 from Core.workers import (
-    UpdateWorker, ChangelogWorker, DownloadWorker, PdfWorker, BackupWorker
+    UpdateWorker, ChangelogWorker, DownloadWorker, PdfWorker, BackupWorker, MaintenanceWorker,
+    CountersCheckWorker, VacuumConversionWorker
 )
 from Core.stats import StatsService
+from Core.counters import today_counters, RECONCILE_INTERVAL_MS
+from Core.trends import load_trends, WEEKDAY_NAMES, SPARKLINE_DAYS
+from Core.normalize import strip_accents
+from Core.maintenance import is_due as maintenance_is_due, needs_auto_vacuum_conversion
 from Core.pdf_generator import generate_pdf_logic, generate_custom_pdf_logic
+from Core.roster import roster_store, COL_ID, COL_NOM
+from Core.profiling import sql_profiler, enable_from_environment
 
 try:
     from PIL import Image
@@ -92,45 +100,35 @@ class UndoManager:
         if not self.redo_stack: return
         action = self.redo_stack.pop()
         self.undo_stack.append(action)
-        self._apply_state(action['new'])
-        if action.get('hist_data'):
-            new_ids = []
-            conn = db.get_connection()
-            try:
-                c = conn.cursor()
-                for row_data in action['hist_data']:
-                    c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", row_data)
-                    new_ids.append(c.lastrowid)
-                conn.commit()
-                action['hist_ids'] = new_ids
-            except Exception as e: 
-                print(f"Erreur Redo History: {e}")
-            finally: 
-                conn.close()
-        self.app.load_data()
-        self.app.refresh_counters()
-        self.app.update_stats()
-        self.app.generate_pdf(silent_mode=True)
+        new_ids = self._apply_state(action['new'], history_rows=action.get('hist_data'))
+        if action.get('hist_data') and new_ids is not None:
+            action['hist_ids'] = new_ids
+        self.app.update_undo_redo_buttons()
 
-    def _apply_state(self, state_data, delete_history_ids=None):
-        conn = db.get_connection()
-        try:
-            c = conn.cursor()
+    @staticmethod
+    def _resolve_ids(history_ids):
+        # Les passages anonymes sont écrits en file : l'id est un Future tant que le commit n'a pas eu lieu
+        return [i.result() if isinstance(i, Future) else i for i in history_ids or []]
+
+    def _apply_state(self, state_data, delete_history_ids=None, history_rows=None):
+        def apply(c):
             for uid, data in state_data.items():
                 c.execute("UPDATE usagers SET solde=?, ticket=?, statut=? WHERE id=?", (data['solde'], data['ticket'], data['statut'], uid))
-            if delete_history_ids:
-                for hist_id in delete_history_ids:
-                    c.execute("DELETE FROM historique_passages WHERE id=?", (hist_id,))
-            conn.commit()
+            for hist_id in delete_ids:
+                c.execute("DELETE FROM historique_passages WHERE id=?", (hist_id,))
+            return [db.insert_history(c, row_data) for row_data in history_rows or []]
+
+        new_ids = None
+        try:
+            delete_ids = self._resolve_ids(delete_history_ids)
+            new_ids = db.write_sync(apply)
         except Exception as e: 
             print(f"Erreur Undo/Redo Apply: {e}")
-        finally: 
-            conn.close()
         
         self.app.load_data()
-        self.app.refresh_counters()
         self.app.update_stats()
         self.app.generate_pdf(silent_mode=True)
+        return new_ids
 
 
 # ============================================================================
@@ -161,6 +159,21 @@ class MainWindow(QMainWindow):
         self.search_timer.setInterval(300) 
         self.search_timer.timeout.connect(self.load_data)
         
+        # Clics anonymes en rafale : un seul rafraîchissement une fois les écritures validées
+        self.pending_passages = []
+        self.passage_refresh_timer = QTimer()
+        self.passage_refresh_timer.setSingleShot(True)
+        self.passage_refresh_timer.setInterval(150)
+        self.passage_refresh_timer.timeout.connect(self.refresh_after_passages)
+        
+        # Compteurs du jour en mémoire : réamorcés à minuit, vérifiés en SQL régulièrement
+        self.new_day_timer = QTimer()
+        self.new_day_timer.setSingleShot(True)
+        self.new_day_timer.timeout.connect(self.on_new_day)
+        self.counters_check_timer = QTimer()
+        self.counters_check_timer.setInterval(RECONCILE_INTERVAL_MS)
+        self.counters_check_timer.timeout.connect(self.start_counters_check)
+        
         self.blink_timer = QTimer()
         self.blink_timer.setInterval(800)
         self.blink_timer.timeout.connect(self.toggle_update_blink)
@@ -203,8 +216,11 @@ class MainWindow(QMainWindow):
 
         self.check_monthly_reset()
         
+        today_counters.seed()
+        self.schedule_new_day()
+        self.counters_check_timer.start()
+        
         self.load_data()
-        self.refresh_counters()
         self.update_stats()
         
         QTimer.singleShot(1000, self.check_changelog)
@@ -236,18 +252,54 @@ class MainWindow(QMainWindow):
         else: print(f"Echec du backup : {message}")
 
     def check_auto_maintenance(self):
-        if db.get_config('AUTO_CLEAN_ENABLED') == '1':
-            try:
-                conn = db.get_connection()
-                c = conn.cursor()
-                c.execute("DELETE FROM historique_passages WHERE date_passage < date('now', '-2 years')")
-                if c.rowcount > 0:
-                    print(f"Maintenance Auto: {c.rowcount} lignes supprimées.")
-                    conn.commit()
-                    conn.execute("VACUUM")
-                conn.close()
-            except Exception as e:
-                print(f"Erreur Maintenance Auto: {e}")
+        # Une fois par jour, en tâche de fond : l'ouverture de la fenêtre n'attend plus
+        if maintenance_is_due():
+            self.start_maintenance(archive=db.get_config('AUTO_CLEAN_ENABLED') == '1')
+
+    def start_maintenance(self, archive=False):
+        """Lance MaintenanceWorker. Retourne None si une maintenance tourne déjà."""
+        worker = getattr(self, 'maintenance_worker', None)
+        if worker is not None and worker.isRunning():
+            return None
+        if hasattr(self, 'backup_spinner'):
+            self.backup_spinner.start()
+        self.maintenance_worker = MaintenanceWorker(archive)
+        self.maintenance_worker.finished.connect(self.on_maintenance_finished)
+        self.maintenance_worker.start()
+        return self.maintenance_worker
+
+    def on_maintenance_finished(self, success, message, archived_count):
+        if hasattr(self, 'backup_spinner'):
+            self.backup_spinner.stop()
+        if success:
+            if archived_count > 0:
+                print(f"Maintenance Auto: {archived_count} lignes archivées.")
+        else:
+            print(f"Erreur Maintenance Auto: {message}")
+
+    # --- COMPTEURS DU JOUR ---
+    def schedule_new_day(self):
+        midnight = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        self.new_day_timer.start(int((midnight - datetime.now()).total_seconds() * 1000) + 1000)
+
+    def on_new_day(self):
+        today_counters.seed()
+        self.update_stats()
+        self.schedule_new_day()
+
+    def start_counters_check(self):
+        worker = getattr(self, 'counters_worker', None)
+        if worker is not None and worker.isRunning():
+            return
+        self.counters_worker = CountersCheckWorker()
+        self.counters_worker.finished.connect(self.on_counters_checked)
+        self.counters_worker.start()
+
+    def on_counters_checked(self, drift):
+        if drift:
+            # Écriture faite hors de ce processus (ou compteur faussé) : valeurs corrigées
+            print(f"Compteurs du jour recalés : {drift}")
+            self.refresh_counters()
 
     # --- LOGIQUE PDF ---
     def generate_pdf(self, secondary_path=None, silent_mode=False):
@@ -358,6 +410,17 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event): 
         self.save_settings()
+        self.passage_refresh_timer.stop()
+        self.new_day_timer.stop()
+        self.counters_check_timer.stop()
+        worker = getattr(self, 'maintenance_worker', None)
+        if worker is not None and worker.isRunning():
+            worker.stop()
+            worker.wait()
+        worker = getattr(self, 'counters_worker', None)
+        if worker is not None:
+            worker.wait()
+        db.close_all_connections()
         event.accept()
 
     def save_settings(self):
@@ -372,66 +435,53 @@ class MainWindow(QMainWindow):
             sorting_state = {'section': header.sortIndicatorSection(),'order': header.sortIndicatorOrder().value}
             sorting_json = json.dumps(sorting_state)
             
-            conn = db.get_connection()
-            c = conn.cursor()
-            for k, v in [('WINDOW_GEOMETRY', geo), ('FILTERS_STATE', filters_json), ('TOGGLES_STATE', toggles_json), ('ACCORDIONS_STATE', accordions_json), ('SORTING_STATE', sorting_json)]:
-                c.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (k, v))
-            conn.commit()
-            conn.close()
+            with db.config_batch():
+                for k, v in [('WINDOW_GEOMETRY', geo), ('FILTERS_STATE', filters_json), ('TOGGLES_STATE', toggles_json), ('ACCORDIONS_STATE', accordions_json), ('SORTING_STATE', sorting_json)]:
+                    db.set_config(k, v)
         except: pass
 
     def load_settings(self):
         try:
-            conn = db.get_connection()
-            c = conn.cursor()
-            c.execute("SELECT value FROM config WHERE key='WINDOW_GEOMETRY'")
-            res_geo = c.fetchone()
-            if res_geo and res_geo[0]: 
-                self.restoreGeometry(QByteArray.fromBase64(res_geo[0].encode()))
-            c.execute("SELECT value FROM config WHERE key='FILTERS_STATE'")
-            res_fil = c.fetchone()
-            if res_fil and res_fil[0]:
-                saved_filters = json.loads(res_fil[0])
+            res_geo = db.get_config('WINDOW_GEOMETRY')
+            if res_geo: 
+                self.restoreGeometry(QByteArray.fromBase64(res_geo.encode()))
+            res_fil = db.get_config('FILTERS_STATE')
+            if res_fil:
+                saved_filters = json.loads(res_fil)
                 self.filters = saved_filters
                 for k, v in saved_filters.items():
                     if k in self.filter_checkboxes: 
                         self.filter_checkboxes[k].blockSignals(True)
                         self.filter_checkboxes[k].setChecked(v)
                         self.filter_checkboxes[k].blockSignals(False)
-            c.execute("SELECT value FROM config WHERE key='TOGGLES_STATE'")
-            res_tog = c.fetchone()
-            if res_tog and res_tog[0]:
-                saved_toggles = json.loads(res_tog[0])
+            res_tog = db.get_config('TOGGLES_STATE')
+            if res_tog:
+                saved_toggles = json.loads(res_tog)
                 self.toggle_sexe.setChecked(saved_toggles.get('sexe', False))
                 self.toggle_statut.setChecked(saved_toggles.get('statut', False))
                 self.toggle_solde.setChecked(saved_toggles.get('solde', False))
-            c.execute("SELECT value FROM config WHERE key='ACCORDIONS_STATE'")
-            res_acc = c.fetchone()
-            if res_acc and res_acc[0]:
-                saved_accordions = json.loads(res_acc[0])
+            res_acc = db.get_config('ACCORDIONS_STATE')
+            if res_acc:
+                saved_accordions = json.loads(res_acc)
                 for key, is_open in saved_accordions.items():
                     if key in self.accordions: 
                         self.accordions[key].set_expanded(is_open)
-            c.execute("SELECT value FROM config WHERE key='SORTING_STATE'")
-            res_sort = c.fetchone()
-            if res_sort and res_sort[0]:
-                sort_data = json.loads(res_sort[0])
+            res_sort = db.get_config('SORTING_STATE')
+            if res_sort:
+                sort_data = json.loads(res_sort)
                 self.table.horizontalHeader().setSortIndicator(sort_data['section'], Qt.SortOrder(sort_data['order']))
-            conn.close()
         except: pass
 
     def check_monthly_reset(self):
-        conn = db.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT value FROM config WHERE key='LAST_RESET'")
-        res = c.fetchone()
         current_month = datetime.now().strftime("%Y-%m")
-        if not res or res[0] != current_month:
+        if db.get_config('LAST_RESET') == current_month:
+            return
+        def apply(c):
             c.execute("UPDATE usagers SET solde=0, ticket=0 WHERE statut='Tutelles'")
             c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage) SELECT 'RAZ Mensuel', 'Automatique', sexe, id, ? FROM usagers WHERE statut='Tutelles'", (datetime.now().strftime("%Y-%m-%d"),))
-            c.execute("REPLACE INTO config (key, value) VALUES (?, ?)", ('LAST_RESET', current_month))
-            conn.commit()
-        conn.close()
+            db.set_config('LAST_RESET', current_month)  # Même transaction (connexion de l'écrivain)
+        
+        db.write_sync(apply)
 
     def open_export_dialog(self): 
         ExportSupDialog(self, PDF_FILENAME).exec()
@@ -552,39 +602,32 @@ del "%~f0"
 
     def get_selected_id(self):
         r = self.table.selectionModel().selectedRows()
-        return int(self.table.item(r[0].row(), 0).text()) if r else None
+        return self.roster_proxy.usager_at(r[0].row())[COL_ID] if r else None
     
     def select_row(self, uid):
-        for r in range(self.table.rowCount()):
-            if int(self.table.item(r, 0).text()) == uid: 
-                self.table.selectRow(r)
-                self.table.scrollToItem(self.table.item(r, 0))
-                break
+        row = self.roster_proxy.proxy_row_of(uid)
+        if row is not None:
+            self.table.selectRow(row)
+            self.table.scrollTo(self.roster_proxy.index(row, 0))
             
     def action_consommer(self):
         uid = self.get_selected_id()
         if uid: 
-            conn=db.get_connection()
-            c=conn.cursor()
-            c.execute("SELECT nom, prenom, ticket, statut FROM usagers WHERE id=?", (uid,))
-            d=c.fetchone()
-            conn.close()
+            with db.connection() as conn:
+                d = conn.execute("SELECT nom, prenom, ticket, statut FROM usagers WHERE id=?", (uid,)).fetchone()
             ConsommerTicketDialog(self, uid, f"{d[1]} {d[0]}", d[2], d[3]).exec()
             
     def action_recharger(self):
         uid = self.get_selected_id()
         if uid: 
-            conn=db.get_connection()
-            c=conn.cursor()
-            c.execute("SELECT nom, prenom, solde, statut FROM usagers WHERE id=?", (uid,))
-            d=c.fetchone()
-            conn.close()
+            with db.connection() as conn:
+                d = conn.execute("SELECT nom, prenom, solde, statut FROM usagers WHERE id=?", (uid,)).fetchone()
             RechargerCompteDialog(self, uid, f"{d[1]} {d[0]}", d[2], d[3]).exec()
             
     def action_historique(self):
         uid = self.get_selected_id()
         if uid: 
-            HistoriqueDialog(self, uid, self.table.item(self.table.currentRow(), 1).text()).exec()
+            HistoriqueDialog(self, uid, self.roster_proxy.usager_at(self.table.currentIndex().row())[COL_NOM]).exec()
         
     def action_modifier(self):
         uid = self.get_selected_id()
@@ -596,11 +639,7 @@ del "%~f0"
         if not uid: return
         dlg = ConfirmationDialog(self, "Confirmer la suppression", "Voulez-vous vraiment supprimer cet usager ?\nCette action est irréversible.")
         if dlg.exec(): 
-            conn=db.get_connection()
-            c=conn.cursor()
-            c.execute("DELETE FROM usagers WHERE id=?", (uid,))
-            conn.commit()
-            conn.close()
+            db.write_sync(lambda c: c.execute("DELETE FROM usagers WHERE id=?", (uid,)))
             self.load_data()
             self.update_stats()
             self.generate_pdf(silent_mode=True)
@@ -629,22 +668,24 @@ del "%~f0"
         if sender and isinstance(sender, ModernButton): 
             self.flash_button(sender)
         
-        conn = db.get_connection()
-        try:
-            c = conn.cursor()
-            status_au_passage = "Payés" if t == "PAYE" else "1ère fois"
-            today = datetime.now().strftime("%Y-%m-%d")
-            data_tuple = (t, 'Anonyme', s, None, today, status_au_passage)
-            c.execute("INSERT INTO historique_passages (action, detail, sexe, usager_id, date_passage, statut_au_passage) VALUES (?, ?, ?, ?, ?, ?)", data_tuple)
-            created_id = c.lastrowid
-            conn.commit()
+        status_au_passage = "Payés" if t == "PAYE" else "1ère fois"
+        today = datetime.now().strftime("%Y-%m-%d")
+        data_tuple = (t, 'Anonyme', s, None, today, status_au_passage)
+        # File d'écriture : le clic n'attend pas le commit (l'undo résout l'id au besoin)
+        created_id = db.write(db.insert_history, data_tuple)
+        self.pending_passages.append(created_id)
             
-            if hasattr(self, 'undo_manager'): 
-                self.undo_manager.record_action('ANONYME', {}, {}, [created_id], [data_tuple])
-        finally:
-            conn.close()
+        if hasattr(self, 'undo_manager'): 
+            self.undo_manager.record_action('ANONYME', {}, {}, [created_id], [data_tuple])
             
-        self.refresh_counters()
+        self.passage_refresh_timer.start()
+
+    def refresh_after_passages(self):
+        pending, self.pending_passages = self.pending_passages, []
+        for future in pending:
+            error = future.exception()  # Attend le commit groupé
+            if error is not None:
+                print(f"Erreur Enregistrement Passage: {error}")
         self.update_stats()
         self.generate_pdf(silent_mode=True)
 
@@ -850,6 +891,14 @@ del "%~f0"
         """)
         self.search.textChanged.connect(self.search_timer.start)
         
+        # Autocomplétion : noms proposés par l'index de recherche (Core/search.py)
+        self.completer_model = QStringListModel(self)
+        self.completer = QCompleter(self.completer_model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.setWidget(self.search)
+        self.completer.activated.connect(self.search.setText)
+        self.search.textEdited.connect(self.update_completions)
+        
         bc = QPushButton("✖")
         bc.setCursor(Qt.CursorShape.PointingHandCursor)
         bc.setStyleSheet("border:none; color:#e74c3c; font-weight:bold;")
@@ -860,8 +909,13 @@ del "%~f0"
         h.addWidget(f)
         l.addLayout(h)
         
-        self.table = QTableWidget(0, 9)
-        self.table.setHorizontalHeaderLabels(["ID","NOM","PRENOM","SEXE","STATUT","SOLDE","TICKET", "COMMENTAIRE", "DERNIER PASSAGE"])
+        # Modèle / vue : les cellules sont lues à la demande (UI/roster_model.py)
+        self.roster_model = RosterModel(self)
+        self.roster_proxy = RosterProxy(self)
+        self.roster_proxy.setSourceModel(self.roster_model)
+        self.table = QTableView()
+        self.table.setObjectName("roster")
+        self.table.setModel(self.roster_proxy)
         self.table.verticalHeader().setVisible(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
@@ -870,12 +924,9 @@ del "%~f0"
         
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(5, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(6, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(8, QHeaderView.ResizeMode.ResizeToContents)
+        for column, width in fixed_column_widths(header.font()).items():
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.Fixed)
+            header.resizeSection(column, width)
         
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
@@ -1005,16 +1056,37 @@ del "%~f0"
         
         self.chart_sexe = RingChart(self, size=130)
         self.toggle_sexe = create_chart_block("RÉPARTITION SEXE", self.chart_sexe)
-        self.toggle_sexe.toggled.connect(self.update_charts)
+        self.toggle_sexe.toggled.connect(lambda _: self.update_charts())
         
         self.chart_statut = RingChart(self, size=130)
         self.toggle_statut = create_chart_block("RÉPARTITION STATUT", self.chart_statut)
-        self.toggle_statut.toggled.connect(self.update_charts)
+        self.toggle_statut.toggled.connect(lambda _: self.update_charts())
         
         self.chart_solde = RingChart(self, size=130)
         self.toggle_solde = create_chart_block("RÉPARTITION SOLDE", self.chart_solde)
-        self.toggle_solde.toggled.connect(self.update_charts)
+        self.toggle_solde.toggled.connect(lambda _: self.update_charts())
+        
+        self.add_sep(l)
+        
+        lbl_trend = QLabel("TENDANCES (JOURS COMPLETS)", styleSheet="color:#bdc3c7; font-weight:bold; font-size:9pt;")
+        lbl_trend.setAlignment(Qt.AlignmentFlag.AlignRight)
+        l.addWidget(lbl_trend)
+        l.addSpacing(5)
         
+        self.trend_labels = {}
+        for row in ((("Moy. 7 j:", "mean_7"), ("Sem. préc.:", "wow")), (("Moy. 28 j:", "mean_28"), ("An. préc.:", "yoy"))):
+            h_trend = QHBoxLayout(); h_trend.setSpacing(5)
+            for title, key in row:
+                h_item = QHBoxLayout(); h_item.setContentsMargins(0,0,0,0); h_item.setSpacing(2)
+                h_item.addWidget(QLabel(title, styleSheet=style_label))
+                self.trend_labels[key] = QLabel("-", styleSheet=style_value)
+                h_item.addWidget(self.trend_labels[key])
+                h_trend.addLayout(h_item, 1)
+                h_trend.addStretch(1)
+            l.addLayout(h_trend)
+        
+        self.trend_spark = Sparkline(self, width=250, height=40, color=AppColors.BTN_H_OFFERT)
+        l.addWidget(self.trend_spark, alignment=Qt.AlignmentFlag.AlignHCenter)
         self.add_sep(l)
         
         lbl_per = QLabel("BILAN PÉRIODIQUE", styleSheet="color:#bdc3c7; font-weight:bold; font-size:9pt;")
@@ -1054,183 +1126,87 @@ del "%~f0"
         l.addWidget(btn_calc)
         l.addSpacing(10)
         self.update_charts()
+        self.refresh_trends()
 
-    def update_charts(self):
-        today = datetime.now().strftime("%Y-%m-%d")
-        current_month = datetime.now().strftime("%Y-%m")
+    def update_charts(self, dashboard=None):
+        # Jour et mois viennent de la même requête : les bascules ne relisent rien d'autre
+        dashboard = dashboard or StatsService.dashboard()
         
-        def get_query_params(is_month_mode): 
-            return ("strftime('%Y-%m', date_passage) = ?", [current_month]) if is_month_mode else ("date_passage = ?", [today])
+        def period(is_month_mode): 
+            return dashboard.month if is_month_mode else dashboard.day
         
-        conn = db.get_connection()
-        try:
-            c = conn.cursor()
-            
-            clause, params = get_query_params(self.toggle_sexe.isChecked())
-            c.execute(f"SELECT sexe, SUM(quantite) FROM view_conso_nettoyees WHERE {clause} GROUP BY sexe", params)
-            data_sexe = {k: int(v) if v else 0 for k, v in c.fetchall()}
-            self.chart_sexe.set_data(data_sexe, {"H": AppColors.ROW_TUTELLE, "F": AppColors.ROW_AVANCE})
-            
-            clause, params = get_query_params(self.toggle_statut.isChecked())
-            c.execute(f"SELECT statut_au_passage, SUM(quantite) FROM view_conso_nettoyees WHERE {clause} GROUP BY statut_au_passage", params)
-            raw_data = {k: int(v) if v else 0 for k, v in c.fetchall()}
-            
-            data_statut = {"Payés": 0, "Avances": 0, "Tutelles": 0, "1ère fois": 0}
-            for key, val in raw_data.items():
-                if key in ["Payés", "Pas de crédit", "Anonyme"]: data_statut["Payés"] += val
-                elif key == "Avances": data_statut["Avances"] += val
-                elif key == "Tutelles": data_statut["Tutelles"] += val
-                elif key in ["Offert", "1ère fois"]: data_statut["1ère fois"] += val
-                
-            self.chart_statut.set_data(data_statut, {"Payés": AppColors.ROW_PAYE, "Avances": AppColors.ROW_AVANCE, "Tutelles": AppColors.ROW_TUTELLE, "1ère fois": AppColors.ROW_OFFERT})
-            
-            clause, params = get_query_params(self.toggle_solde.isChecked())
-            c.execute(f"""SELECT CASE WHEN u.statut = 'Tutelles' THEN 'Négatif' WHEN u.solde >= 0 THEN 'Positif' ELSE 'Négatif' END, COUNT(DISTINCT u.id) FROM usagers u JOIN view_conso_nettoyees v ON u.id = v.usager_id WHERE {clause} GROUP BY CASE WHEN u.statut = 'Tutelles' THEN 'Négatif' WHEN u.solde >= 0 THEN 'Positif' ELSE 'Négatif' END""", params)
-            data_solde = dict(c.fetchall())
-            c.execute(f"SELECT COUNT(*) FROM view_conso_nettoyees WHERE {clause} AND action IN ('PAYE', '1ERE_FOIS')", params)
-            res_anon = c.fetchone()
-            nb_anonymes = int(res_anon[0]) if res_anon and res_anon[0] else 0
-            data_solde['Positif'] = data_solde.get('Positif', 0) + nb_anonymes
-            self.chart_solde.set_data(data_solde, {"Positif": AppColors.ROW_PAYE, "Négatif": AppColors.ROW_AVANCE})
-        finally:
-            conn.close()
+        self.chart_sexe.set_data(period(self.toggle_sexe.isChecked()).chart_sexe(), {"H": AppColors.ROW_TUTELLE, "F": AppColors.ROW_AVANCE})
+        self.chart_statut.set_data(period(self.toggle_statut.isChecked()).chart_statut(), {"Payés": AppColors.ROW_PAYE, "Avances": AppColors.ROW_AVANCE, "Tutelles": AppColors.ROW_TUTELLE, "1ère fois": AppColors.ROW_OFFERT})
+        self.chart_solde.set_data(period(self.toggle_solde.isChecked()).chart_solde(), {"Positif": AppColors.ROW_PAYE, "Négatif": AppColors.ROW_AVANCE})
 
     def update_stats(self): 
+        # Compteurs et caisse : en mémoire ; graphiques jour et mois : une seule requête
+        self.refresh_counters()
         self.update_charts()
+        self.refresh_trends()
+    
+    def refresh_trends(self):
+        # Jours complets uniquement : en cache tant que l'historique passé ne change pas
+        trends = load_trends()
+        for key in ("mean_7", "mean_28"):
+            value = trends.latest(key)
+            self.trend_labels[key].setText("-" if value is None else f"{value:.1f}")
+        for key in ("wow", "yoy"):
+            value = trends.latest(key)
+            self.trend_labels[key].setText("-" if value is None else f"{value:+.0f} %")
+        self.trend_spark.set_data(trends.mean_7[-SPARKLINE_DAYS:])
+        profile = " · ".join(f"{name} {value:.0f}" for name, value in zip(WEEKDAY_NAMES, trends.weekday_profile))
+        self.trend_spark.setToolTip(f"Moyenne 7 jours ({SPARKLINE_DAYS} derniers jours)\nPassages moyens : {profile}")
     
     def refresh_counters(self):
-        today = datetime.now().strftime("%Y-%m-%d")
-        stats = StatsService.get_stats_range(today, today)
-        
-        self.lbl_h.setText(f"H: {stats['total_h']}")
-        self.lbl_f.setText(f"F: {stats['total_f']}")
-        self.stat_carte.setText(str(stats['tickets_carte'] + stats['tickets_tutelle']))
-        self.stat_avance.setText(str(stats['tickets_avance']))
-        self.stat_first.setText(str(stats['tickets_1ere_fois']))
-        self.stat_h.setText(str(stats['total_h']))
-        self.stat_f.setText(str(stats['total_f']))
-        self.stat_total_passages.setText(str(stats['total_passages']))
-        
-        conn = db.get_connection()
-        try:
-            c = conn.cursor()
-            c.execute("SELECT detail FROM historique_passages WHERE action='Recharge Compte' AND date_passage=?", (today,))
-            total_recharge = 0.0
-            for row in c.fetchall():
-                try: 
-                    total_recharge += float(row[0].replace('€', '').replace('+', '').strip())
-                except: 
-                    pass
-            
-            c.execute("SELECT COUNT(*) FROM historique_passages WHERE action='PAYE' AND detail='Anonyme' AND date_passage=?", (today,))
-            nb_anon_paye = c.fetchone()[0]
-            total_anon = nb_anon_paye * self.ticket_price
-            total_caisse = total_recharge + total_anon
-            self.lbl_caisse.setText(f"{total_caisse:.2f} €")
-        finally:
-            conn.close()
+        # Compteurs tenus en mémoire (Core/counters.py) : aucune requête
+        stats = today_counters.snapshot()
+        
+        self.lbl_h.setText(f"H: {stats.total_h}")
+        self.lbl_f.setText(f"F: {stats.total_f}")
+        self.stat_carte.setText(str(stats.tickets_carte + stats.tickets_tutelle))
+        self.stat_avance.setText(str(stats.tickets_avance))
+        self.stat_first.setText(str(stats.tickets_1ere_fois))
+        self.stat_h.setText(str(stats.total_h))
+        self.stat_f.setText(str(stats.total_f))
+        self.stat_total_passages.setText(str(stats.total_passages))
+        
+        # Ventes anonymes : les passages "PAYE" sont tous des anonymes (add_passage)
+        self.lbl_caisse.setText(f"{stats.caisse(self.ticket_price):.2f} €")
 
-    def remove_accents(self, input_str): 
-        return "".join([c for c in unicodedata.normalize('NFD', input_str) if not unicodedata.combining(c)]).upper() if input_str else ""
-
-    def calculate_match_score(self, search_text, uid, nom, prenom):
-        if not search_text: return 100
-        
-        search_clean = search_text
-        if str(uid) == search_clean: return 100
-            
-        n_clean = self.remove_accents(nom)
-        p_clean = self.remove_accents(prenom)
-        full_name = f"{n_clean} {p_clean}"
-        inv_name = f"{p_clean} {n_clean}"
-        
-        if n_clean.startswith(search_clean) or p_clean.startswith(search_clean): return 95
-        if full_name.startswith(search_clean) or inv_name.startswith(search_clean): return 90
-        if search_clean in full_name or search_clean in inv_name: return 70
-            
-        ratio_n = SequenceMatcher(None, search_clean, n_clean).ratio()
-        ratio_p = SequenceMatcher(None, search_clean, p_clean).ratio()
-        ratio_f = SequenceMatcher(None, search_clean, full_name).ratio()
-        best_ratio = max(ratio_n, ratio_p, ratio_f)
-        
-        if best_ratio > 0.6: return int(best_ratio * 60)
-        return 0
+    def update_completions(self, text):
+        # Noms des usagers visibles qui commencent par le texte tapé (dichotomie dans l'index)
+        text = text.strip()
+        labels = roster_store.names.completions(text, mask=roster_store.visible_mask(self.filters)) if text else []
+        self.completer_model.setStringList(labels)
+        if labels:
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
 
     def load_data(self):
-        self.table.setUpdatesEnabled(False)
-        self.table.setSortingEnabled(False)
-        self.table.setRowCount(0)
-        
-        try:
-            raw_search = self.search.text().strip()
-            search_clean = self.remove_accents(raw_search)
-            is_searching = len(search_clean) > 0
-            
-            conn = db.get_connection()
-            try:
-                c = conn.cursor()
-                c.execute("SELECT * FROM usagers")
-                rows = c.fetchall()
-            finally:
-                conn.close()
-            
-            bg_map = {"Payés": AppColors.ROW_PAYE, "Avances": AppColors.ROW_AVANCE, "Tutelles": AppColors.ROW_TUTELLE, "Pas de crédit": AppColors.ROW_NOCREDIT}
-            display_list = []
-            
-            for r in rows:
-                uid, n, p, s, st, sol, tick, passg = r[:8]
-                comment = r[9] if len(r) > 9 else ""
-                
-                calc_sol = tick * self.ticket_price
-                real_st = st
-                if st in ["Payés", "Avances"]:
-                    if tick < 0: real_st = "Avances"
-                    elif tick > 0: real_st = "Payés"
-                
-                if not self.filters.get(real_st, True): continue
-                if not self.filters.get(s, True): continue
-                
-                is_positive = calc_sol >= 0
-                is_negative = calc_sol < 0
-                if not self.filters.get("Positif", True) and is_positive: continue
-                if not self.filters.get("Négatif", True) and is_negative: continue
-                
-                score = self.calculate_match_score(search_clean, uid, n, p)
-                if is_searching and score == 0: continue
-                    
-                display_list.append((score, n, r, real_st, calc_sol, bg_map.get(real_st, "white")))
-            
-            display_list.sort(key=lambda x: (-x[0], x[1]))
-            
-            vis = 0
-            for score, name_sort, r, real_st, calc_sol, bg_color in display_list:
-                vis += 1
-                uid, n, p, s, st, sol, tick, passg = r[:8]
-                comment = r[9] if len(r) > 9 else ""
-                
-                idx = self.table.rowCount()
-                self.table.insertRow(idx)
-                bg = QColor(bg_color)
-                
-                tooltip_text = f"<b>{n} {p}</b> ({s})<br>Statut: {real_st}<br>Solde: {calc_sol:.2f} € ({tick} tickets)<br>Dernier passage: {passg}<br>-----------------<br><i>{comment if comment else 'Aucun commentaire'}</i>"
-                
-                items_list = [uid, n, p, s, real_st, f"{calc_sol:.2f} €", tick, comment, passg]
-                
-                for i, val in enumerate(items_list):
-                    if i in [0, 5, 6]: it = NumericTableWidgetItem(str(val))
-                    else: it = QTableWidgetItem(str(val))
-                    
-                    it.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    it.setBackground(bg)
-                    it.setToolTip(tooltip_text)
-                    self.table.setItem(idx, i, it)
-            
-            self.lbl_count.setText(f"{vis} usager(s) visible(s)")
-            self.refresh_counters()
+        raw_search = self.search.text().strip()
+        search_clean = strip_accents(raw_search)
+        is_searching = len(search_clean) > 0
+        
+        # Liste en mémoire (Core/roster.py) : seuls les usagers modifiés sont relus, les filtres sont des masques
+        roster_store.refresh(self.ticket_price)
+        slots = roster_store.slots(roster_store.visible_mask(self.filters))
+        
+        # Recherche : score de chaque usager retenu par les filtres, les meilleurs en tête
+        order = None
+        if is_searching:
+            found = roster_store.search(search_clean, slots)
+            scores = {roster_store.records[slot][COL_ID]: score for slot, score in found.items()}
+            slots = list(found)
+            order = lambda r: (-scores[r[COL_ID]], r[COL_NOM])
+        
+        # Hors recherche, le tri de l'en-tête est réappliqué par le modèle
+        self.roster_model.set_rows([roster_store.records[slot] for slot in slots], order)
+        if self.table.isSortingEnabled() == is_searching:
             self.table.setSortingEnabled(not is_searching)
-            
-        finally:
-            self.table.setUpdatesEnabled(True)
+        
+        self.lbl_count.setText(f"{len(slots)} usager(s) visible(s)")
 
 # ============================================================================
 # FONCTION UTILITAIRE (HORS CLASSE)
@@ -1251,6 +1227,26 @@ def monitor_and_delete(file_path):
         except Exception: 
             break
 
+def convert_database_at_startup():
+    """
+    Passage unique en auto_vacuum incrémental, avant l'ouverture de la fenêtre : le VACUUM
+    complet garde le verrou d'écriture pendant toute la reconstruction, aucune saisie
+    (passage, recharge) ne doit l'attendre. Fenêtre d'attente bloquante pendant ce temps.
+    """
+    if not needs_auto_vacuum_conversion():
+        return
+    dialog = QProgressDialog("Optimisation de la base de données (une seule fois)...\nVeuillez patienter.", None, 0, 0)
+    dialog.setWindowTitle("Restaurant Social")
+    dialog.setWindowModality(Qt.WindowModality.ApplicationModal)
+    dialog.setMinimumDuration(0)
+    dialog.show()
+    worker = VacuumConversionWorker()
+    worker.finished.connect(lambda ok, message: ok or print(f"Conversion de la base : {message}"))
+    worker.start()
+    while not worker.wait(50):
+        QApplication.processEvents()
+    dialog.close()
+
 # ============================================================================
 # POINT D'ENTRÉE (EXECUTION)
 # ============================================================================
@@ -1259,6 +1255,8 @@ if __name__ == "__main__":
         myappid = 'shadok.gestionresto.version.1.0'
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)    
     
+    # Profilage SQL optionnel (--profile-sql ou RESTO_PROFILE_SQL) : avant les migrations
+    enable_from_environment()
     db.init_db()
     
     app = QApplication(sys.argv)
@@ -1277,6 +1275,11 @@ if __name__ == "__main__":
     if os.path.exists(ICON_PATH): 
         app.setWindowIcon(QIcon(ICON_PATH))
     
+    convert_database_at_startup()
+    
     window = MainWindow()    
     window.show()    
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    if sql_profiler.enabled:
+        print(sql_profiler.report())
+    sys.exit(exit_code)
\ No newline at end of file
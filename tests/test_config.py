@@ -0,0 +1,65 @@
+"""
+Cache de la table config (database._ConfigStore) : les commits de ce processus ne le
+font pas relire, une écriture d'un autre processus si.
+
+    python -m pytest tests
+"""
+import sqlite3
+import threading
+
+import pytest
+
+import database as db
+from benchmarks.common import temp_database
+
+
+@pytest.fixture
+def database():
+    with temp_database("config.db") as path:
+        db.set_config("EXPORT_SUP_ENABLED", "1")
+        yield path
+
+
+def _config_queries(fn):
+    """Requêtes SELECT sur config exécutées par fn() sur la connexion du thread courant."""
+    statements = []
+    conn = db.get_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+        conn.close()
+    return [s for s in statements if "FROM config" in s]
+
+
+def test_own_commits_do_not_reload(database):
+    db.get_config("EXPORT_SUP_ENABLED")
+    for _ in range(5):
+        db.write_sync(db.insert_history, ("PAYE", "Anonyme", "F", None, "2024-01-01", "Payés"))
+    assert _config_queries(lambda: db.get_config("EXPORT_SUP_ENABLED")) == []
+
+
+def test_fresh_thread_does_not_reload(database):
+    db.get_config("EXPORT_SUP_ENABLED")
+    found = []
+
+    def run():
+        try:
+            found.extend(_config_queries(lambda: db.get_config("EXPORT_SUP_PATH")))
+        finally:
+            db.release_thread_connection()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert found == []
+
+
+def test_other_process_write_is_seen(database):
+    assert db.get_config("EXPORT_SUP_ENABLED") == "1"
+    other = sqlite3.connect(database)
+    other.execute("REPLACE INTO config (key, value) VALUES ('EXPORT_SUP_ENABLED', '0')")
+    other.commit()
+    other.close()
+    assert db.get_config("EXPORT_SUP_ENABLED") == "0"
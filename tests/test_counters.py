@@ -0,0 +1,51 @@
+"""
+Compteurs du jour (Core/counters.py) : la vérification périodique ne valide rien tant
+que les compteurs concordent, corrige un écart venu d'un autre processus, et son thread
+rend sa connexion au pool.
+
+    python -m pytest tests
+"""
+import sqlite3
+from datetime import date
+
+import pytest
+
+import database as db
+from benchmarks.common import temp_database
+from Core.counters import today_counters
+from Core.workers import CountersCheckWorker
+
+
+@pytest.fixture
+def database():
+    with temp_database("counters.db") as path:
+        today_counters.seed()
+        yield path
+        db.data_version.follow_day(None, None)
+
+
+def test_reconcile_without_drift_does_not_commit(database):
+    today = date.today().isoformat()
+    db.write_sync(db.insert_history, ("Consommation ticket(s)", "2", "H", None, today, "Payés"))
+    generation = db.data_version.current()
+    assert today_counters.reconcile() == {}
+    assert db.data_version.current() == generation
+
+
+def test_reconcile_fixes_external_write(database):
+    other = sqlite3.connect(database)
+    other.execute("INSERT INTO historique_passages (action, detail, sexe, date_passage, statut_au_passage, quantite) VALUES ('PAYE', 'Anonyme', 'F', ?, 'Payés', 1)", (date.today().isoformat(),))
+    other.commit()
+    other.close()
+    assert today_counters.reconcile() == {"total_f": (0, 1), "tickets_carte": (0, 1), "anon_paye": (0, 1), "anonymes": (0, 1)}
+    assert today_counters.snapshot().total_f == 1
+
+
+def test_check_worker_releases_its_connection(database):
+    db.get_connection().close()
+    before = len(db._all_connections)
+    for _ in range(3):
+        worker = CountersCheckWorker()
+        worker.start()
+        assert worker.wait(10_000)
+    assert len(db._all_connections) == before
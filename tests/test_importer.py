@@ -0,0 +1,38 @@
+"""
+Import en masse (Core/importer.py) : un usager créé pendant l'import (depuis l'interface)
+est retrouvé par sa clé nom_key au lieu d'être créé une seconde fois.
+
+    python -m pytest tests
+"""
+import pytest
+
+import database as db
+from benchmarks.common import temp_database
+from Core.importer import import_roster
+from Core.normalize import name_key
+
+
+@pytest.fixture
+def database():
+    with temp_database("importer.db") as path:
+        yield path
+
+
+def _create(c, nom, prenom):
+    nid = db.reserve_ids(c)
+    c.execute("INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire, nom_key) VALUES (?,?,?,'H','Payés',0,0,'','','',?)",
+              (nid, nom, prenom, name_key(nom, prenom)))
+
+
+def test_usager_created_during_import_is_not_duplicated(database):
+    def records():
+        yield ("DUPONT", "Jean", 1, "")
+        # Saisi dans l'interface entre deux lots, après le chargement des clés
+        db.write_sync(_create, "Martin", "Éric")
+        yield ("MARTIN", "Eric", 2, "")
+
+    result = import_roster(records(), "Payés", 1.0, chunk_size=1)
+    assert (result['created'], result['updated']) == (1, 1)
+    with db.connection() as conn:
+        rows = conn.execute("SELECT nom, ticket FROM usagers WHERE nom_key = ?", (name_key("MARTIN", "Eric"),)).fetchall()
+    assert rows == [("Martin", 2)]
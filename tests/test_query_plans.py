@@ -0,0 +1,90 @@
+"""
+Plans d'exécution (EXPLAIN QUERY PLAN) des requêtes du tableau de bord, des bilans PDF
+et de l'historique : chacune doit passer par un index (étapes SEARCH).
+
+Les requêtes sont celles des modules de l'application (Core/stats.py,
+Core/pdf_generator.py, database.py). Toute étape SCAN fait échouer le test, sauf
+celles autorisées explicitement pour la requête (ALLOWED_SCANS).
+
+    python -m pytest tests
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import database as db
+from benchmarks.common import temp_database
+from Core.stats import dashboard_sql, PERIOD_FIGURES_SQL, SERIES_SQL, recharges_sql
+from Core.pdf_generator import (
+    TUTELLES_FIX_SQL, ANONYMES_SQL, group_grid_sql, group_users_sql, ventes_directes_sql
+)
+
+TODAY = "2024-06-15"
+START, END = "2024-06-01", "2024-07-01"  # intervalles semi-ouverts (Core/periods.py)
+TOMORROW = "2024-06-16"
+
+# (origine, requête, paramètres) : requêtes importées de l'application
+QUERIES = [
+    ("stats : bilan de période", PERIOD_FIGURES_SQL, (START, END)),
+    ("stats : série (par jour)", SERIES_SQL, ("2023-06-01", END)),
+    ("stats : recharges", recharges_sql(), (START, END)),
+    ("tableau de bord (requête unique)",
+     dashboard_sql(),
+     {"day": TODAY, "next_day": TOMORROW, "month": START, "next_month": END}),
+    ("PDF : rattrapage statut Tutelles", TUTELLES_FIX_SQL, (START, END)),
+    ("PDF : grille du groupe", group_grid_sql(2), ("Payés", "Pas de crédit", START, END)),
+    ("PDF : usagers du groupe", group_users_sql(2), ("Payés", "Pas de crédit", START, END)),
+    ("PDF : anonymes par sexe", ANONYMES_SQL, ("PAYE", "H", START, END)),
+    ("PDF période : ventes directes", ventes_directes_sql(), (START, END)),
+    ("usagers : doublon (nom_key)", db.FIND_USAGER_SQL, ("DUPONT|JEAN",)),
+    ("historique d'un usager", db.usager_history_sql(), (1,)),
+]
+
+# Parcours acceptés, par requête (cible de l'étape SCAN)
+ALLOWED_SCANS = {
+    # Les sous-requêtes du WITH ne contiennent que quelques lignes agrégées
+    "tableau de bord (requête unique)": {"figures", "recharges", "passages", "soldes"},
+    # Peu d'usagers sous tutelle, pas d'index sur statut : usagers est parcourue une fois
+    "PDF : rattrapage statut Tutelles": {"usagers"},
+}
+
+
+def seed(c, nb_usagers=200, nb_jours=400):
+    rnd = random.Random(3)
+    c.executemany(
+        "INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket, passage, photo_filename, commentaire) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        [(i, f"NOM{i}", "", rnd.choice("HF"), rnd.choice(["Payés", "Avances", "Tutelles"]), 1.0, 5, "", "", "") for i in range(1, nb_usagers + 1)]
+    )
+    day = date(2023, 6, 1)
+    for _ in range(nb_jours):
+        d = day.isoformat()
+        for _ in range(20):
+            uid = rnd.randint(1, nb_usagers)
+            db.insert_history(c, ('Consommation ticket(s)', '1', 'H', uid, d, 'Payés'))
+        db.insert_history(c, ('PAYE', 'Anonyme', 'F', None, d, 'Payés'))
+        db.insert_history(c, ('Recharge Compte', '+5.00 €', 'H', 1, d, 'Payés'))
+        day += timedelta(days=1)
+
+
+def full_scans(conn, sql, params, allowed=()):
+    """Étapes SCAN du plan dont la cible n'est pas dans allowed."""
+    bad = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall():
+        detail = row[3]
+        if detail.startswith("SCAN ") and detail.split()[1] not in allowed:
+            bad.append(detail)
+    return bad
+
+
+@pytest.fixture(scope="module")
+def database():
+    with temp_database("plans.db"):
+        db.write_sync(seed)
+        yield
+
+
+@pytest.mark.parametrize("name, sql, params", QUERIES, ids=[name for name, _, _ in QUERIES])
+def test_query_uses_index(database, name, sql, params):
+    with db.connection() as conn:
+        assert full_scans(conn, sql, params, ALLOWED_SCANS.get(name, ())) == []
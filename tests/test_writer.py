@@ -0,0 +1,57 @@
+"""
+Écrivain unique (database.DbWriter) : une tâche en échec dans un lot groupé n'annule que
+ses propres lignes, et ce que les triggers temporaires en avaient noté.
+
+    python -m pytest tests
+"""
+from datetime import date, timedelta
+
+import pytest
+
+import database as db
+from benchmarks.common import temp_database
+
+
+@pytest.fixture
+def database():
+    with temp_database("writer.db"):
+        with db.connection() as conn:
+            conn.execute("INSERT INTO usagers (id, nom, prenom, sexe, statut, solde, ticket) VALUES (1, 'A', '', 'H', 'Payés', 0, 0), (2, 'B', '', 'F', 'Payés', 0, 0)")
+        yield
+        db.data_version.follow_day(None, None)
+        db.data_version.follow_usagers(None)
+
+
+def test_failed_job_in_batch_is_not_reported(database):
+    today = date.today().isoformat()
+    old_day = "2001-01-01"
+    day_rows, usager_ids = [], set()
+    db.data_version.follow_day(today, day_rows.extend)
+    db.data_version.follow_usagers(usager_ids.update)
+
+    def failing(c):
+        db.insert_history(c, ("Consommation ticket(s)", "1", "H", 1, today, "Payés"))
+        db.insert_history(c, ("Consommation ticket(s)", "1", "H", 1, old_day, "Payés"))
+        c.execute("UPDATE usagers SET ticket = ticket - 1 WHERE id = 1")
+        raise ValueError("refusé")
+
+    def passing(c):
+        c.execute("UPDATE usagers SET ticket = ticket - 1 WHERE id = 2")
+        return db.insert_history(c, ("Consommation ticket(s)", "2", "F", 2, today, "Payés"))
+
+    generation = db.data_version.current()
+    writer = db.DbWriter(window=0.5)  # Les trois tâches partagent une transaction
+    futures = [writer.submit(passing), writer.submit(failing), writer.submit(passing)]
+    writer.stop()
+
+    assert isinstance(futures[1].exception(), ValueError)
+    assert all(f.result() for f in (futures[0], futures[2]))
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM historique_passages").fetchone()[0] == 2
+        assert conn.execute("SELECT ticket FROM usagers WHERE id = 1").fetchone()[0] == 0
+    # Seules les lignes validées sont transmises aux compteurs du jour et aux usagers suivis
+    assert [(row[0], row[1], row[3]) for row in day_rows] == [(today, 1, "F"), (today, 1, "F")]
+    assert usager_ids == {2}
+    # La date de la ligne annulée n'invalide pas les résultats en cache qui la couvrent
+    assert db.data_version.history_unchanged(generation, old_day, "2001-01-02")
+    assert not db.data_version.history_unchanged(generation, today, (date.today() + timedelta(days=1)).isoformat())